@@ -13,80 +13,158 @@ developed as a part of Samuel Bernier's thesis. For more information, visit http
 """
 
 
-import pandas as pd
+import functools
+import os
+import sys
 import matplotlib.pyplot as plt
 from wordcloud import WordCloud
 
-# Load the CSV file into a DataFrame
-reddit_df = pd.read_csv('Data/reddit_sentences.csv')
+# The shared modules are in the Common folder at the root of the repository
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from Common import profiling
+from Common.summary_index import SummaryIndex
+from author_report import translations
+from sentence_loader import author_sentences, chunked_stats, iter_sentences, load_sentences
+
+# Outputs of SetFit-Pred.py, the Parquet dataset is used when it exists
+sentences_file = 'Data/reddit_sentences.csv'
+parquet_dir = 'Data/reddit_sentences_parquet'
+
+# Label counts per author and per subreddit built by SetFit-Pred.py (see Common/summary_index.py)
+# Set to None to compute the statistics from the sentences instead
+summary_index_file = 'Data/reddit_summary.db'
+
+# Without the summary index, compute the statistics chunk by chunk instead of loading all the sentences (see sentence_loader.py)
+low_memory = True
+chunk_rows = 100000
+
+# Only the columns used by the statistics below are loaded
+required_columns = ['Author', 'ID', 'Title', 'Label', 'Label Text', 'Subreddit']
+
+# Summary index opened by open_summary_index() when the application starts, None to read the sentences
+summary = None
+
+# Bring the summary index up to date, only the predictions added since the last update are read
+# If the index cannot be opened or updated, the statistics are computed from the sentences instead
+def open_summary_index():
+    global summary
+    if not summary_index_file:
+        return
+    try:
+        with profiling.stage('load'):
+            summary = SummaryIndex(summary_index_file)
+            summary.update(parquet_dir if os.path.isdir(parquet_dir) else sentences_file)
+    except Exception as e:
+        print(f"**Summary index {summary_index_file} not available ({type(e).__name__}: {e}), reading the sentences instead")
+        if summary is not None:
+            summary.close()
+        summary = None
+
+# Chunks of the sentences with the requested columns, read again at each call
+def sentence_chunks(columns=required_columns):
+    return iter_sentences(columns, chunk_rows, sentences_file, parquet_dir)
+
+# Without low_memory, the sentences are loaded in a DataFrame the first time a statistic needs them, not at import
+@functools.lru_cache(maxsize=1)
+def reddit_sentences():
+    with profiling.stage('load'):
+        reddit_df = load_sentences(required_columns, sentences_file, parquet_dir)
+    profiling.count('rows', len(reddit_df))
+    return reddit_df
 
 # ------------------Stats for the whole dataset----------------------------
 def complete_dataset():
     print("Dataset stats: \n")
 
-    # Count unique authors in the dataset
-    unique_authors_count = reddit_df['Author'].nunique()
-    print(f"There are {unique_authors_count} unique authors in the dataset.")
+    with profiling.stage('stats'):
+        if summary is not None:
+            # Read from the summary index
+            counts = summary.counts()
+            unique_authors_count = counts['authors']
+            unique_ids_count = counts['posts']
+            label_counts_overall = summary.label_counts()
+            unique_subreddits_count = counts['subreddits']
+            subreddit_counts = summary.subreddit_counts()
+        elif low_memory:
+            # Counted chunk by chunk, only the four columns are read
+            stats = chunked_stats(sentence_chunks(['Author', 'ID', 'Label Text', 'Subreddit']))
+            unique_authors_count = stats['authors']
+            unique_ids_count = stats['posts']
+            label_counts_overall = stats['label_counts']
+            unique_subreddits_count = stats['subreddits']
+            subreddit_counts = stats['subreddit_counts']
+        else:
+            reddit_df = reddit_sentences()
+
+            # Count unique authors in the dataset
+            unique_authors_count = reddit_df['Author'].nunique()
+
+            # Count unique IDs in the dataset
+            unique_ids_count = reddit_df['ID'].nunique()
+
+            # Count the occurrences for each label text
+            label_counts_overall = reddit_df['Label Text'].value_counts()
+
+            # Count how many unique Subreddits there are
+            unique_subreddits_count = reddit_df['Subreddit'].nunique()
+
+            # Count the occurrences for each subreddit
+            subreddit_counts = reddit_df['Subreddit'].value_counts()
 
-    # Count unique IDs in the dataset
-    unique_ids_count = reddit_df['ID'].nunique()
+    print(f"There are {unique_authors_count} unique authors in the dataset.")
     print(f"There are {unique_ids_count} unique publications in the dataset.")
-
-    # Count the occurrences for each label text
-    label_counts_overall = reddit_df['Label Text'].value_counts()
     print(" \nLabel counts for the whole dataset:")
     print(label_counts_overall)
-    
-    # Count how many unique Subreddits there are
-    unique_subreddits_count = reddit_df['Subreddit'].nunique()
     print(f"There are {unique_subreddits_count} unique subreddits in the dataset.")
-
-    # Count the occurrences for each subreddit
-    subreddit_counts = reddit_df['Subreddit'].value_counts()
     print(" \nSubreddit counts for the whole dataset:")
     print(subreddit_counts[:20])
 
     #------------------Pie charts----------------------------
-    # Define explode values to separate the smaller slices a bit
-    explode_values = [0.1 if count < 1000 else 0 for count in label_counts_overall]
+    with profiling.stage('plot'):
+        # Define explode values to separate the smaller slices a bit
+        explode_values = [0.1 if count < 1000 else 0 for count in label_counts_overall]
 
-    # Plotting with legend and exploded slices
-    fig, ax = plt.subplots(figsize=(14, 8))
+        # Plotting with legend and exploded slices
+        fig, ax = plt.subplots(figsize=(14, 8))
 
-    # Plot the pie chart with legend and exploded slices
-    label_counts_overall.plot.pie(explode=explode_values, startangle=90, ax=ax, autopct='%1.1f%%', pctdistance=0.85, labels=None)
+        # Plot the pie chart with legend and exploded slices
+        label_counts_overall.plot.pie(explode=explode_values, startangle=90, ax=ax, autopct='%1.1f%%', pctdistance=0.85, labels=None)
 
-    # Draw a circle in the center to make it a donut chart (this gives more space for labels)
-    centre_circle = plt.Circle((0,0), 0.70, fc='white')
-    fig.gca().add_artist(centre_circle)
+        # Draw a circle in the center to make it a donut chart (this gives more space for labels)
+        centre_circle = plt.Circle((0,0), 0.70, fc='white')
+        fig.gca().add_artist(centre_circle)
 
-    # Add a legend to the chart
-    ax.legend(title='Labels', labels=label_counts_overall.index, loc='best', bbox_to_anchor=(1, 0.5))
+        # Add a legend to the chart
+        ax.legend(title='Labels', labels=label_counts_overall.index, loc='best', bbox_to_anchor=(1, 0.5))
 
-    ax.set_title('Distribution of Different Labels')
-    ax.set_ylabel('')  # Remove y-axis label for clarity
-    plt.tight_layout()
+        ax.set_title('Distribution of Different Labels')
+        ax.set_ylabel('')  # Remove y-axis label for clarity
+        plt.tight_layout()
+    # Saved before plt.show(), the figure is closed when its window is
+    with profiling.stage('savefig'):
+        plt.savefig('complete_dataset_pie_chart.png', bbox_inches='tight')
     plt.show()
-    plt.savefig('complete_dataset_pie_chart.png', bbox_inches='tight')
 
 
     # ------------------Word cloud----------------------------
-    # Count the number of occurrences for the top 100 subreddits
-    subreddit_counts_100 = reddit_df['Subreddit'].value_counts().head(100)
-
-    # Generate word cloud data for the top 100 subreddits
-    wordcloud_data_100 = {subreddit: count for subreddit, count in subreddit_counts_100.items()}
-
-    # Create a word cloud for the top 100 subreddits
-    wordcloud_100 = WordCloud(width=800, height=400, background_color='white', colormap='viridis').generate_from_frequencies(wordcloud_data_100)
-
-    # Plot the word cloud
-    plt.figure(figsize=(12, 8))
-    plt.imshow(wordcloud_100, interpolation='bilinear')
-    plt.axis('off')
-    plt.title('Top 100 Subreddits')
+    with profiling.stage('plot'):
+        # Count the number of occurrences for the top 100 subreddits
+        subreddit_counts_100 = subreddit_counts.head(100)
+
+        # Generate word cloud data for the top 100 subreddits
+        wordcloud_data_100 = {subreddit: count for subreddit, count in subreddit_counts_100.items()}
+
+        # Create a word cloud for the top 100 subreddits
+        wordcloud_100 = WordCloud(width=800, height=400, background_color='white', colormap='viridis').generate_from_frequencies(wordcloud_data_100)
+
+        # Plot the word cloud
+        plt.figure(figsize=(12, 8))
+        plt.imshow(wordcloud_100, interpolation='bilinear')
+        plt.axis('off')
+        plt.title('Top 100 Subreddits')
+    with profiling.stage('savefig'):
+        plt.savefig('Data/complete_dataset_word_cloud.png', bbox_inches='tight')
     plt.show()
-    plt.savefig('Data/complete_dataset_word_cloud.png', bbox_inches='tight')
 
 
 # ------------------Stats for a random author----------------------------
@@ -94,54 +172,60 @@ def random_author():
     print("\nRandom author stats: \n")
     # Select a random author
     # random_author = np.random.choice(reddit_df['Author'].unique())
+    # For the reports of many authors without a display, see Batch-Reports.py
     random_author = '69f2597b'
 
-    # Group by 'ID', 'Title', 'Author', then aggregate the 'Label' column into a list
-    grouped_data_with_author_url = reddit_df.groupby(['Author', 'Title', 'ID'])['Label'].agg(list).reset_index()
-
-    # Filter the grouped dataset for the selected author using the combined random author
-    author_data_with_url_combined = grouped_data_with_author_url[grouped_data_with_author_url['Author'] == random_author]
+    with profiling.stage('stats'):
+        if summary is not None:
+            # Posts of the author with the labels of their sentences, read from the summary index
+            author_data_with_url_combined = summary.author_posts(random_author)
+        else:
+            # Filter the dataset for entries by that author once, the grouping only runs on its rows
+            if low_memory:
+                author_df = author_sentences(random_author, sentence_chunks())
+            else:
+                reddit_df = reddit_sentences()
+                author_df = reddit_df[reddit_df['Author'] == random_author]
+
+            # Group by 'ID', 'Title', 'Author', then aggregate the 'Label' column into a list
+            # observed=True keeps only the existing combinations, Author is a categorical column
+            author_data_with_url_combined = author_df.groupby(['Author', 'Title', 'ID'], observed=True)['Label'].agg(list).reset_index()
 
     print(author_data_with_url_combined)
 
     # ------------------Pie chart----------------------------
+    with profiling.stage('stats'):
+        # Count the number of occurrences for each label text, the labels the author never used are dropped
+        if summary is not None:
+            label_counts = summary.author_label_counts(random_author)
+        else:
+            label_counts = author_df['Label Text'].value_counts()
+            label_counts = label_counts[label_counts > 0]
 
-    # Translation dictionary
-    translations = {
-    'Ability to hope for change': 'Capacité à espérer un changement',
-    'Previous attempt': 'Tentatives de suicide antérieures',
-    'Ability to control oneself': 'Capacité à se contrôler',
-    'Ability to take care of oneself': 'Capacité à prendre soin de soi',
-    'Presence of a loved one': 'Présence des proches',
-    'Consumption': 'Usage de substances',
-    'Suicidal planning': 'Planification du suicide',
-    'Other': 'Autre',
-    }
-
-    # Filter the dataset for entries by that author
-    author_df = reddit_df[reddit_df['Author'] == random_author]
-
-    # Count the number of occurrences for each label text
-    label_counts = author_df['Label Text'].value_counts()
-
-    # Translate the labels in french
-    label_counts = label_counts.rename(index=translations)
+        # Translate the labels in french
+        label_counts = label_counts.rename(index=translations)
 
 
     # Print the number of occurrences for each label text
     print("Label counts for selected author: \n")
     print(label_counts)
 
-    # Plot a pie chart
-    plt.figure(figsize=(10, 7))
-    label_counts.plot.pie(autopct='%1.1f%%', startangle=90)
-    plt.title(f'Classes associées avec l\'auteur: {random_author}')
-    plt.ylabel('')  # Remove y-axis label for clarity
+    with profiling.stage('plot'):
+        # Plot a pie chart
+        plt.figure(figsize=(10, 7))
+        label_counts.plot.pie(autopct='%1.1f%%', startangle=90)
+        plt.title(f'Classes associées avec l\'auteur: {random_author}')
+        plt.ylabel('')  # Remove y-axis label for clarity
+    with profiling.stage('savefig'):
+        plt.savefig(f'Data/random_author_{random_author}_pie_chart.png', bbox_inches='tight')
     plt.show()
-    plt.savefig(f'Data/random_author_{random_author}_pie_chart.png', bbox_inches='tight')
 
 
 # Main function
 if __name__ == '__main__':
+    # Time the stages of the run, the JSON log goes to Data/logs/Application.jsonl
+    profiling.start('Application')
+    open_summary_index()
     # complete_dataset()
-    random_author()
\ No newline at end of file
+    random_author()
+    profiling.finish()
\ No newline at end of file
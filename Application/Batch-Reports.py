@@ -0,0 +1,132 @@
+"""
+Project Name: MACHINE LEARNING TECHNIQUES FOR ESTIMATING SUICIDAL RISK ON SOCIAL MEDIA
+Author: Samuel Bernier
+Thesis Paper (French): https://uqo.on.worldcat.org/oclc/1415207814
+GitHub repository: https://github.com/BernierS/SetFit_Suicidal_Risk
+Huggin Face repository: https://huggingface.co/BernierS/SetFit_Suicidal_Risk
+File Description:
+    Batch-Reports.py renders the reports of many authors without a display: the pie chart and the French breakdown
+    of their labels, their posts and the word cloud of their subreddits, one folder per author (see author_report.py).
+    The authors are given as a list or selected from the summary index by their labels, e.g. every author with at
+    least 3 sentences of suicidal planning. The reports are rendered by a pool of processes, and an author whose
+    data did not change since the last run is skipped.
+
+    python Application/Batch-Reports.py --authors 69f2597b 1a2b3c4d
+    python Application/Batch-Reports.py --label "Suicidal planning" --min-count 3 --limit 1000
+--------------------------------------------------------------------------------
+This file is part of the MACHINE LEARNING TECHNIQUES FOR ESTIMATING SUICIDAL RISK SUICIDAL RISK ON SOCIAL NETWORKS project,
+developed as a part of Samuel Bernier's thesis. For more information, visit https://uqo.on.worldcat.org/oclc/1415207814.
+--------------------------------------------------------------------------------
+"""
+
+import argparse
+import multiprocessing
+import os
+import re
+import sys
+import pandas as pd
+
+from tqdm import tqdm
+from author_report import fingerprint, is_up_to_date, render_task
+
+# The shared modules are in the Common folder at the root of the repository
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from Common import profiling
+from Common.summary_index import SummaryIndex
+
+# Outputs of SetFit-Pred.py, the Parquet dataset is used when it exists
+sentences_file = 'Data/reddit_sentences.csv'
+parquet_dir = 'Data/reddit_sentences_parquet'
+
+# The author lookups are read from the summary index (see Common/summary_index.py)
+summary_index_file = 'Data/reddit_summary.db'
+
+# One folder per author, and index.csv with the status of every requested author
+output_dir = 'Data/reports'
+
+# Labels selecting the authors when no list is given
+flagged_labels = ['Suicidal planning', 'Previous attempt']
+
+# Folder name of an author, the characters that are not allowed in a file name are replaced
+def author_folder(author):
+    return re.sub(r'[^\w\-]', '_', str(author))
+
+def read_authors_file(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip()]
+
+# Data of one author read from the summary index, everything the report needs so the workers never open the index
+def author_data(summary, author):
+    return {
+        'label_counts': summary.author_label_counts(author),
+        'posts': summary.author_posts(author),
+        'subreddit_counts': summary.author_subreddit_counts(author),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Render the reports of many authors without a display')
+    parser.add_argument('--authors', nargs='+', default=[], help='Authors to render')
+    parser.add_argument('--authors-file', help='File with one author per line')
+    parser.add_argument('--label', action='append', dest='labels', help=f'Select the authors with this label, can be repeated (default: {", ".join(flagged_labels)})')
+    parser.add_argument('--min-count', type=int, default=1, help='Minimum number of sentences with the labels (default: 1)')
+    parser.add_argument('--limit', type=int, help='Maximum number of selected authors, the most flagged first')
+    parser.add_argument('--output-dir', default=output_dir, help=f'Folder of the reports (default: {output_dir})')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Number of processes rendering the reports')
+    parser.add_argument('--force', action='store_true', help='Render the authors whose data did not change')
+    args = parser.parse_args()
+
+    profiling.start('Batch-Reports')
+
+    # Bring the summary index up to date, only the predictions added since the last update are read
+    with profiling.stage('load'):
+        summary = SummaryIndex(summary_index_file)
+        summary.update(parquet_dir if os.path.isdir(parquet_dir) else sentences_file)
+
+    # Authors given on the command line, or selected by their labels
+    authors = list(args.authors)
+    if args.authors_file:
+        authors += read_authors_file(args.authors_file)
+    if not authors:
+        selected = summary.authors_with_labels(args.labels or flagged_labels, args.min_count, args.limit)
+        authors = selected.index.tolist()
+        print(f"{len(authors)} authors with at least {args.min_count} sentences labelled {', '.join(args.labels or flagged_labels)}")
+    authors = list(dict.fromkeys(authors))
+
+    # Only the authors whose data changed since their last report are sent to the workers
+    tasks = []
+    status = {}
+    with profiling.stage('stats'):
+        for author in authors:
+            data = author_data(summary, author)
+            if len(data['posts']) == 0:
+                status[author] = 'unknown'
+                continue
+            author_dir = os.path.join(args.output_dir, author_folder(author))
+            data_fingerprint = fingerprint(data)
+            if not args.force and is_up_to_date(author_dir, data_fingerprint):
+                status[author] = 'unchanged'
+                continue
+            tasks.append((author, data, author_dir, data_fingerprint))
+    summary.close()
+
+    # The figures are drawn without pyplot (see author_report.py), the workers never need a display
+    with profiling.stage('render'):
+        if tasks:
+            with multiprocessing.Pool(min(args.workers, len(tasks))) as pool:
+                for author, error in tqdm(pool.imap_unordered(render_task, tasks), total=len(tasks), unit='author'):
+                    status[author] = 'rendered' if error is None else 'failed'
+                    if error is not None:
+                        print(f"**Report of {author} failed: {error}")
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    pd.DataFrame({'Author': authors, 'Status': [status[author] for author in authors]}).to_csv(os.path.join(args.output_dir, 'index.csv'), index=False)
+
+    counts = pd.Series(status).value_counts()
+    for name in ('rendered', 'unchanged', 'failed', 'unknown'):
+        profiling.count(f'authors_{name}', int(counts.get(name, 0)))
+    print(f"{counts.get('rendered', 0)} reports rendered, {counts.get('unchanged', 0)} unchanged, "
+          f"{counts.get('failed', 0)} failed, {counts.get('unknown', 0)} unknown authors in {args.output_dir}")
+    profiling.finish()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Project Name: MACHINE LEARNING TECHNIQUES FOR ESTIMATING SUICIDAL RISK ON SOCIAL MEDIA
+Author: Samuel Bernier
+Thesis Paper (French): https://uqo.on.worldcat.org/oclc/1415207814
+GitHub repository: https://github.com/BernierS/SetFit_Suicidal_Risk
+Huggin Face repository: https://huggingface.co/BernierS/SetFit_Suicidal_Risk
+File Description:
+    This file renders the report of one author for Batch-Reports.py: the pie chart and the breakdown of the labels
+    translated in French, and the word cloud of the subreddits of the author. The figures are drawn with the
+    matplotlib Figure class directly, without pyplot, so they never open a window and can be drawn in any process.
+--------------------------------------------------------------------------------
+This file is part of the MACHINE LEARNING TECHNIQUES FOR ESTIMATING SUICIDAL RISK SUICIDAL RISK ON SOCIAL NETWORKS project,
+developed as a part of Samuel Bernier's thesis. For more information, visit https://uqo.on.worldcat.org/oclc/1415207814.
+--------------------------------------------------------------------------------
+"""
+
+import hashlib
+import json
+import os
+import pandas as pd
+
+from matplotlib.figure import Figure
+from wordcloud import WordCloud
+
+# Translation dictionary
+translations = {
+    'Ability to hope for change': 'Capacité à espérer un changement',
+    'Previous attempt': 'Tentatives de suicide antérieures',
+    'Ability to control oneself': 'Capacité à se contrôler',
+    'Ability to take care of oneself': 'Capacité à prendre soin de soi',
+    'Presence of a loved one': 'Présence des proches',
+    'Consumption': 'Usage de substances',
+    'Suicidal planning': 'Planification du suicide',
+    'Other': 'Autre',
+}
+
+# Change it when the content of the reports changes, so every author is rendered again
+report_version = 1
+
+# Files of the report of an author, the fingerprint is written last
+report_files = ['pie_chart.png', 'labels.csv', 'posts.csv', 'word_cloud.png']
+fingerprint_file = 'fingerprint.txt'
+
+# Hash of the data of an author, the report is only rendered again when it changes
+def fingerprint(data):
+    content = json.dumps({
+        'version': report_version,
+        'labels': data['label_counts'].to_dict(),
+        'posts': data['posts'].astype(str).values.tolist(),
+        'subreddits': data['subreddit_counts'].to_dict(),
+    }, sort_keys=True)
+    return hashlib.blake2b(content.encode('utf-8'), digest_size=16).hexdigest()
+
+def is_up_to_date(author_dir, data_fingerprint):
+    path = os.path.join(author_dir, fingerprint_file)
+    if not os.path.isfile(path) or not all(os.path.isfile(os.path.join(author_dir, name)) for name in report_files):
+        return False
+    with open(path, 'r', encoding='utf-8') as f:
+        return f.read().strip() == data_fingerprint
+
+# Render the report of one author, the data comes from Batch-Reports.py (label counts, posts and subreddit counts)
+def render_author_report(author, data, author_dir, data_fingerprint):
+    os.makedirs(author_dir, exist_ok=True)
+
+    # Breakdown of the labels translated in French
+    label_counts = data['label_counts']
+    breakdown = pd.DataFrame({
+        'Label Text': label_counts.index,
+        'Classe': [translations.get(label, label) for label in label_counts.index],
+        'Phrases': label_counts.to_numpy(),
+    })
+    breakdown['Pourcentage'] = (breakdown['Phrases'] / max(breakdown['Phrases'].sum(), 1) * 100).round(1)
+    breakdown.to_csv(os.path.join(author_dir, 'labels.csv'), index=False)
+    data['posts'].to_csv(os.path.join(author_dir, 'posts.csv'), index=False)
+
+    # Pie chart of the labels
+    fig = Figure(figsize=(10, 7))
+    ax = fig.subplots()
+    if len(label_counts) > 0:
+        ax.pie(breakdown['Phrases'], labels=breakdown['Classe'], autopct='%1.1f%%', startangle=90)
+    ax.set_title(f'Classes associées avec l\'auteur: {author}')
+    fig.savefig(os.path.join(author_dir, 'pie_chart.png'), bbox_inches='tight')
+
+    # Word cloud of the subreddits where the author posted
+    fig = Figure(figsize=(12, 8))
+    ax = fig.subplots()
+    subreddit_counts = {str(subreddit): int(count) for subreddit, count in data['subreddit_counts'].items() if count > 0}
+    if subreddit_counts:
+        wordcloud = WordCloud(width=800, height=400, background_color='white', colormap='viridis').generate_from_frequencies(subreddit_counts)
+        ax.imshow(wordcloud, interpolation='bilinear')
+    ax.axis('off')
+    ax.set_title(f'Subreddits de l\'auteur: {author}')
+    fig.savefig(os.path.join(author_dir, 'word_cloud.png'), bbox_inches='tight')
+
+    # Written last, an interrupted render is done again on the next run
+    with open(os.path.join(author_dir, fingerprint_file), 'w', encoding='utf-8') as f:
+        f.write(data_fingerprint)
+    return author
+
+# Entry point of the workers of Batch-Reports.py, an error is returned instead of stopping the other reports
+def render_task(task):
+    author, data, author_dir, data_fingerprint = task
+    try:
+        render_author_report(author, data, author_dir, data_fingerprint)
+        return author, None
+    except Exception as e:
+        return author, f"{type(e).__name__}: {e}"
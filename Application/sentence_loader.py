@@ -0,0 +1,118 @@
+"""
+Project Name: MACHINE LEARNING TECHNIQUES FOR ESTIMATING SUICIDAL RISK ON SOCIAL MEDIA
+Author: Samuel Bernier
+Thesis Paper (French): https://uqo.on.worldcat.org/oclc/1415207814
+GitHub repository: https://github.com/BernierS/SetFit_Suicidal_Risk
+Huggin Face repository: https://huggingface.co/BernierS/SetFit_Suicidal_Risk
+File Description:
+    This file contains the loading of the scored sentences for Application.py when the summary index is not used.
+    Only the requested columns are read, the repeated strings (author, subreddit, label) as categories, and the
+    statistics can be computed chunk by chunk so the whole dataset is never in memory at once.
+--------------------------------------------------------------------------------
+This file is part of the MACHINE LEARNING TECHNIQUES FOR ESTIMATING SUICIDAL RISK SUICIDAL RISK ON SOCIAL NETWORKS project,
+developed as a part of Samuel Bernier's thesis. For more information, visit https://uqo.on.worldcat.org/oclc/1415207814.
+--------------------------------------------------------------------------------
+"""
+
+import glob
+import os
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+# Outputs of SetFit-Pred.py, the Parquet dataset is used when it exists
+default_sentences_file = 'Data/reddit_sentences.csv'
+default_parquet_dir = 'Data/reddit_sentences_parquet'
+
+# Rows per chunk, the peak memory of the chunked statistics depends on it and not on the size of the dataset
+default_chunk_rows = 100000
+
+# Columns of the sentences table of the Parquet dataset, the others (e.g. Title) are in the posts table keyed by ID
+parquet_sentence_columns = ('ID', 'Author', 'Subreddit', 'Sentences', 'Label', 'Label Text', 'Cluster')
+
+# The repeated text columns are read as categories instead of one string per row
+category_columns = ('Author', 'Label Text', 'Subreddit')
+
+def _split_columns(columns):
+    post_columns = [c for c in columns if c not in parquet_sentence_columns]
+    sentence_columns = [c for c in columns if c not in post_columns]
+    if post_columns and 'ID' not in sentence_columns:
+        sentence_columns.append('ID')
+    return sentence_columns, post_columns
+
+# Load the scored sentences with only the requested columns
+def load_sentences(columns, sentences_file=default_sentences_file, parquet_dir=default_parquet_dir):
+    if os.path.isdir(parquet_dir):
+        sentence_columns, post_columns = _split_columns(columns)
+        df = pd.read_parquet(os.path.join(parquet_dir, 'sentences'), columns=sentence_columns)
+        if post_columns:
+            # A post split across two batches by an older SetFit-Pred.py is in two parts, it is merged once
+            posts = pd.read_parquet(os.path.join(parquet_dir, 'posts'), columns=['ID'] + post_columns).drop_duplicates('ID')
+            df = df.merge(posts, on='ID', how='left')
+        return df[columns]
+
+    categories = {c: 'category' for c in category_columns if c in columns}
+    return pd.read_csv(sentences_file, usecols=columns, dtype=categories)[columns]
+
+# Same as load_sentences(), one chunk of rows at a time
+def iter_sentences(columns, chunk_rows=default_chunk_rows, sentences_file=default_sentences_file, parquet_dir=default_parquet_dir):
+    if os.path.isdir(parquet_dir):
+        sentence_columns, post_columns = _split_columns(columns)
+        for path in sorted(glob.glob(os.path.join(parquet_dir, 'sentences', 'part-*.parquet'))):
+            # The posts part with the same number has the posts of these sentences
+            posts = None
+            if post_columns:
+                posts = pd.read_parquet(os.path.join(parquet_dir, 'posts', os.path.basename(path)), columns=['ID'] + post_columns)
+            for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_rows, columns=sentence_columns):
+                chunk = batch.to_pandas()
+                if posts is not None:
+                    chunk = chunk.merge(posts, on='ID', how='left')
+                yield chunk[columns]
+        return
+
+    categories = {c: 'category' for c in category_columns if c in columns}
+    for chunk in pd.read_csv(sentences_file, usecols=columns, dtype=categories, chunksize=chunk_rows):
+        yield chunk[columns]
+
+def _add_counts(total, counts):
+    counts = counts[counts > 0]
+    counts.index = counts.index.astype(str)
+    return counts if total is None else total.add(counts, fill_value=0)
+
+def _sorted_counts(counts, name):
+    counts = counts.astype('int64').sort_values(ascending=False, kind='stable')
+    counts.index.name = name
+    counts.name = 'count'
+    return counts
+
+# Statistics of complete_dataset() in Application.py, computed one chunk at a time
+# The IDs are kept as 64 bits hashes to count them without keeping millions of strings
+def chunked_stats(chunks):
+    label_counts = subreddit_counts = author_counts = None
+    id_hashes = []
+    for chunk in chunks:
+        label_counts = _add_counts(label_counts, chunk['Label Text'].value_counts())
+        subreddit_counts = _add_counts(subreddit_counts, chunk['Subreddit'].value_counts())
+        author_counts = _add_counts(author_counts, chunk['Author'].value_counts())
+        id_hashes.append(np.unique(pd.util.hash_array(chunk['ID'].astype(str).to_numpy())))
+
+    if label_counts is None:
+        empty = pd.Series(dtype='int64')
+        return {'authors': 0, 'posts': 0, 'subreddits': 0, 'label_counts': empty, 'subreddit_counts': empty}
+    return {
+        'authors': len(author_counts),
+        'posts': len(np.unique(np.concatenate(id_hashes))),
+        'subreddits': len(subreddit_counts),
+        'label_counts': _sorted_counts(label_counts, 'Label Text'),
+        'subreddit_counts': _sorted_counts(subreddit_counts, 'Subreddit'),
+    }
+
+# Rows of one author, filtered one chunk at a time
+def author_sentences(author, chunks):
+    rows = []
+    empty = pd.DataFrame()
+    for chunk in chunks:
+        empty = chunk.iloc[:0]
+        rows.append(chunk[chunk['Author'] == author])
+    rows = [chunk for chunk in rows if len(chunk) > 0]
+    return pd.concat(rows, ignore_index=True) if rows else empty
@@ -0,0 +1,103 @@
+"""
+Project Name: MACHINE LEARNING TECHNIQUES FOR ESTIMATING SUICIDAL RISK ON SOCIAL MEDIA
+Author: Samuel Bernier
+Thesis Paper (French): https://uqo.on.worldcat.org/oclc/1415207814
+GitHub repository: https://github.com/BernierS/SetFit_Suicidal_Risk
+Huggin Face repository: https://huggingface.co/BernierS/SetFit_Suicidal_Risk
+File Description:
+    This file checks that text_normalization.py cleans the text exactly like the original process_text() of the
+    crawler, on the texts of the project, on edge cases and on random strings, and compares their speed.
+    It exits with an error when a text is cleaned differently.
+
+    python Common/Text-Normalization-Bench.py
+--------------------------------------------------------------------------------
+This file is part of the MACHINE LEARNING TECHNIQUES FOR ESTIMATING SUICIDAL RISK SUICIDAL RISK ON SOCIAL NETWORKS project,
+developed as a part of Samuel Bernier's thesis. For more information, visit https://uqo.on.worldcat.org/oclc/1415207814.
+--------------------------------------------------------------------------------
+"""
+
+import os
+import random
+import re
+import sys
+import time
+import pandas as pd
+
+from text_normalization import normalize_series, normalize_text
+
+# Constants
+data_files = {'Data/reddit_data.csv': 'Body or Selftext', 'Data/Suicide_Data_E16.csv': 'sentence'}
+random_strings = 200000
+benchmark_texts = 100000
+
+# Cases where the order of the three passes of the original matters
+edge_cases = [
+    '', 'plain text', 'a <b>bold</b> word', 'see https://example.com/page now', 'www.example.com', 'www\nexample',
+    'http://a<b>c', 'http<b>x', '<a http://x<b> c>', 'www<b>x', 'www<b> /><p', '<>x>', 'café ’quoted’',
+    'htétp://x', 'éhttp://x', '<aé>', 'emoji \U0001F600 end', '<br/>line<br/>line',
+]
+
+# The process_text() of Reddit_API.py before text_normalization.py, used as the reference
+def reference_process_text(text):
+    # Remove HTML tags
+    text = re.sub('<[^<]+?>', ' ', text)
+
+    # Remove URLs
+    text = re.sub(r'http\S+|www.\S+', '', text)
+
+    # Remove non-ASCII characters
+    text = re.sub('[^\x00-\x7F]+', '', text)
+
+    return text
+
+def load_texts():
+    texts = list(edge_cases)
+    for data_file, column in data_files.items():
+        if os.path.isfile(data_file):
+            texts += pd.read_csv(data_file, usecols=[column])[column].dropna().astype(str).tolist()
+
+    # Random strings made of the pieces the patterns look for
+    rng = random.Random(0)
+    pieces = ['<', '>', '<b>', '</a>', '<>', 'h', 't', 'p', 'w', 'www', 'http', 'https://a.b/c', '.', ' ', '\n', '\t', 'x', '/', 'é', '\U0001F600']
+    texts += [''.join(rng.choice(pieces) for _ in range(rng.randint(0, 25))) for _ in range(random_strings)]
+    return texts
+
+def check_equivalence(texts):
+    mismatches = [text for text in texts if normalize_text(text) != reference_process_text(text)]
+    for text in mismatches[:10]:
+        print(f"Mismatch: {text!r} -> {normalize_text(text)!r}, expected {reference_process_text(text)!r}")
+
+    # The Series version must give the same result as the scalar one
+    series = pd.Series(texts + [None])
+    batch = normalize_series(series)
+    series_mismatches = sum(a != normalize_text(b) for a, b in zip(batch[:-1], texts)) + (not pd.isna(batch.iloc[-1]))
+
+    print(f"{len(texts)} texts checked: {len(mismatches)} differ from the original, {series_mismatches} differ between normalize_series and normalize_text")
+    return len(mismatches) + series_mismatches
+
+def benchmark(texts):
+    texts = (texts * (benchmark_texts // len(texts) + 1))[:benchmark_texts]
+    series = pd.Series(texts)
+    runs = {
+        # The crawler used to clean each post twice
+        'original, twice per post': lambda: [(reference_process_text(text), reference_process_text(text)) for text in texts],
+        'original': lambda: [reference_process_text(text) for text in texts],
+        'normalize_text': lambda: [normalize_text(text) for text in texts],
+        'normalize_series': lambda: normalize_series(series),
+    }
+    for name, run in runs.items():
+        start_time = time.perf_counter()
+        run()
+        elapsed = time.perf_counter() - start_time
+        print(f"{name:26} {len(texts) / elapsed:12,.0f} texts/s")
+
+def main():
+    texts = load_texts()
+    errors = check_equivalence(texts)
+
+    # The speed is measured on the real texts only, without the random strings
+    benchmark(texts[:-random_strings])
+    sys.exit(1 if errors else 0)
+
+if __name__ == "__main__":
+    main()
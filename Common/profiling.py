@@ -0,0 +1,180 @@
+"""
+Project Name: MACHINE LEARNING TECHNIQUES FOR ESTIMATING SUICIDAL RISK ON SOCIAL MEDIA
+Author: Samuel Bernier
+Thesis Paper (French): https://uqo.on.worldcat.org/oclc/1415207814
+GitHub repository: https://github.com/BernierS/SetFit_Suicidal_Risk
+Huggin Face repository: https://huggingface.co/BernierS/SetFit_Suicidal_Risk
+File Description:
+    This file contains the timing instrumentation shared by the scripts of the project (crawler, prediction, application).
+    Each script times its stages (wall and CPU time) and counts what it processed (rows, sentences, tokens, bytes written).
+    A JSON line is written per batch to Data/logs/<script>.jsonl, followed by a summary line when the script ends.
+    The CPU time of a stage is the one of the thread running it, so the stages run by the crawl threads at the same time
+    do not count each other's CPU. The threads started by native code (e.g. the intra-op threads of torch or onnxruntime)
+    are not included, the CPU time of the whole process is in the summary line.
+
+    Environment variables:
+        PIPELINE_LOG_DIR    Folder of the JSON logs (default: Data/logs)
+        PIPELINE_CPROFILE   Set to 1 to also run cProfile, the stats go to Data/logs/<script>.prof
+    The name of the thread is set to "<script>:<stage>" during each stage, so py-spy (py-spy dump --pid <pid>)
+    shows which stage a stack belongs to. The PID is in every log line.
+--------------------------------------------------------------------------------
+This file is part of the MACHINE LEARNING TECHNIQUES FOR ESTIMATING SUICIDAL RISK SUICIDAL RISK ON SOCIAL NETWORKS project,
+developed as a part of Samuel Bernier's thesis. For more information, visit https://uqo.on.worldcat.org/oclc/1415207814.
+--------------------------------------------------------------------------------
+"""
+
+import cProfile
+import datetime
+import json
+import os
+import threading
+import time
+
+from collections import defaultdict
+from contextlib import contextmanager
+
+class Profiler:
+    """
+    Accumulates the time spent in each stage and the counters, both since the last log line and in total.
+    """
+
+    def __init__(self, script, log_dir=None, use_cprofile=None):
+        self.script = script
+        self.log_dir = log_dir or os.environ.get("PIPELINE_LOG_DIR", 'Data/logs')
+        self.log_file = os.path.join(self.log_dir, f'{script}.jsonl')
+        os.makedirs(self.log_dir, exist_ok=True)
+
+        self.lock = threading.Lock()
+        self.batch_stages = defaultdict(lambda: {'wall_s': 0.0, 'cpu_s': 0.0, 'calls': 0})
+        self.total_stages = defaultdict(lambda: {'wall_s': 0.0, 'cpu_s': 0.0, 'calls': 0})
+        self.batch_counters = defaultdict(int)
+        self.total_counters = defaultdict(int)
+        self.start_time = time.perf_counter()
+        self.start_cpu = time.process_time()
+        self.batches = 0
+
+        if use_cprofile is None:
+            use_cprofile = os.environ.get("PIPELINE_CPROFILE") == '1'
+        self.cprofile = cProfile.Profile() if use_cprofile else None
+        if self.cprofile is not None:
+            self.cprofile.enable()
+
+    @contextmanager
+    def stage(self, name):
+        thread = threading.current_thread()
+        previous_name = thread.name
+        thread.name = f'{self.script}:{name}'
+        wall_start = time.perf_counter()
+        cpu_start = time.thread_time()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - wall_start
+            cpu = time.thread_time() - cpu_start
+            thread.name = previous_name
+            with self.lock:
+                for stages in (self.batch_stages, self.total_stages):
+                    stages[name]['wall_s'] += wall
+                    stages[name]['cpu_s'] += cpu
+                    stages[name]['calls'] += 1
+
+    def count(self, name, value=1):
+        with self.lock:
+            self.batch_counters[name] += int(value)
+            self.total_counters[name] += int(value)
+
+    def _write(self, record):
+        with open(self.log_file, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record) + '\n')
+
+    # Write the stages and counters since the last call as one JSON line
+    def log(self, **fields):
+        with self.lock:
+            self.batches += 1
+            record = {
+                'script': self.script,
+                'pid': os.getpid(),
+                'time': datetime.datetime.now().isoformat(),
+                'sequence': self.batches,
+                **fields,
+                'stages': dict(self.batch_stages),
+                'counters': dict(self.batch_counters),
+            }
+            self.batch_stages.clear()
+            self.batch_counters.clear()
+        self._write(record)
+        return record
+
+    # Write the summary line, print it and save the cProfile stats
+    def finish(self):
+        if self.batch_stages or self.batch_counters:
+            self.log()
+
+        total_wall = time.perf_counter() - self.start_time
+        total_cpu = time.process_time() - self.start_cpu
+        record = {
+            'script': self.script,
+            'pid': os.getpid(),
+            'time': datetime.datetime.now().isoformat(),
+            'summary': True,
+            'wall_s': total_wall,
+            'cpu_s': total_cpu,
+            'stages': dict(self.total_stages),
+            'counters': dict(self.total_counters),
+        }
+        self._write(record)
+
+        print(f"\nTime per stage ({self.script}, {total_wall:.1f} s in total, {total_cpu:.1f} s of CPU for the process):")
+        for name, stage in sorted(self.total_stages.items(), key=lambda item: -item[1]['wall_s']):
+            print(f"    {name:20} wall {stage['wall_s']:9.2f} s  cpu {stage['cpu_s']:9.2f} s  calls {stage['calls']}")
+        for name, value in self.total_counters.items():
+            print(f"    {name:20} {value}")
+
+        if self.cprofile is not None:
+            self.cprofile.disable()
+            self.cprofile.dump_stats(os.path.join(self.log_dir, f'{self.script}.prof'))
+        return record
+
+class NullProfiler:
+    """
+    Used when no profiler was started, so the instrumented code does not have to check.
+    """
+
+    @contextmanager
+    def stage(self, name):
+        yield
+
+    def count(self, name, value=1):
+        pass
+
+    def log(self, **fields):
+        return None
+
+    def finish(self):
+        return None
+
+# Profiler of the running script, shared by the modules it imports
+active_profiler = NullProfiler()
+
+def start(script, **kwargs):
+    global active_profiler
+    active_profiler = Profiler(script, **kwargs)
+    return active_profiler
+
+def get_profiler():
+    return active_profiler
+
+def stage(name):
+    return active_profiler.stage(name)
+
+def count(name, value=1):
+    active_profiler.count(name, value)
+
+def log(**fields):
+    return active_profiler.log(**fields)
+
+def finish():
+    global active_profiler
+    record = active_profiler.finish()
+    active_profiler = NullProfiler()
+    return record
@@ -0,0 +1,235 @@
+"""
+Project Name: MACHINE LEARNING TECHNIQUES FOR ESTIMATING SUICIDAL RISK ON SOCIAL MEDIA
+Author: Samuel Bernier
+Thesis Paper (French): https://uqo.on.worldcat.org/oclc/1415207814
+GitHub repository: https://github.com/BernierS/SetFit_Suicidal_Risk
+Huggin Face repository: https://huggingface.co/BernierS/SetFit_Suicidal_Risk
+File Description:
+    This file contains the summary index of the predictions, built by SetFit-Pred.py and read by Application.py.
+    It keeps small label count tables per author and per subreddit, and one row per post with the labels of its
+    sentences, in a SQLite file with the author as key. The statistics and the author lookups of Application.py read
+    these tables instead of the millions of rows of reddit_sentences. Each update only reads the rows appended to
+    the output since the last one (bytes for the CSV file, parts for the Parquet dataset).
+--------------------------------------------------------------------------------
+This file is part of the MACHINE LEARNING TECHNIQUES FOR ESTIMATING SUICIDAL RISK SUICIDAL RISK ON SOCIAL NETWORKS project,
+developed as a part of Samuel Bernier's thesis. For more information, visit https://uqo.on.worldcat.org/oclc/1415207814.
+--------------------------------------------------------------------------------
+"""
+
+import glob
+import hashlib
+import io
+import os
+import sqlite3
+import pandas as pd
+
+# Columns of the predictions read by the index
+summary_columns = ['ID', 'Author', 'Title', 'Subreddit', 'Label', 'Label Text']
+
+# Rows read from the CSV file at a time
+chunk_rows = 500000
+
+# Bytes before the last offset compared at each update, to notice an output rewritten since the last update
+check_bytes = 4096
+
+# Reads a file object up to a fixed number of bytes, so rows appended during an update wait for the next one
+class _LimitedReader(io.RawIOBase):
+    def __init__(self, f, remaining):
+        self.f = f
+        self.remaining = remaining
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        count = self.f.readinto(memoryview(buffer)[:min(len(buffer), self.remaining)])
+        self.remaining -= count
+        return count
+
+def _hash_range(path, start, end):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        return hashlib.blake2b(f.read(end - start), digest_size=16).hexdigest()
+
+class SummaryIndex:
+    """
+    Label counts per author and per subreddit, and the labels of each post, updated incrementally from the output
+    of SetFit-Pred.py. Each update is one transaction, an interrupted update leaves the index as it was.
+    """
+
+    def __init__(self, path='Data/reddit_summary.db'):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.connection = sqlite3.connect(path, timeout=60)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS author_labels (
+                author TEXT NOT NULL,
+                label_text TEXT NOT NULL,
+                count INTEGER NOT NULL,
+                PRIMARY KEY (author, label_text)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS subreddit_labels (
+                subreddit TEXT NOT NULL,
+                label_text TEXT NOT NULL,
+                count INTEGER NOT NULL,
+                PRIMARY KEY (subreddit, label_text)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS posts (
+                id TEXT PRIMARY KEY,
+                author TEXT,
+                title TEXT,
+                subreddit TEXT,
+                labels TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS posts_author ON posts (author);
+            CREATE TABLE IF NOT EXISTS sources (
+                path TEXT PRIMARY KEY,
+                bytes_read INTEGER NOT NULL,
+                prefix_hash TEXT,
+                tail_hash TEXT
+            );
+            CREATE TABLE IF NOT EXISTS ingested_parts (
+                path TEXT NOT NULL,
+                part TEXT NOT NULL,
+                PRIMARY KEY (path, part)
+            ) WITHOUT ROWID;
+        """)
+        self.connection.commit()
+
+    def close(self):
+        self.connection.close()
+
+    # Add the rows written to the output since the last update, the output is a CSV file or a Parquet directory
+    # Returns the number of sentences added
+    def update(self, output_path):
+        if os.path.isdir(output_path):
+            return self._update_parquet(output_path)
+        if os.path.isfile(output_path):
+            return self._update_csv(output_path)
+        return 0
+
+    def _clear(self):
+        for table in ('author_labels', 'subreddit_labels', 'posts', 'sources', 'ingested_parts'):
+            self.connection.execute(f"DELETE FROM {table}")
+
+    def _add(self, df):
+        if len(df) == 0:
+            return 0
+
+        # The labels of a post keep the order of its sentences, a post split across two updates is completed
+        posts = df.assign(Label=df['Label'].astype(str)).groupby('ID', sort=False).agg(
+            Author=('Author', 'first'), Title=('Title', 'first'), Subreddit=('Subreddit', 'first'), Labels=('Label', ','.join)
+        )
+        self.connection.executemany(
+            "INSERT INTO posts (id, author, title, subreddit, labels) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT(id) DO UPDATE SET labels = labels || ',' || excluded.labels",
+            ((str(i), author, title, subreddit, labels) for i, author, title, subreddit, labels in posts.itertuples(name=None)),
+        )
+
+        for table, key, column in (('author_labels', 'Author', 'author'), ('subreddit_labels', 'Subreddit', 'subreddit')):
+            counts = df.groupby([key, 'Label Text'], observed=True, sort=False).size()
+            self.connection.executemany(
+                f"INSERT INTO {table} VALUES (?, ?, ?) ON CONFLICT({column}, label_text) DO UPDATE SET count = count + excluded.count",
+                ((str(name), str(label_text), int(count)) for (name, label_text), count in counts.items()),
+            )
+        return len(df)
+
+    def _update_csv(self, path):
+        size = os.path.getsize(path)
+        source = self.connection.execute("SELECT bytes_read, prefix_hash, tail_hash FROM sources WHERE path = ?", (path,)).fetchone()
+        with open(path, 'rb') as f:
+            header = f.readline()
+            # Only complete lines, a line being written is read by the next update
+            f.seek(max(size - 65536, 0))
+            end = max(size - 65536, 0) + f.read().rfind(b'\n') + 1
+        prefix_hash = _hash_range(path, 0, min(len(header) + check_bytes, end))
+
+        with self.connection:
+            # Start over when the output was rewritten (e.g. SetFit-Pred.py with incremental = False)
+            offset = len(header)
+            if source is not None:
+                previous_offset, previous_prefix, previous_tail = source
+                rewritten = previous_offset > end or previous_prefix != _hash_range(path, 0, min(len(header) + check_bytes, previous_offset)) \
+                    or previous_tail != _hash_range(path, max(previous_offset - check_bytes, 0), previous_offset)
+                if rewritten:
+                    print(f"{path} was rewritten, rebuilding the summary index")
+                    self._clear()
+                else:
+                    offset = previous_offset
+
+            added = 0
+            if end > offset:
+                columns = pd.read_csv(io.BytesIO(header), nrows=0).columns
+                with open(path, 'rb') as f:
+                    f.seek(offset)
+                    reader = io.BufferedReader(_LimitedReader(f, end - offset))
+                    for chunk in pd.read_csv(reader, header=None, names=columns, usecols=summary_columns, dtype={'ID': str}, chunksize=chunk_rows):
+                        added += self._add(chunk)
+
+            self.connection.execute(
+                "INSERT OR REPLACE INTO sources (path, bytes_read, prefix_hash, tail_hash) VALUES (?, ?, ?, ?)",
+                (path, max(end, offset), prefix_hash, _hash_range(path, max(max(end, offset) - check_bytes, 0), max(end, offset))),
+            )
+        return added
+
+    def _update_parquet(self, directory):
+        parts = sorted(os.path.basename(part) for part in glob.glob(os.path.join(directory, 'sentences', 'part-*.parquet')))
+        ingested = {row[0] for row in self.connection.execute("SELECT part FROM ingested_parts WHERE path = ?", (directory,))}
+
+        added = 0
+        with self.connection:
+            # A part that disappeared means the dataset was written again from scratch
+            if ingested - set(parts):
+                print(f"{directory} was rewritten, rebuilding the summary index")
+                self._clear()
+                ingested = set()
+
+            # The sentences do not have the title, it is in the posts part with the same number
+            for part in parts:
+                if part in ingested:
+                    continue
+                sentences = pd.read_parquet(os.path.join(directory, 'sentences', part), columns=['ID', 'Author', 'Subreddit', 'Label', 'Label Text'])
+                posts = pd.read_parquet(os.path.join(directory, 'posts', part), columns=['ID', 'Title'])
+                added += self._add(sentences.merge(posts, on='ID', how='left'))
+                self.connection.execute("INSERT INTO ingested_parts (path, part) VALUES (?, ?)", (directory, part))
+        return added
+
+    # ------------------Queries of Application.py----------------------------
+    def counts(self):
+        return {
+            'authors': self.connection.execute("SELECT COUNT(DISTINCT author) FROM author_labels").fetchone()[0],
+            'posts': self.connection.execute("SELECT COUNT(*) FROM posts").fetchone()[0],
+            'subreddits': self.connection.execute("SELECT COUNT(DISTINCT subreddit) FROM subreddit_labels").fetchone()[0],
+        }
+
+    def label_counts(self):
+        return self._series("SELECT label_text, SUM(count) FROM subreddit_labels GROUP BY label_text ORDER BY 2 DESC", (), 'Label Text')
+
+    def subreddit_counts(self, limit=None):
+        query = "SELECT subreddit, SUM(count) FROM subreddit_labels GROUP BY subreddit ORDER BY 2 DESC"
+        return self._series(query + (" LIMIT ?" if limit else ""), (limit,) if limit else (), 'Subreddit')
+
+    def author_label_counts(self, author):
+        return self._series("SELECT label_text, count FROM author_labels WHERE author = ? ORDER BY count DESC", (author,), 'Label Text')
+
+    # Posts of an author with the list of the labels of their sentences
+    def author_posts(self, author):
+        rows = self.connection.execute("SELECT author, title, id, labels FROM posts WHERE author = ? ORDER BY title, id", (author,)).fetchall()
+        df = pd.DataFrame(rows, columns=['Author', 'Title', 'ID', 'Label'])
+        df['Label'] = [[int(label) for label in labels.split(',')] for labels in df['Label']]
+        return df
+
+    # Number of posts of an author per subreddit
+    def author_subreddit_counts(self, author):
+        return self._series("SELECT subreddit, COUNT(*) FROM posts WHERE author = ? GROUP BY subreddit ORDER BY 2 DESC, 1", (author,), 'Subreddit')
+
+    # Authors with at least min_count sentences with one of the labels, the most flagged first
+    def authors_with_labels(self, label_texts, min_count=1, limit=None):
+        placeholders = ', '.join('?' * len(label_texts))
+        query = f"SELECT author, SUM(count) FROM author_labels WHERE label_text IN ({placeholders}) GROUP BY author HAVING SUM(count) >= ? ORDER BY 2 DESC, 1"
+        return self._series(query + (" LIMIT ?" if limit else ""), (*label_texts, min_count) + ((limit,) if limit else ()), 'Author')
+
+    def _series(self, query, parameters, index_name):
+        rows = self.connection.execute(query, parameters).fetchall()
+        return pd.Series([count for _, count in rows], index=pd.Index([name for name, _ in rows], name=index_name), name='count', dtype='int64')
@@ -0,0 +1,53 @@
+"""
+Project Name: MACHINE LEARNING TECHNIQUES FOR ESTIMATING SUICIDAL RISK ON SOCIAL MEDIA
+Author: Samuel Bernier
+Thesis Paper (French): https://uqo.on.worldcat.org/oclc/1415207814
+GitHub repository: https://github.com/BernierS/SetFit_Suicidal_Risk
+Huggin Face repository: https://huggingface.co/BernierS/SetFit_Suicidal_Risk
+File Description:
+    This file contains the text cleaning shared by the crawler (Reddit_API.py), the training (SetFit-Train.py)
+    and the predictions (SetFit-Pred.py, SetFit-Server.py), so the model always sees the same text.
+    It removes the HTML tags, the URLs and the non-ASCII characters, with the same result as the three re.sub()
+    of the original process_text() but in a single pass (checked by Text-Normalization-Bench.py).
+--------------------------------------------------------------------------------
+This file is part of the MACHINE LEARNING TECHNIQUES FOR ESTIMATING SUICIDAL RISK SUICIDAL RISK ON SOCIAL NETWORKS project,
+developed as a part of Samuel Bernier's thesis. For more information, visit https://uqo.on.worldcat.org/oclc/1415207814.
+--------------------------------------------------------------------------------
+"""
+
+import re
+import numpy as np
+import pandas as pd
+
+# An HTML tag, e.g. <br> or <a href="...">, replaced by a space
+# Same matches as the lazy '<[^<]+?>' of the original, without its backtracking
+tag_pattern = r'<[^<][^<>]*>'
+
+# The original removed the tags before the URLs, so a URL stops where a tag starts
+url_character = rf'(?:(?!{tag_pattern})\S)'
+
+# In the original 'www.' the dot matched any character but a newline, including the space left by a tag
+clean_pattern = re.compile(
+    rf'(?P<tag>{tag_pattern})'
+    rf'|http{url_character}+'
+    rf'|www(?:{url_character}|[^\S\n]|{tag_pattern}){url_character}+'
+    r'|[^\x00-\x7F]+'
+)
+
+def _replacement(match):
+    return ' ' if match.lastgroup == 'tag' else ''
+
+# Remove HTML tags, URLs and non-ASCII characters
+def normalize_text(text):
+    # Most texts have nothing to remove, these checks are much faster than the regular expression
+    if text.isascii() and '<' not in text and 'http' not in text and 'www' not in text:
+        return text
+    return clean_pattern.sub(_replacement, text)
+
+# Same as normalize_text() on a pandas Series, each distinct text is cleaned once and the missing values are kept
+def normalize_series(texts):
+    codes, uniques = pd.factorize(texts)
+    cleaned = np.array([normalize_text(text) for text in uniques] + [np.nan], dtype=object)
+
+    # The missing values have the code -1, the last element
+    return pd.Series(cleaned[codes], index=texts.index, name=texts.name)
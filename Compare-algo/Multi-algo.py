@@ -6,110 +6,238 @@ GitHub repository: https://github.com/BernierS/SetFit_Suicidal_Risk
 Huggin Face repository: https://huggingface.co/BernierS/SetFit_Suicidal_Risk
 File Description:
     This file is used to compare the accuracy of different machine learning algorithms on the dataset.
+    The sentences are turned into TF-IDF features once, then the classifiers are cross-validated on the train split
+    and scored on the test split in parallel, one process per classifier. Each classifier gets its accuracy, macro-F1,
+    fit time, prediction latency (from the raw sentence) and size, with the LSTM and the SetFit model as extra rows.
+    The results go to Data/benchmarks/multi_algo.json and multi_algo.csv.
 --------------------------------------------------------------------------------
-This file is part of the MACHINE LEARNING TECHNIQUES FOR ESTIMATING SUICIDAL RISK SUICIDAL RISK ON SOCIAL NETWORKS project, 
+This file is part of the MACHINE LEARNING TECHNIQUES FOR ESTIMATING SUICIDAL RISK SUICIDAL RISK ON SOCIAL NETWORKS project,
 developed as a part of Samuel Bernier's thesis. For more information, visit https://uqo.on.worldcat.org/oclc/1415207814.
 --------------------------------------------------------------------------------
 """
 
+import json
+import os
+import pickle
+import time
+import joblib
+import numpy as np
 import pandas as pd
-from sklearn.metrics import accuracy_score
+
+from joblib import Parallel, delayed
+from sklearn.base import clone
+from sklearn.metrics import accuracy_score, f1_score
 from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.model_selection import train_test_split
+from sklearn.model_selection import StratifiedKFold, cross_validate, train_test_split
 from sklearn.naive_bayes import MultinomialNB
 from sklearn.ensemble import GradientBoostingClassifier, RandomForestClassifier
 from sklearn.linear_model import LogisticRegression, Perceptron
 from sklearn.svm import SVC
 from sklearn.neural_network import MLPClassifier
-from keras.preprocessing.sequence import pad_sequences
-from keras.models import Sequential
-from keras.layers import Embedding, LSTM, Dense
-from keras.preprocessing.text import Tokenizer
-
-# Load the dataset
-df = pd.read_csv('Data/Suicide_Data_E16.csv')
-
-# Split the dataset into training and testing sets
-X_train, X_test, y_train, y_test = train_test_split(df['sentence'], df['label'], test_size=0.2, random_state=42)
-
-# Create a TF-IDF vectorizer
-tfidf = TfidfVectorizer()
-# Fit the vectorizer on the training data
-X_train_tfidf = tfidf.fit_transform(X_train)
-
-# Train a Multinomial Naive Bayes classifier
-nb_clf = MultinomialNB()
-nb_clf.fit(X_train_tfidf, y_train)
-
-# Train a Random Forest classifier
-rf_clf = RandomForestClassifier()
-rf_clf.fit(X_train_tfidf, y_train)
-
-# Train a Logistic Regression classifier
-lr_clf = LogisticRegression()
-lr_clf.fit(X_train_tfidf, y_train)
-
-# Train an SVM classifier
-svm_clf = SVC()
-svm_clf.fit(X_train_tfidf, y_train)
+from sklearn.pipeline import Pipeline
 
-# Train an MLP classifier
-mlp_clf = MLPClassifier()
-mlp_clf.fit(X_train_tfidf, y_train)
+# Dataset and split, SetFit-Cascade-Report.py uses the same split
+data_file = 'Data/Suicide_Data_E16.csv'
+test_size = 0.2
+random_state = 42
 
-# Train an Gradient classifier
-gb_clf = GradientBoostingClassifier()
-gb_clf.fit(X_train_tfidf, y_train)
+# Number of folds of the cross-validation on the train split, and number of processes (-1 uses all the cores)
+cv_folds = 5
+n_jobs = -1
 
-# Train an MLP classifier
-pl_clf = Perceptron()
-pl_clf.fit(X_train_tfidf, y_train)
+# Predictions of one sentence at a time for the latency of each model
+latency_repeats = 200
 
-# Tokenize the text data
-tokenizer = Tokenizer()
-tokenizer.fit_on_texts(X_train)
+# Results of the benchmark
+report_file = 'Data/benchmarks/multi_algo.json'
+csv_file = 'Data/benchmarks/multi_algo.csv'
 
-# Convert the text data to sequences
-X_train_seq = tokenizer.texts_to_sequences(X_train)
-X_test_seq = tokenizer.texts_to_sequences(X_test)
+# The TF-IDF vectorizer with the Logistic Regression is the first step of the cascade of SetFit-Pred.py (see SetFIt/cascade.py)
+cascade_model_file = 'Data/tfidf_cascade.joblib'
 
-# Pad the sequences to a fixed length
+# LSTM on the word sequences, trained once on the train split (no cross-validation)
+include_lstm = True
 max_len = 100
-X_train_pad = pad_sequences(X_train_seq, maxlen=max_len)
-X_test_pad = pad_sequences(X_test_seq, maxlen=max_len)
-
-# Train an LSTM classifier
-lstm_clf = Sequential()
-lstm_clf.add(Embedding(len(tokenizer.word_index)+1, 100, input_length=max_len))
-lstm_clf.add(LSTM(100))
-lstm_clf.add(Dense(1, activation='sigmoid'))
-lstm_clf.compile(loss='binary_crossentropy', optimizer='adam', metrics=['accuracy'])
-lstm_clf.fit(X_train_pad, y_train, epochs=10, batch_size=32)
-
-# Make predictions on the test data
-nb_pred = nb_clf.predict(tfidf.transform(X_test))
-rf_pred = rf_clf.predict(tfidf.transform(X_test))
-lr_pred = lr_clf.predict(tfidf.transform(X_test))
-svm_pred = svm_clf.predict(tfidf.transform(X_test))
-mlp_pred = mlp_clf.predict(tfidf.transform(X_test))
-gb_pred = gb_clf.predict(tfidf.transform(X_test))
-pl_pred = pl_clf.predict(tfidf.transform(X_test))
-lstm_pred = (lstm_clf.predict(X_test_pad) > 0.5).astype("int32")
-
-# Calculate the accuracy of the models
-nb_accuracy = accuracy_score(y_test, nb_pred)
-rf_accuracy = accuracy_score(y_test, rf_pred)
-lr_accuracy = accuracy_score(y_test, lr_pred)
-svm_accuracy = accuracy_score(y_test, svm_pred)
-mlp_accuracy = accuracy_score(y_test, mlp_pred)
-gb_accuracy = accuracy_score(y_test, gb_pred)
-pl_accuracy = accuracy_score(y_test, pl_pred)
-lstm_accuracy = accuracy_score(y_test, lstm_pred)
-print('Naive Bayes Accuracy:', nb_accuracy)
-print('Random Forest Accuracy:', rf_accuracy)
-print('Logistic Regression Accuracy:', lr_accuracy)
-print('SVM Accuracy:', svm_accuracy)
-print('MLP Accuracy:', mlp_accuracy)
-print('GB Accuracy:', gb_accuracy)
-print('PL Accuracy:', pl_accuracy)
-print('LSTM Accuracy:', lstm_accuracy)
\ No newline at end of file
+lstm_epochs = 10
+lstm_batch_size = 32
+
+# The SetFit model of the Hub as a row of the table, it is not trained here
+# SetFit-Train.py uses its own split, some of the test sentences may be in its training data
+include_setfit = True
+setfit_model_id = "BernierS/SetFit_Suicidal_Risk"
+
+# Classifiers trained on the TF-IDF features
+def tfidf_models():
+    return {
+        'Naive Bayes': MultinomialNB(),
+        'Random Forest': RandomForestClassifier(),
+        'Logistic Regression': LogisticRegression(),
+        'SVM': SVC(),
+        'MLP': MLPClassifier(),
+        'Gradient Boosting': GradientBoostingClassifier(),
+        'Perceptron': Perceptron(),
+    }
+
+# Cross-validate a classifier on the cached train features, then fit it on the whole train split and score it on the test split
+# Runs in a worker process, so each call only uses one core
+def evaluate_model(name, model, X_train, y_train, X_test, y_test):
+    folds = StratifiedKFold(n_splits=cv_folds, shuffle=True, random_state=random_state)
+    scores = cross_validate(clone(model), X_train, y_train, cv=folds, scoring=['accuracy', 'f1_macro'])
+
+    start_time = time.perf_counter()
+    fitted = clone(model).fit(X_train, y_train)
+    fit_seconds = time.perf_counter() - start_time
+    predictions = fitted.predict(X_test)
+
+    return fitted, {
+        'model': name,
+        'cv_accuracy': float(scores['test_accuracy'].mean()),
+        'cv_accuracy_std': float(scores['test_accuracy'].std()),
+        'cv_f1_macro': float(scores['test_f1_macro'].mean()),
+        'accuracy': float(accuracy_score(y_test, predictions)),
+        'f1_macro': float(f1_score(y_test, predictions, average='macro')),
+        'fit_seconds': fit_seconds,
+        'model_bytes': len(pickle.dumps(fitted)),
+    }
+
+# Time the predictions from the raw sentences, for a whole batch and for one sentence at a time
+def latency(predict, sentences):
+    start_time = time.perf_counter()
+    predict(sentences)
+    batch_seconds = time.perf_counter() - start_time
+
+    latencies = []
+    for i in range(latency_repeats):
+        start_time = time.perf_counter()
+        predict([sentences[i % len(sentences)]])
+        latencies.append(time.perf_counter() - start_time)
+
+    return {
+        'batch_us_per_sentence': batch_seconds / len(sentences) * 1e6,
+        'single_p50_us': float(np.percentile(latencies, 50) * 1e6),
+        'single_p95_us': float(np.percentile(latencies, 95) * 1e6),
+    }
+
+def evaluate_lstm(X_train, y_train, X_test, y_test):
+    # Imported here, TensorFlow is only loaded when the LSTM is part of the benchmark
+    from keras.preprocessing.sequence import pad_sequences
+    from keras.models import Sequential
+    from keras.layers import Embedding, LSTM, Dense
+    from keras.preprocessing.text import Tokenizer
+
+    # Tokenize the text data
+    tokenizer = Tokenizer()
+    tokenizer.fit_on_texts(X_train)
+
+    # Convert the text data to sequences and pad them to a fixed length
+    X_train_pad = pad_sequences(tokenizer.texts_to_sequences(X_train), maxlen=max_len)
+
+    # One output per label, the labels are not binary
+    num_labels = int(max(y_train.max(), y_test.max())) + 1
+    lstm_clf = Sequential()
+    lstm_clf.add(Embedding(len(tokenizer.word_index)+1, 100, input_length=max_len))
+    lstm_clf.add(LSTM(100))
+    lstm_clf.add(Dense(num_labels, activation='softmax'))
+    lstm_clf.compile(loss='sparse_categorical_crossentropy', optimizer='adam', metrics=['accuracy'])
+
+    start_time = time.perf_counter()
+    lstm_clf.fit(X_train_pad, y_train, epochs=lstm_epochs, batch_size=lstm_batch_size, verbose=0)
+    fit_seconds = time.perf_counter() - start_time
+
+    def predict(sentences):
+        sequences = pad_sequences(tokenizer.texts_to_sequences(sentences), maxlen=max_len)
+        return lstm_clf.predict(sequences, verbose=0).argmax(axis=1)
+
+    predictions = predict(X_test)
+    result = {
+        'model': 'LSTM',
+        'accuracy': float(accuracy_score(y_test, predictions)),
+        'f1_macro': float(f1_score(y_test, predictions, average='macro')),
+        'fit_seconds': fit_seconds,
+        # float32 weights
+        'model_bytes': lstm_clf.count_params() * 4,
+    }
+    result.update(latency(predict, X_test))
+    return result
+
+def evaluate_setfit(X_test, y_test):
+    from setfit import SetFitModel
+
+    model = SetFitModel.from_pretrained(setfit_model_id)
+    predict = lambda sentences: np.asarray(model.predict(list(sentences)))
+    predictions = predict(X_test)
+
+    body_bytes = sum(parameter.numel() * parameter.element_size() for parameter in model.model_body.parameters())
+    result = {
+        'model': f'SetFit ({setfit_model_id})',
+        'accuracy': float(accuracy_score(y_test, predictions)),
+        'f1_macro': float(f1_score(y_test, predictions, average='macro')),
+        'fit_seconds': None,
+        'model_bytes': body_bytes + len(pickle.dumps(model.model_head)),
+    }
+    result.update(latency(predict, X_test))
+    return result
+
+def write_report(results, summary):
+    os.makedirs(os.path.dirname(report_file), exist_ok=True)
+    with open(report_file, 'w', encoding='utf-8') as f:
+        json.dump(dict(summary, results=results), f, indent=4)
+    pd.DataFrame(results).to_csv(csv_file, index=False)
+    print(f"Results written to {report_file} and {csv_file}")
+
+def main():
+    # Load the dataset
+    df = pd.read_csv(data_file)
+
+    # Split the dataset into training and testing sets
+    X_train, X_test, y_train, y_test = train_test_split(df['sentence'], df['label'], test_size=test_size, random_state=random_state)
+    X_test = X_test.tolist()
+
+    # TF-IDF features of both splits, computed once and shared by all the classifiers
+    start_time = time.perf_counter()
+    tfidf = TfidfVectorizer()
+    X_train_tfidf = tfidf.fit_transform(X_train)
+    X_test_tfidf = tfidf.transform(X_test)
+    featurize_seconds = time.perf_counter() - start_time
+
+    # The classifiers are independent, one process each
+    models = tfidf_models()
+    outcomes = Parallel(n_jobs=n_jobs)(
+        delayed(evaluate_model)(name, model, X_train_tfidf, y_train, X_test_tfidf, y_test) for name, model in models.items()
+    )
+
+    # The latency is measured here, one model at a time, so the models do not compete for the cores
+    results = []
+    fitted_models = {}
+    for fitted, result in outcomes:
+        result.update(latency(lambda sentences: fitted.predict(tfidf.transform(sentences)), X_test))
+        results.append(result)
+        fitted_models[result['model']] = fitted
+
+    # Save the TF-IDF vectorizer with the Logistic Regression for the cascade
+    joblib.dump(Pipeline([('tfidf', tfidf), ('clf', fitted_models['Logistic Regression'])]), cascade_model_file)
+
+    if include_lstm:
+        results.append(evaluate_lstm(X_train, y_train, X_test, y_test))
+    if include_setfit:
+        results.append(evaluate_setfit(X_test, y_test))
+
+    print(f"Benchmark on {len(X_train)} train and {len(X_test)} test sentences ({cv_folds}-fold cross-validation, TF-IDF in {featurize_seconds:.2f} s):")
+    print(f"    {'model':40} {'cv acc':>8} {'acc':>7} {'F1':>7} {'fit s':>8} {'us/sent':>9} {'p50 us':>9} {'MB':>8}")
+    for result in results:
+        cv_accuracy = f"{result['cv_accuracy']:8.3f}" if 'cv_accuracy' in result else f"{'-':>8}"
+        fit_seconds = f"{result['fit_seconds']:8.2f}" if result['fit_seconds'] is not None else f"{'-':>8}"
+        print(f"    {result['model']:40} {cv_accuracy} {result['accuracy']:7.3f} {result['f1_macro']:7.3f} {fit_seconds} "
+              f"{result['batch_us_per_sentence']:9.1f} {result['single_p50_us']:9.1f} {result['model_bytes'] / 1e6:8.2f}")
+
+    write_report(results, {
+        'train_sentences': len(X_train),
+        'test_sentences': len(X_test),
+        'cv_folds': cv_folds,
+        'featurize_seconds': featurize_seconds,
+        'tfidf_features': len(tfidf.vocabulary_),
+        'tfidf_bytes': len(pickle.dumps(tfidf)),
+    })
+
+if __name__ == "__main__":
+    main()
@@ -13,24 +13,49 @@ developed as a part of Samuel Bernier's thesis. For more information, visit http
 """
 
 import datetime
-import hashlib
 import os
-import pickle
 import time
 import praw
 import prawcore
-import csv
-import re
+import queue
 import os
+import sys
+import threading
+
+from rate_limiter import TokenBucket, share_rate_limit, with_retries
+from reddit_store import RedditStore
+from crawl_frontier import CrawlFrontier
+from author_queue import DedupQueue
 
 from dotenv import load_dotenv
 load_dotenv()  # This loads the variables from .env
 
+# The shared modules are in the Common folder at the root of the repository
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from Common import profiling
+from Common.text_normalization import normalize_text
+
 # Constants
 file_name = 'Data/reddit_data.csv'
+store_file = 'Data/reddit_data.db' # SQLite store of the fetched items, file_name is exported from it (see reddit_store.py)
 authors_limit = 100000 # The Reddit API seems to limit at 1000 per request
 post_limit = 10
 
+# Number of authors fetched in parallel, all the threads share one rate limit (see rate_limiter.py)
+# Set to 1 to fetch the authors one at a time
+crawl_workers = 8
+
+# The frontier (see crawl_frontier.py) is committed every checkpoint_interval authors
+# With resume, a run continues with the authors left pending by an interrupted run instead of listing them again
+checkpoint_interval = 25
+resume = True
+
+# Authors waiting between the listing and the fetch threads, the listing waits when the queue is full
+author_queue_size = 32
+
+# Base URL of the API, e.g. http://127.0.0.1:8001 to crawl the local stand-in started with Reddit_FakeAPI.py
+api_url = os.environ.get("REDDIT_API_URL")
+
 # Reddit app credentials
 client_id = os.environ.get("REDDIT_CLIENT_ID")
 client_secret = os.environ.get("REDDIT_CLIENT_SECRET")
@@ -38,202 +63,241 @@ user_agent = os.environ.get("REDDIT_USER_AGENT")
 username = os.environ.get("REDDIT_USERNAME")
 password = os.environ.get("REDDIT_PASSWORD")
 
-reddit = praw.Reddit(
-    client_id=client_id,
-    client_secret=client_secret,
-    user_agent=user_agent,
-    username=username,
-    password=password,
-)
-
-# Remove HTML tags and URLs
-def process_text(text):
-    # Remove HTML tags
-    text = re.sub('<[^<]+?>', ' ', text)
-
-    # Remove URLs
-    text = re.sub(r'http\S+|www.\S+', '', text)
-
-    # Remove non-ASCII characters
-    text = re.sub('[^\x00-\x7F]+', '', text)
-    
-    return text
-
-# Get the authors on SuicideWatch
+def create_reddit():
+    # The same URL is used for the authentication and the API calls of the local stand-in
+    urls = {'oauth_url': api_url, 'reddit_url': api_url} if api_url else {}
+    return praw.Reddit(
+        client_id=client_id,
+        client_secret=client_secret,
+        user_agent=user_agent,
+        username=username,
+        password=password,
+        **urls,
+    )
+
+reddit = create_reddit()
+
+# Stream the authors of the newest posts on SuicideWatch, PRAW fetches the listing 100 posts at a time
 def GetAuthors():
     print(f"Fetching authors on SuicideWatch")
     subreddit = reddit.subreddit("SuicideWatch")
 
-    # Fetch the hot X posts from SuicideWatch
-    new_posts = subreddit.new(limit=authors_limit)
-    authors = []
+    # Fetch the new X posts from SuicideWatch
+    for post in subreddit.new(limit=authors_limit):
+        # The author of a deleted account is None
+        if post.author is not None:
+            yield post.author.name
+
+# Keep the items of a listing newer than the cursor of the author (created_utc of the newest item already fetched)
+# The listings are sorted from the newest, so the iteration stops at the first item already seen
+def newer_items(listing, cursor):
+    items = []
+    for item in listing:
+        if cursor is not None and item.created_utc <= cursor:
+            break
+        items.append(item)
+    return items
+
+# Fetch the recent posts and comments of one author, returns the rows to write and the new cursors
+# The temporary errors (429, 5xx, connection errors) are retried with a jittered backoff instead of skipping the author
+def FetchAuthor(reddit, user_name, hashed_username, existing_ids, bucket=None, submission_cursor=None, comment_cursor=None, min_char_count=100):
+    user = reddit.redditor(user_name)
+    post_rows = []
+    comment_rows = []
+    cursors = {'submission': None, 'comment': None}
+    failed = False
+
+    # Fetch recent posts
+    try:
+        with profiling.stage('fetch_submissions'):
+            posts = with_retries(lambda: newer_items(user.submissions.new(limit=post_limit), submission_cursor), bucket, description=f'fetching the posts of {user_name}')
+        if posts:
+            newest = max(posts, key=lambda post: post.created_utc)
+            cursors['submission'] = (newest.created_utc, newest.id)
+        for post in posts:
+            if post.id in existing_ids:
+                continue
+
+            # Process the text before verifying the length
+            with profiling.stage('normalize_text'):
+                processed_selftext = normalize_text(post.selftext)
 
-    # Counter
-    author_counter = 0
+            # Check if the post is long enough
+            if len(processed_selftext) > min_char_count:
+                created_date = datetime.datetime.fromtimestamp(post.created_utc).isoformat()
+                post_rows.append(["Post", post.id, hashed_username, processed_selftext, processed_selftext, str(post.subreddit), post.score, post.url, created_date])
 
-    for post in new_posts:
-        authors.append(post.author)
-        author_counter += 1
+    # Suspended or deleted accounts, the comments are still tried
+    except (AttributeError, prawcore.exceptions.PrawcoreException) as e:
+        print(f"**Could not fetch the posts of user {user_name} ({type(e).__name__})")
+        failed = True
+
+    # Fetch recent comments
+    try:
+        with profiling.stage('fetch_comments'):
+            comments = with_retries(lambda: newer_items(user.comments.new(limit=post_limit), comment_cursor), bucket, description=f'fetching the comments of {user_name}')
+        if comments:
+            newest = max(comments, key=lambda comment: comment.created_utc)
+            cursors['comment'] = (newest.created_utc, newest.id)
+        for comment in comments:
+            if comment.id in existing_ids:
+                continue
 
-    # Returns a list of authors
-    return authors, author_counter
+            # Process the text before verifying the length
+            with profiling.stage('normalize_text'):
+                processed_comment = normalize_text(comment.body)
 
-# Function to get the posts and comments from the authors
-def GetPosts(authors, existing_ids):
+            # Check if the comment is long enough
+            if len(processed_comment) > min_char_count:
+                created_date = datetime.datetime.fromtimestamp(comment.created_utc).isoformat()
+                comment_rows.append(["Comment", comment.id, hashed_username, "", processed_comment, str(comment.subreddit), comment.score, comment.permalink, created_date])
 
-    # File name
-    file_name = 'Data/reddit_data.csv'
+    except (AttributeError, prawcore.exceptions.PrawcoreException) as e:
+        print(f"**Could not fetch the comments of user {user_name} ({type(e).__name__})")
+        failed = True
 
-    # Set a minimum character limit for posts and comments
-    min_char_count = 100 # 00 is about 1-2 sentences
+    return post_rows, comment_rows, cursors, failed
 
-    # Counter
+# Function to get the posts and comments of the authors as they are listed
+# A producer thread puts the authors in a deduplicating bounded queue (see author_queue.py), crawl_workers threads fetch
+# them as soon as they are queued under one shared rate limit, and only the main thread writes to the store
+def GetPosts(frontier, store, authors, workers=crawl_workers):
     post_counter = 0
     comment_counter = 0
+    start_time = time.time()
 
-    # Try to load the hashed_usernames dictionary from a file
+    # A PRAW instance is not thread safe, each thread has its own and they all take their tokens from the same bucket
+    bucket = TokenBucket()
+    share_rate_limit(reddit, bucket)
+    author_queue = DedupQueue(author_queue_size)
+    results = queue.Queue(author_queue_size)
+
+    def produce():
+        try:
+            for name in authors:
+                author_queue.put(name)
+                if author_queue.stopped.is_set():
+                    break
+        except prawcore.exceptions.PrawcoreException as e:
+            print(f"**The listing of the authors stopped ({type(e).__name__})")
+        finally:
+            author_queue.close()
+
+    def work():
+        local_reddit = share_rate_limit(create_reddit(), bucket)
+        try:
+            while True:
+                user_name = author_queue.get()
+                if user_name is None:
+                    break
+                hashed_username, submission_cursor, comment_cursor = frontier.cursors(user_name)
+                results.put((user_name, hashed_username, FetchAuthor(local_reddit, user_name, hashed_username, store, bucket, submission_cursor, comment_cursor)))
+        except Exception as e:
+            results.put((None, None, e))
+        finally:
+            # Tells the main thread that this worker is done
+            results.put(None)
+
+    # Daemon threads, so a Ctrl-C does not wait for the requests in flight
+    threads = [threading.Thread(target=produce, daemon=True)] + [threading.Thread(target=work, daemon=True) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+
+    running = workers
+    crawled = 0
     try:
-        with open('Data/hashed_usernames.pickle', 'rb') as f:
-            hashed_usernames = pickle.load(f)
-    except FileNotFoundError:
-        # If the file doesn't exist, create an empty dictionary
-        hashed_usernames = {}
-    
-    # Iterate through authors
-    for user in authors:
-        # Check if the username is in the dictionary
-        if user is None:
-            print("**Deleted user account. Skipping...")
-            continue
-        if user in hashed_usernames:
-            hashed_username = hashed_usernames[user]
-        else:
-            # Hash the username and add it to the dictionary
-            hashed_username = hashlib.sha256(user.name.encode()).hexdigest()[:8]
-            hashed_usernames[user] = hashed_username
-
-        print(f"Fetching posts and comments for user {user}")
-        # Fetch new data and write to CSV
-        with open(file_name, 'a', newline='', encoding='utf-8') as file:
-            writer = csv.writer(file)
-
-            # Fetch recent posts
-            try:
-                for post in user.submissions.new(limit=post_limit):
-                    if post.id not in existing_ids:
-                        
-                        # Process the text before verifying the length
-                        processed_selftext = process_text(post.selftext)
-
-                        # Check if the post is long enough
-                        if len(processed_selftext) > min_char_count:
-                            print("Posts:")
-                            created_date = datetime.datetime.fromtimestamp(post.created_utc).isoformat()
-                            print(post.title)
-                            writer.writerow(["Post", post.id, hashed_usernames[post.author], processed_selftext, process_text(post.selftext), str(post.subreddit), post.score, post.url, created_date])
-                            post_counter += 1
-                        else:
-                            print("**Post is too short, skipping...")
-                    else:
-                        print("**Post already exists, skipping...")
-
-            # If there are no more posts, skip to the next user
-            except AttributeError as e:
-                print(f"**An error occurred with user {user}, there is most likely no more post. Skipping to next user.")
-                continue
-
-            # If there are too many requests, wait for 90 seconds
-            except prawcore.exceptions.TooManyRequests:
-                print("**Too many requests, waiting for 90 seconds...")
-                print("Current counters: ")
-                print(f"Post counter: {post_counter}")
-                print(f"Comment counter: {comment_counter}")
-                time.sleep(90)
-                continue
-
-            # If the error "Forbidden" happens, skip to the next user
-            except prawcore.exceptions.PrawcoreException as e:
-                print(f"**PRAW error: {e}, waiting for 90 seconds...")
-                print("Current counters: ")
-                print(f"Post counter: {post_counter}")
-                print(f"Comment counter: {comment_counter}")
-                time.sleep(90)
-                continue
-            # Fetch recent comments
-            try:                
-                for comment in user.comments.new(limit=post_limit):
-                    if comment.id not in existing_ids:
-                        
-                        # Process the text before verifying the length
-                        processed_comment = process_text(comment.body)
-
-                        # Check if the comment is long enough
-                        if len(processed_comment) > min_char_count:
-                            print("Comments:")
-                            created_date = datetime.datetime.fromtimestamp(comment.created_utc).isoformat()
-                            print(comment.body)
-                            writer.writerow(["Comment", comment.id, hashed_usernames[comment.author],"", processed_comment, str(comment.subreddit), comment.score, comment.permalink, created_date])
-                            comment_counter += 1
-                        else:
-                            print("**Comment is too short, skipping...")
-                    else:
-                        print("**Comment already exists, skipping...")
-
-            # If there are no more comments, skip to the next user
-            except AttributeError as e:
-                print(f"**An error occurred with user {user}, there is most likely no more comments. Skipping to next user.")
-                continue
+        with store.writer() as writer:
+            while running:
+                # With a timeout so Ctrl-C is handled on Windows too
+                try:
+                    result = results.get(timeout=0.5)
+                except queue.Empty:
+                    continue
+                if result is None:
+                    running -= 1
+                    continue
+                user_name, hashed_username, fetched = result
+                if isinstance(fetched, Exception):
+                    raise fetched
+                post_rows, comment_rows, cursors, failed = fetched
+
+                # The authors queued so far are added to the frontier before their status is set
+                frontier.add(author_queue.drain_new())
+                with profiling.stage('write'):
+                    writer.writerows(post_rows + comment_rows)
+                frontier.mark(user_name, 'failed' if failed else 'done', cursors['submission'], cursors['comment'])
+
+                if crawled == 0:
+                    print(f"First author written after {time.time() - start_time:.1f} s")
+                crawled += 1
+                post_counter += len(post_rows)
+                comment_counter += len(comment_rows)
+                profiling.count('posts', len(post_rows))
+                profiling.count('comments', len(comment_rows))
+                print(f"User {user_name}: {len(post_rows)} posts, {len(comment_rows)} comments")
+
+                # One JSON line per author with the time of each stage (see Common/profiling.py)
+                profiling.log(author=hashed_username)
+
+                # The items and the status of the authors are committed together
+                if crawled % checkpoint_interval == 0:
+                    with profiling.stage('checkpoint'):
+                        writer.flush()
+                        frontier.checkpoint()
+
+                # The workers finish the authors in flight, the authors left in the queue stay pending
+                if post_counter + comment_counter >= authors_limit and not author_queue.stopped.is_set():
+                    print("Reached the limit of post, stopping...")
+                    author_queue.stop()
+
+    # On Ctrl-C or an error, what was written is kept and the authors not crawled yet stay pending for the next run
+    finally:
+        author_queue.stop()
+        frontier.add(author_queue.drain_new())
+        frontier.checkpoint()
+
+    elapsed = time.time() - start_time
+    print(f"{len(author_queue.seen)} authors listed ({author_queue.duplicates} duplicates skipped), {crawled} crawled")
+    print(f"{bucket.requests} requests in {elapsed:.1f} s ({bucket.requests / max(elapsed, 1e-9):.2f} requests/s), {bucket.waited:.1f} s with threads waiting for the rate limit")
+    return post_counter, comment_counter, len(author_queue.seen) + author_queue.duplicates
 
-            # If there are too many requests, wait for 90 seconds
-            except prawcore.exceptions.TooManyRequests:
-                print("**Too many requests, waiting for 90 seconds...")
-                print("Current counters: ")
-                print(f"Post counter: {post_counter}")
-                print(f"Comment counter: {comment_counter}")
-                time.sleep(90)
-                continue
-
-            # If the error "Forbidden" happens, skip to the next user
-            except prawcore.exceptions.PrawcoreException as e:
-                print(f"**PRAW error: {e}, waiting for 90 seconds...")
-                print("Current counters: ")
-                print(f"Post counter: {post_counter}")
-                print(f"Comment counter: {comment_counter}")
-                time.sleep(90)
-                continue
+def main():
+    start_time = time.time()
 
-        if post_counter + comment_counter >= authors_limit:
-            print("Reached the limit of post, stopping...")
-            break
+    # Time the stages of the run, the JSON log goes to Data/logs/Reddit_API.jsonl
+    profiling.start('Reddit_API')
 
-    # Save the hashed_usernames dictionary to a file
-    with open('Data/hashed_usernames.pickle', 'wb') as f:
-        pickle.dump(hashed_usernames, f)
+    # The IDs already fetched are looked up in the store, nothing is loaded at startup
+    is_new_store = not os.path.isfile(store_file)
+    store = RedditStore(store_file)
+    frontier = CrawlFrontier(store)
 
-    return post_counter, comment_counter
+    # Import the CSV file of the runs made before the store existed, only done once
+    if is_new_store and os.path.isfile(file_name):
+        print(f"Importing {file_name} into {store_file}...")
+        print(f"{store.import_csv(file_name)} items imported")
 
-def main():
-    start_time = time.time()
+    # Same for the pseudonyms of the runs made before the frontier existed
+    if not frontier.counts():
+        print(f"{frontier.import_pickle('Data/hashed_usernames.pickle')} pseudonyms imported")
 
-    existing_ids = set()
-    # Check if the file exists and write headers if it's not
-    if not os.path.isfile(file_name):
-        with open(file_name, 'w', newline='', encoding='utf-8') as file:
-            writer = csv.writer(file)
-            writer.writerow(["Type", "ID", "Author", "Title", "Body or Selftext", "Subreddit", "Score", "URL", "Created Date"])
+    # Resume the authors left pending by an interrupted run, otherwise stream the authors on SuicideWatch
+    pending_authors = frontier.pending()
+    if resume and pending_authors:
+        print(f"Resuming the crawl, {len(pending_authors)} authors left")
+        authors = pending_authors
     else:
-        # Load existing data
-        with open(file_name, 'r', newline='', encoding='utf-8') as file:
-            reader = csv.reader(file)
-            next(reader, None)  # skip the headers
-            existing_ids = {row[1] for row in reader}
+        authors = GetAuthors()
 
-    # Get the authors on SuicideWatch
-    authors, author_counter = GetAuthors()
-    print(f"Authors: {authors}")
+    # Write posts to the store
+    post_counter, comment_counter, author_counter = GetPosts(frontier, store, authors)
+    print(f"Authors: {frontier.counts()}")
 
-    # Write posts to CSV
-    post_counter, comment_counter = GetPosts(authors, existing_ids)
+    # Export the CSV file read by SetFit-Pred.py, only the items fetched since the last export are appended
+    with profiling.stage('export_csv'):
+        exported = store.export_csv(file_name)
+    print(f"{exported} items exported to {file_name}")
+    store.close()
 
     # Print counters
     print(f"Number of authors fetched (initially): {author_counter}")
@@ -243,6 +307,7 @@ def main():
     end_time = time.time()
 
     print(f"Execution time: {(end_time - start_time)/60} minutes")
+    profiling.finish()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,160 @@
+"""
+Project Name: MACHINE LEARNING TECHNIQUES FOR ESTIMATING SUICIDAL RISK ON SOCIAL MEDIA
+Author: Samuel Bernier
+Thesis Paper (French): https://uqo.on.worldcat.org/oclc/1415207814
+GitHub repository: https://github.com/BernierS/SetFit_Suicidal_Risk
+Huggin Face repository: https://huggingface.co/BernierS/SetFit_Suicidal_Risk
+File Description:
+    This file is a local stand-in for the Reddit API, used to test the throughput of Reddit_API.py offline.
+    It serves generated authors, posts and comments with the same JSON as Reddit for the endpoints used by the crawler,
+    sends the x-ratelimit-* headers, answers 429 when the budget of the window is spent, adds a latency to each
+    request and fails a share of the requests with a 500 error.
+
+    python Reddit/Reddit_FakeAPI.py
+    Then set REDDIT_API_URL=http://127.0.0.1:8001 (and any REDDIT_* credentials) before running Reddit_API.py.
+--------------------------------------------------------------------------------
+This file is part of the MACHINE LEARNING TECHNIQUES FOR ESTIMATING SUICIDAL RISK SUICIDAL RISK ON SOCIAL NETWORKS project,
+developed as a part of Samuel Bernier's thesis. For more information, visit https://uqo.on.worldcat.org/oclc/1415207814.
+--------------------------------------------------------------------------------
+"""
+
+import asyncio
+import os
+import random
+import time
+
+from aiohttp import web
+
+# Constants
+host = os.environ.get("FAKE_REDDIT_HOST", "127.0.0.1")
+port = int(os.environ.get("FAKE_REDDIT_PORT", 8001))
+number_of_authors = int(os.environ.get("FAKE_REDDIT_AUTHORS", 200))
+items_per_author = 15 # Posts and comments of each author, more than the post_limit of Reddit_API.py
+latency_ms = float(os.environ.get("FAKE_REDDIT_LATENCY_MS", 100))
+error_rate = float(os.environ.get("FAKE_REDDIT_ERROR_RATE", 0.02)) # Share of the requests answered with a 500 error
+
+# Rate limit of the fake API, Reddit itself allows 600 requests per 10 minutes
+window_seconds = int(os.environ.get("FAKE_REDDIT_WINDOW", 60))
+requests_per_window = int(os.environ.get("FAKE_REDDIT_BUDGET", 600))
+
+subreddits = ['SuicideWatch', 'depression', 'Anxiety', 'offmychest', 'lonely', 'AskReddit']
+
+# Texts of the posts and comments, from the training sentences when they are available
+def load_texts():
+    if os.path.isfile('Data/Suicide_Data_E16.csv'):
+        import pandas as pd
+        return pd.read_csv('Data/Suicide_Data_E16.csv')['sentence'].tolist()
+    words = 'i feel tired alone today nothing helps anymore my family friends work sleep better worse again'.split()
+    rng = random.Random(0)
+    return [' '.join(rng.choice(words) for _ in range(20)).capitalize() + '.' for _ in range(500)]
+
+# Generate the same authors, posts and comments on every start
+def generate_data():
+    rng = random.Random(42)
+    texts = load_texts()
+    now = int(time.time())
+    authors = [f'fake_user_{i:05d}' for i in range(number_of_authors)]
+    posts = {}
+    comments = {}
+    listing = []
+    for a, author in enumerate(authors):
+        posts[author] = []
+        comments[author] = []
+        for j in range(items_per_author):
+            created = now - (a * items_per_author + j) * 60
+            body = ' '.join(rng.sample(texts, 3))
+            posts[author].append({
+                'id': f'p{a:05d}{j:02d}', 'name': f't3_p{a:05d}{j:02d}', 'title': body[:60], 'selftext': body,
+                'author': author, 'subreddit': rng.choice(subreddits), 'score': rng.randint(0, 100),
+                'url': f'https://www.reddit.com/r/fake/comments/p{a:05d}{j:02d}/', 'created_utc': created,
+            })
+            comments[author].append({
+                'id': f'c{a:05d}{j:02d}', 'name': f't1_c{a:05d}{j:02d}', 'body': ' '.join(rng.sample(texts, 2)),
+                'author': author, 'subreddit': rng.choice(subreddits), 'score': rng.randint(0, 100),
+                'permalink': f'/r/fake/comments/p{a:05d}00/_/c{a:05d}{j:02d}/', 'created_utc': created,
+                'link_id': f't3_p{a:05d}00', 'parent_id': f't3_p{a:05d}00', 'replies': '',
+            })
+
+        # Some authors posted several times on SuicideWatch
+        for post in posts[author][:rng.choice([1, 1, 1, 2, 3])]:
+            listing.append(dict(post, subreddit='SuicideWatch'))
+    rng.shuffle(listing)
+    return listing, posts, comments
+
+# One page of a listing, with the limit and after parameters of Reddit
+def listing_page(request, items, kind):
+    limit = min(int(request.query.get('limit', 25)), 100)
+    after = request.query.get('after')
+    start = 0
+    if after:
+        names = [item['name'] for item in items]
+        start = names.index(after) + 1 if after in names else len(items)
+    page = items[start:start + limit]
+    return web.json_response({'kind': 'Listing', 'data': {
+        'after': page[-1]['name'] if start + limit < len(items) and page else None,
+        'before': None,
+        'children': [{'kind': kind, 'data': item} for item in page],
+    }})
+
+@web.middleware
+async def rate_limit_middleware(request, handler):
+    state = request.app['state']
+    now = time.time()
+    if now >= state['window_start'] + window_seconds:
+        state['window_start'] = now
+        state['used'] = 0
+    state['used'] += 1
+    state['requests'] += 1
+    headers = {
+        'x-ratelimit-used': str(state['used']),
+        'x-ratelimit-remaining': str(max(requests_per_window - state['used'], 0)),
+        'x-ratelimit-reset': str(int(state['window_start'] + window_seconds - now)),
+    }
+
+    await asyncio.sleep(latency_ms / 1000)
+    if state['used'] > requests_per_window:
+        state['throttled'] += 1
+        return web.json_response({'message': 'Too Many Requests', 'error': 429}, status=429, headers=headers)
+    if request.path not in ('/api/v1/access_token', '/stats') and random.random() < error_rate:
+        state['errors'] += 1
+        return web.json_response({'message': 'Internal Server Error', 'error': 500}, status=500, headers=headers)
+
+    response = await handler(request)
+    response.headers.update(headers)
+    return response
+
+async def token_handler(request):
+    return web.json_response({'access_token': 'fake-token', 'token_type': 'bearer', 'expires_in': 86400, 'scope': '*'})
+
+async def subreddit_new_handler(request):
+    return listing_page(request, request.app['listing'], 't3')
+
+async def submitted_handler(request):
+    return listing_page(request, request.app['posts'].get(request.match_info['name'], []), 't3')
+
+async def comments_handler(request):
+    return listing_page(request, request.app['comments'].get(request.match_info['name'], []), 't1')
+
+async def stats_handler(request):
+    state = request.app['state']
+    return web.json_response({key: state[key] for key in ('requests', 'throttled', 'errors')})
+
+def create_app():
+    app = web.Application(middlewares=[rate_limit_middleware])
+    app['listing'], app['posts'], app['comments'] = generate_data()
+
+    # Counters of the rate limit window and of the requests served
+    app['state'] = {'window_start': time.time(), 'used': 0, 'requests': 0, 'throttled': 0, 'errors': 0}
+    app.router.add_post('/api/v1/access_token', token_handler)
+    app.router.add_get('/r/{subreddit}/new', subreddit_new_handler)
+    app.router.add_get('/user/{name}/submitted', submitted_handler)
+    app.router.add_get('/user/{name}/comments', comments_handler)
+    app.router.add_get('/stats', stats_handler)
+    return app
+
+def main():
+    print(f"Fake Reddit API with {number_of_authors} authors, {latency_ms} ms latency, {requests_per_window} requests per {window_seconds} s")
+    web.run_app(create_app(), host=host, port=port)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Project Name: MACHINE LEARNING TECHNIQUES FOR ESTIMATING SUICIDAL RISK ON SOCIAL MEDIA
+Author: Samuel Bernier
+Thesis Paper (French): https://uqo.on.worldcat.org/oclc/1415207814
+GitHub repository: https://github.com/BernierS/SetFit_Suicidal_Risk
+Huggin Face repository: https://huggingface.co/BernierS/SetFit_Suicidal_Risk
+File Description:
+    This file contains the queue between the listing of SuicideWatch and the threads fetching the authors (see Reddit_API.py).
+    An author is only queued the first time it is seen, and the queue is bounded: when the fetch threads fall behind,
+    the listing waits instead of reading the whole subreddit ahead of them.
+--------------------------------------------------------------------------------
+This file is part of the MACHINE LEARNING TECHNIQUES FOR ESTIMATING SUICIDAL RISK SUICIDAL RISK ON SOCIAL NETWORKS project,
+developed as a part of Samuel Bernier's thesis. For more information, visit https://uqo.on.worldcat.org/oclc/1415207814.
+--------------------------------------------------------------------------------
+"""
+
+import queue
+import threading
+
+class DedupQueue:
+    """
+    Bounded queue of author names that drops the names already queued once.
+    close() wakes up the consumers, get() returns None once the queue is closed and empty.
+    """
+
+    def __init__(self, maxsize):
+        self.queue = queue.Queue(maxsize)
+        self.seen = set()
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.closed = False
+        self.duplicates = 0
+        self.new_names = []
+
+    # Blocks while the queue is full, returns False for a duplicate or when the queue was stopped
+    def put(self, name):
+        with self.lock:
+            if name in self.seen:
+                self.duplicates += 1
+                return False
+            self.seen.add(name)
+            self.new_names.append(name)
+
+        while not self.stopped.is_set():
+            try:
+                self.queue.put(name, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def get(self):
+        while not self.stopped.is_set():
+            try:
+                return self.queue.get(timeout=0.5)
+            except queue.Empty:
+                # Closed after its last put, so nothing can be added once the queue is seen closed and empty
+                if self.closed:
+                    try:
+                        return self.queue.get_nowait()
+                    except queue.Empty:
+                        return None
+        return None
+
+    # Names queued since the last call, in order
+    def drain_new(self):
+        with self.lock:
+            names, self.new_names = self.new_names, []
+        return names
+
+    # No more names will be added, the consumers stop once the queue is empty
+    def close(self):
+        self.closed = True
+
+    # Stop now, e.g. when the limit is reached: the producer stops waiting and the names left are dropped
+    def stop(self):
+        self.stopped.set()
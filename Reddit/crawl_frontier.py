@@ -0,0 +1,101 @@
+"""
+Project Name: MACHINE LEARNING TECHNIQUES FOR ESTIMATING SUICIDAL RISK ON SOCIAL MEDIA
+Author: Samuel Bernier
+Thesis Paper (French): https://uqo.on.worldcat.org/oclc/1415207814
+GitHub repository: https://github.com/BernierS/SetFit_Suicidal_Risk
+Huggin Face repository: https://huggingface.co/BernierS/SetFit_Suicidal_Risk
+File Description:
+    This file contains the crawl frontier of Reddit_API.py, kept in the same SQLite file as the fetched items.
+    Each author is stored once with its pseudonym, its status (pending, done or failed) and the newest submission
+    and comment already fetched. The frontier is checkpointed with the items, so a run stopped by a crash or Ctrl-C
+    resumes with the authors left pending, and the next runs only keep the items newer than the cursors of each author.
+--------------------------------------------------------------------------------
+This file is part of the MACHINE LEARNING TECHNIQUES FOR ESTIMATING SUICIDAL RISK SUICIDAL RISK ON SOCIAL NETWORKS project,
+developed as a part of Samuel Bernier's thesis. For more information, visit https://uqo.on.worldcat.org/oclc/1415207814.
+--------------------------------------------------------------------------------
+"""
+
+import datetime
+import hashlib
+import os
+import pickle
+
+# Short pseudonym of a username, the same as the one used before the frontier existed
+def hash_username(name):
+    return hashlib.sha256(name.encode()).hexdigest()[:8]
+
+class CrawlFrontier:
+    """
+    Authors to crawl and their cursors. The updates are only committed by checkpoint(), together with the items
+    written on the same connection, so an author is never marked done without its items.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        connection = store.connection()
+        connection.execute("""
+            CREATE TABLE IF NOT EXISTS authors (
+                name TEXT PRIMARY KEY,
+                hashed_name TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                last_submission_id TEXT,
+                last_submission_utc REAL,
+                last_comment_id TEXT,
+                last_comment_utc REAL,
+                fetched_at TEXT
+            )
+        """)
+        connection.commit()
+
+    # Queue the authors found on SuicideWatch, the ones already crawled go back to pending for an incremental fetch
+    def add(self, names):
+        self.store.connection().executemany(
+            "INSERT INTO authors (name, hashed_name) VALUES (?, ?) ON CONFLICT(name) DO UPDATE SET status = 'pending'",
+            ((name, hash_username(name)) for name in names),
+        )
+
+    # Names of the authors left to crawl, in the order they were found
+    def pending(self):
+        return [row[0] for row in self.store.connection().execute("SELECT name FROM authors WHERE status = 'pending' ORDER BY rowid")]
+
+    # Pseudonym and cursors of an author, a new author gets its pseudonym and no cursors
+    def cursors(self, name):
+        row = self.store.connection().execute(
+            "SELECT hashed_name, last_submission_utc, last_comment_utc FROM authors WHERE name = ?", (name,)
+        ).fetchone()
+        return row if row is not None else (hash_username(name), None, None)
+
+    # Record the result of an author, the cursors only move forward
+    def mark(self, name, status, submission=None, comment=None):
+        connection = self.store.connection()
+        connection.execute("UPDATE authors SET status = ?, fetched_at = ? WHERE name = ?", (status, datetime.datetime.now().isoformat(), name))
+        if submission is not None:
+            connection.execute(
+                "UPDATE authors SET last_submission_utc = ?, last_submission_id = ? WHERE name = ? AND (last_submission_utc IS NULL OR last_submission_utc < ?)",
+                (submission[0], submission[1], name, submission[0]),
+            )
+        if comment is not None:
+            connection.execute(
+                "UPDATE authors SET last_comment_utc = ?, last_comment_id = ? WHERE name = ? AND (last_comment_utc IS NULL OR last_comment_utc < ?)",
+                (comment[0], comment[1], name, comment[0]),
+            )
+
+    def checkpoint(self):
+        self.store.connection().commit()
+
+    def counts(self):
+        return dict(self.store.connection().execute("SELECT status, COUNT(*) FROM authors GROUP BY status").fetchall())
+
+    # Import the pseudonyms of hashed_usernames.pickle, only needed once when moving to the frontier
+    def import_pickle(self, path):
+        if not os.path.isfile(path):
+            return 0
+        with open(path, 'rb') as f:
+            hashed_usernames = pickle.load(f)
+        connection = self.store.connection()
+        with connection:
+            connection.executemany(
+                "INSERT OR IGNORE INTO authors (name, hashed_name, status) VALUES (?, ?, 'done')",
+                ((str(user), hashed_name) for user, hashed_name in hashed_usernames.items()),
+            )
+        return len(hashed_usernames)
@@ -0,0 +1,141 @@
+"""
+Project Name: MACHINE LEARNING TECHNIQUES FOR ESTIMATING SUICIDAL RISK ON SOCIAL MEDIA
+Author: Samuel Bernier
+Thesis Paper (French): https://uqo.on.worldcat.org/oclc/1415207814
+GitHub repository: https://github.com/BernierS/SetFit_Suicidal_Risk
+Huggin Face repository: https://huggingface.co/BernierS/SetFit_Suicidal_Risk
+File Description:
+    This file contains the rate limiting shared by the threads of the concurrent crawl (see Reddit_API.py).
+    All the requests take a token from one token bucket, whose rate follows the x-ratelimit-* headers sent by Reddit.
+    The failed requests are retried with an exponential backoff with jitter instead of a fixed sleep.
+--------------------------------------------------------------------------------
+This file is part of the MACHINE LEARNING TECHNIQUES FOR ESTIMATING SUICIDAL RISK SUICIDAL RISK ON SOCIAL NETWORKS project,
+developed as a part of Samuel Bernier's thesis. For more information, visit https://uqo.on.worldcat.org/oclc/1415207814.
+--------------------------------------------------------------------------------
+"""
+
+import random
+import threading
+import time
+import prawcore
+
+from prawcore.rate_limit import RateLimiter
+
+# Reddit allows 100 requests per minute for an OAuth client, averaged over 10 minutes
+default_rate = 100 / 60
+default_capacity = 10
+
+# Errors worth retrying, the others (e.g. Forbidden for a suspended account) fail right away
+retry_exceptions = (prawcore.exceptions.TooManyRequests, prawcore.exceptions.ServerError, prawcore.exceptions.RequestException)
+
+class TokenBucket:
+    """
+    Token bucket shared by the threads. Each request takes one token, the tokens come back at `rate` per second.
+    The rate is updated from the rate limit headers, so the remaining requests are spread until the reset of the window.
+    """
+
+    def __init__(self, rate=default_rate, capacity=default_capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+        self.requests = 0
+        # Wall time with at least one thread waiting for a token, the waits of concurrent threads are counted once
+        self.waited = 0.0
+        self.waiting_threads = 0
+        self.throttled_since = 0.0
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    # Block until a token is available
+    def acquire(self):
+        waiting = False
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now >= self.paused_until and self.tokens >= 1:
+                    self.tokens -= 1
+                    self.requests += 1
+                    if waiting:
+                        self.waiting_threads -= 1
+                        if self.waiting_threads == 0:
+                            self.waited += now - self.throttled_since
+                    return
+                wait = max(self.paused_until - now, (1 - self.tokens) / self.rate)
+                if not waiting:
+                    waiting = True
+                    if self.waiting_threads == 0:
+                        self.throttled_since = now
+                    self.waiting_threads += 1
+            time.sleep(wait)
+
+    # Follow the headers of the last response: x-ratelimit-remaining requests until x-ratelimit-reset seconds
+    def update(self, remaining, reset_seconds):
+        with self.lock:
+            now = time.monotonic()
+            self._refill(now)
+            if remaining <= 0:
+                # Nothing left in this window, every thread waits for the reset
+                self.tokens = 0
+                self.paused_until = max(self.paused_until, now + reset_seconds)
+                return
+            self.rate = remaining / max(reset_seconds, 1)
+            self.tokens = min(self.tokens, remaining)
+
+    # Stop all the threads for a while, e.g. after a 429 without rate limit headers
+    def pause(self, seconds):
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+class SharedRateLimiter(RateLimiter):
+    """
+    Replaces the rate limiter of a prawcore session so the requests of every thread go through the same token bucket.
+    """
+
+    def __init__(self, bucket):
+        super().__init__()
+        self.bucket = bucket
+
+    def call(self, request_function, set_header_callback, *args, **kwargs):
+        self.bucket.acquire()
+        kwargs["headers"] = set_header_callback()
+        response = request_function(*args, **kwargs)
+        self.update(response.headers)
+        return response
+
+    def update(self, response_headers):
+        super().update(response_headers)
+        if "x-ratelimit-remaining" in response_headers:
+            self.bucket.update(float(response_headers["x-ratelimit-remaining"]), int(float(response_headers["x-ratelimit-reset"])))
+
+# Use the shared bucket for all the requests of a Reddit instance
+def share_rate_limit(reddit, bucket):
+    for core in (reddit._authorized_core, reddit._read_only_core):
+        if core is not None:
+            core._rate_limiter = SharedRateLimiter(bucket)
+    return reddit
+
+# Delay before a retry: random between 0 and the exponential backoff ("full jitter")
+def backoff_delay(attempt, base=1.0, cap=60.0):
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+# Call function(), retrying the temporary errors with a jittered backoff
+def with_retries(function, bucket=None, max_attempts=6, base=1.0, cap=60.0, description=''):
+    for attempt in range(max_attempts):
+        try:
+            return function()
+        except retry_exceptions as e:
+            if attempt == max_attempts - 1:
+                raise
+            delay = backoff_delay(attempt, base, cap)
+
+            # A 429 stops every thread, not only this one
+            if isinstance(e, prawcore.exceptions.TooManyRequests) and bucket is not None:
+                bucket.pause(delay)
+            print(f"**{type(e).__name__} {description}, retry {attempt + 1} in {delay:.1f} seconds...")
+            time.sleep(delay)
@@ -0,0 +1,184 @@
+"""
+Project Name: MACHINE LEARNING TECHNIQUES FOR ESTIMATING SUICIDAL RISK ON SOCIAL MEDIA
+Author: Samuel Bernier
+Thesis Paper (French): https://uqo.on.worldcat.org/oclc/1415207814
+GitHub repository: https://github.com/BernierS/SetFit_Suicidal_Risk
+Huggin Face repository: https://huggingface.co/BernierS/SetFit_Suicidal_Risk
+File Description:
+    This file contains the SQLite store of the posts and comments fetched by Reddit_API.py (Data/reddit_data.db).
+    The ID is the primary key, so checking if an item was already fetched is an index lookup instead of a scan of the CSV file,
+    and a duplicate is simply ignored on insert. The rows are written in batches, one transaction per batch.
+    The store is exported to Data/reddit_data.csv for SetFit-Pred.py, each export only appends the rows added since the last one.
+--------------------------------------------------------------------------------
+This file is part of the MACHINE LEARNING TECHNIQUES FOR ESTIMATING SUICIDAL RISK SUICIDAL RISK ON SOCIAL NETWORKS project,
+developed as a part of Samuel Bernier's thesis. For more information, visit https://uqo.on.worldcat.org/oclc/1415207814.
+--------------------------------------------------------------------------------
+"""
+
+import csv
+import os
+import sqlite3
+import threading
+
+# Columns of reddit_data.csv, in the same order as the rows written by Reddit_API.py
+csv_header = ["Type", "ID", "Author", "Title", "Body or Selftext", "Subreddit", "Score", "URL", "Created Date"]
+columns = ['type', 'id', 'author', 'title', 'body', 'subreddit', 'score', 'url', 'created_date']
+
+# Number of rows written per transaction
+default_batch_size = 500
+
+class RedditStore:
+    """
+    Posts and comments keyed by their Reddit ID. Each thread gets its own connection, the WAL journal lets them read
+    while another one writes.
+    """
+
+    def __init__(self, path='Data/reddit_data.db'):
+        self.path = path
+        self.local = threading.local()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+
+        connection = self.connection()
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("""
+            CREATE TABLE IF NOT EXISTS items (
+                id TEXT PRIMARY KEY,
+                type TEXT NOT NULL,
+                author TEXT,
+                title TEXT,
+                body TEXT,
+                subreddit TEXT,
+                score INTEGER,
+                url TEXT,
+                created_date TEXT
+            )
+        """)
+        # Last row and size of each exported CSV file, to only append the new rows at the next export
+        connection.execute("""
+            CREATE TABLE IF NOT EXISTS exports (
+                csv_file TEXT PRIMARY KEY,
+                last_rowid INTEGER NOT NULL,
+                size INTEGER NOT NULL
+            )
+        """)
+        connection.commit()
+
+    def connection(self):
+        if not hasattr(self.local, 'connection'):
+            self.local.connection = sqlite3.connect(self.path, timeout=60)
+            # With WAL, NORMAL only syncs at checkpoints and stays safe against corruption
+            self.local.connection.execute("PRAGMA synchronous=NORMAL")
+        return self.local.connection
+
+    def __contains__(self, item_id):
+        return self.connection().execute("SELECT 1 FROM items WHERE id = ?", (item_id,)).fetchone() is not None
+
+    def __len__(self):
+        return self.connection().execute("SELECT COUNT(*) FROM items").fetchone()[0]
+
+    # Insert rows in the order of csv_header, returns the number of new rows (the IDs already stored are ignored)
+    def insert_rows(self, rows):
+        connection = self.connection()
+        before = connection.total_changes
+        with connection:
+            connection.executemany(
+                f"INSERT OR IGNORE INTO items ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                rows,
+            )
+        return connection.total_changes - before
+
+    def writer(self, batch_size=default_batch_size):
+        return StoreWriter(self, batch_size)
+
+    # Import an existing reddit_data.csv, only needed once when moving to the store
+    def import_csv(self, csv_file, batch_size=10000):
+        inserted = 0
+        with open(csv_file, 'r', newline='', encoding='utf-8') as file:
+            reader = csv.reader(file)
+            next(reader, None)  # skip the headers
+            batch = []
+            for row in reader:
+                batch.append(row)
+                if len(batch) >= batch_size:
+                    inserted += self.insert_rows(batch)
+                    batch = []
+            inserted += self.insert_rows(batch)
+        return inserted
+
+    # Write the rows after last_rowid, returns the number of rows and the last rowid written
+    def _write_rows(self, writer, last_rowid):
+        cursor = self.connection().execute(f"SELECT rowid, {', '.join(columns)} FROM items WHERE rowid > ? ORDER BY rowid", (last_rowid,))
+        rows = 0
+        while True:
+            batch = cursor.fetchmany(10000)
+            if not batch:
+                break
+            writer.writerows(row[1:] for row in batch)
+            rows += len(batch)
+            last_rowid = batch[-1][0]
+        return rows, last_rowid
+
+    def _record_export(self, csv_file, last_rowid):
+        with self.connection() as connection:
+            connection.execute("INSERT OR REPLACE INTO exports (csv_file, last_rowid, size) VALUES (?, ?, ?)",
+                               (os.path.abspath(csv_file), last_rowid, os.path.getsize(csv_file)))
+
+    # Write the store as reddit_data.csv, in insertion order, for SetFit-Pred.py
+    # The rows added since the last export are appended, the file is only written again when it changed since then
+    # (e.g. an interrupted append), or with full=True. Returns the number of rows written.
+    def export_csv(self, csv_file, full=False):
+        exported = self.connection().execute("SELECT last_rowid, size FROM exports WHERE csv_file = ?", (os.path.abspath(csv_file),)).fetchone()
+        if not full and exported is not None and os.path.isfile(csv_file) and os.path.getsize(csv_file) == exported[1]:
+            with open(csv_file, 'a', newline='', encoding='utf-8') as file:
+                rows, last_rowid = self._write_rows(csv.writer(file), exported[0])
+                file.flush()
+                os.fsync(file.fileno())
+            self._record_export(csv_file, last_rowid)
+            return rows
+
+        # Written under a temporary name first so a reader never sees a half written file
+        with open(csv_file + '.tmp', 'w', newline='', encoding='utf-8') as file:
+            writer = csv.writer(file)
+            writer.writerow(csv_header)
+            rows, last_rowid = self._write_rows(writer, 0)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(csv_file + '.tmp', csv_file)
+        self._record_export(csv_file, last_rowid)
+        return rows
+
+    def close(self):
+        if hasattr(self.local, 'connection'):
+            self.local.connection.close()
+            del self.local.connection
+
+class StoreWriter:
+    """
+    Same writerow() as csv.writer, but the rows are buffered and inserted batch_size at a time.
+    """
+
+    def __init__(self, store, batch_size=default_batch_size):
+        self.store = store
+        self.batch_size = batch_size
+        self.rows = []
+        self.inserted = 0
+
+    def writerow(self, row):
+        self.rows.append(row)
+        if len(self.rows) >= self.batch_size:
+            self.flush()
+
+    def writerows(self, rows):
+        for row in rows:
+            self.writerow(row)
+
+    def flush(self):
+        if self.rows:
+            self.inserted += self.store.insert_rows(self.rows)
+            self.rows = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.flush()
@@ -0,0 +1,233 @@
+"""
+Project Name: MACHINE LEARNING TECHNIQUES FOR ESTIMATING SUICIDAL RISK ON SOCIAL MEDIA
+Author: Samuel Bernier
+Thesis Paper (French): https://uqo.on.worldcat.org/oclc/1415207814
+GitHub repository: https://github.com/BernierS/SetFit_Suicidal_Risk
+Huggin Face repository: https://huggingface.co/BernierS/SetFit_Suicidal_Risk
+File Description:
+    This file is a reproducible CPU benchmark of the SetFit predictions on a fixed sample of Suicide_Data_E16.csv.
+    It measures the sentences per second, the p50/p95/p99 latency of each model call and the memory of each
+    configuration (peak RSS minus the RSS when the configuration starts) across batch sizes, thread counts,
+    sentence length buckets and backends, and writes the results as JSON.
+
+    python SetFIt/SetFit-Bench.py                              Run the benchmark, the results go to Data/benchmarks/
+    python SetFIt/SetFit-Bench.py --compare OLD.json NEW.json  Compare two runs (e.g. two commits)
+--------------------------------------------------------------------------------
+This file is part of the MACHINE LEARNING TECHNIQUES FOR ESTIMATING SUICIDAL RISK SUICIDAL RISK ON SOCIAL NETWORKS project,
+developed as a part of Samuel Bernier's thesis. For more information, visit https://uqo.on.worldcat.org/oclc/1415207814.
+--------------------------------------------------------------------------------
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import threading
+import time
+import numpy as np
+import pandas as pd
+import psutil
+import torch
+
+from inference import length_sorted_order, load_model, predict_batched
+
+# Constants
+model_id = "BernierS/SetFit_Suicidal_Risk"
+model_revision = os.environ.get("SETFIT_MODEL_REVISION", "main")
+onnx_model_dir = 'Data/SetFit_Suicidal_Risk_onnx'
+results_dir = 'Data/benchmarks'
+
+# Fixed sample so two runs always score the same sentences
+sample_size = 512
+sample_seed = 42
+
+# Grid of the benchmark
+batch_sizes = [1, 8, 32, 64, 128]
+thread_counts = sorted({1, 2, 4, os.cpu_count() or 1})
+length_buckets = ['short', 'medium', 'long']
+
+# Each configuration runs at least this long (after one warm-up call) to get stable numbers
+min_seconds = 2.0
+
+# Metrics where a lower value is better, the others are better when higher
+lower_is_better = {'p50_ms', 'p95_ms', 'p99_ms', 'rss_increase_mb'}
+
+# Memory increases are compared from at least this many MB, a configuration that allocates nothing new would make any change infinite
+min_rss_increase_mb = 1.0
+
+# Sample the sentences, with replacement since the dataset is smaller than the sample
+def load_sample():
+    sentences = pd.read_csv('Data/Suicide_Data_E16.csv')['sentence']
+    return sentences.sample(sample_size, replace=True, random_state=sample_seed).tolist()
+
+class PeakMemory:
+    """
+    Samples the RSS of the process in a background thread while a configuration runs.
+    The peak RSS of the process only grows from one configuration to the next, so the increase over the RSS at the
+    start of the configuration is reported. The memory the allocator kept from the previous configurations is reused
+    without showing up, the increase is a lower bound of what the configuration needs alone.
+    """
+
+    def __init__(self, interval=0.01):
+        self.process = psutil.Process()
+        self.interval = interval
+        self.baseline = 0
+        self.peak = 0
+
+    def _sample(self):
+        while not self.stopped.is_set():
+            self.peak = max(self.peak, self.process.memory_info().rss)
+            self.stopped.wait(self.interval)
+
+    def __enter__(self):
+        self.baseline = self.process.memory_info().rss
+        self.peak = self.baseline
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._sample, daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stopped.set()
+        self.thread.join()
+
+    def increase(self):
+        return self.peak - self.baseline
+
+# Time a prediction function over the sentences, one call per batch
+def measure(predict, sentences, batch_size):
+    batches = [sentences[i:i + batch_size] for i in range(0, len(sentences), batch_size)]
+
+    latencies = []
+    scored = 0
+    # The memory is sampled from before the warm-up call, which allocates the buffers of the configuration
+    with PeakMemory() as memory:
+        # Warm-up call, not timed
+        predict(batches[0])
+
+        start_time = time.perf_counter()
+        while time.perf_counter() - start_time < min_seconds or not latencies:
+            for batch in batches:
+                call_start = time.perf_counter()
+                predict(batch)
+                latencies.append((time.perf_counter() - call_start) * 1000)
+                scored += len(batch)
+        elapsed = time.perf_counter() - start_time
+
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    return {
+        'sentences_per_second': scored / elapsed,
+        'p50_ms': float(p50),
+        'p95_ms': float(p95),
+        'p99_ms': float(p99),
+        'rss_increase_mb': memory.increase() / 2**20,
+        'calls': len(latencies),
+    }
+
+# The prediction function of each backend
+def backend_predict(backend, model, batch_size):
+    if backend == 'per-sentence':
+        # Same as the original SetFit-Pred.py: one model call per sentence
+        return lambda batch: [model([sentence]).item() for sentence in batch]
+    return lambda batch: predict_batched(batch, model, batch_size, show_progress_bar=False)
+
+def run_benchmark():
+    sentences = load_sample()
+    torch_model, revision = load_model(model_id, model_revision)
+    models = {'per-sentence': torch_model, 'batched': torch_model}
+    if os.path.isdir(onnx_model_dir):
+        models['onnx'], _ = load_model(model_id, backend='onnx', onnx_model_dir=onnx_model_dir)
+
+    # Split the sample in three buckets of token length
+    order = length_sorted_order(sentences, torch_model.model_body.tokenizer)
+    buckets = dict(zip(length_buckets, (list(np.array(sentences, dtype=object)[part]) for part in np.array_split(order, len(length_buckets)))))
+
+    results = []
+    for backend, model in models.items():
+        for threads in thread_counts:
+            torch.set_num_threads(threads)
+            if backend == 'onnx':
+                model, _ = load_model(model_id, backend='onnx', onnx_model_dir=onnx_model_dir, threads=threads)
+
+            # The per-sentence backend ignores the batch size, it is measured once per thread count
+            for batch_size in ([1] if backend == 'per-sentence' else batch_sizes):
+                result = {'backend': backend, 'threads': threads, 'batch_size': batch_size, 'length_bucket': 'all'}
+                result.update(measure(backend_predict(backend, model, batch_size), sentences, batch_size))
+                print(f"{backend:12} threads={threads:<3} batch={batch_size:<4} {result['sentences_per_second']:9.1f} sentences/s  p95 {result['p95_ms']:8.1f} ms  RSS +{result['rss_increase_mb']:.0f} MB")
+                results.append(result)
+
+            # Length buckets with the default batch size
+            if backend != 'per-sentence':
+                for bucket, bucket_sentences in buckets.items():
+                    result = {'backend': backend, 'threads': threads, 'batch_size': 64, 'length_bucket': bucket}
+                    result.update(measure(backend_predict(backend, model, 64), bucket_sentences, 64))
+                    print(f"{backend:12} threads={threads:<3} bucket={bucket:<6} {result['sentences_per_second']:9.1f} sentences/s  p95 {result['p95_ms']:8.1f} ms")
+                    results.append(result)
+
+    return {
+        'commit': git_commit(),
+        'date': datetime.datetime.now().isoformat(),
+        'model_revision': revision,
+        'machine': {'platform': platform.platform(), 'processor': platform.processor(), 'cpu_count': os.cpu_count(), 'torch': torch.__version__},
+        'sample': {'size': sample_size, 'seed': sample_seed},
+        'results': results,
+    }
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+# Print the change of each metric between two runs, for the configurations found in both
+def compare(old_file, new_file, threshold=0.05):
+    with open(old_file, 'r', encoding='utf-8') as f:
+        old = json.load(f)
+    with open(new_file, 'r', encoding='utf-8') as f:
+        new = json.load(f)
+
+    def key(result):
+        return (result['backend'], result['threads'], result['batch_size'], result['length_bucket'])
+
+    old_results = {key(result): result for result in old['results']}
+    regressions = 0
+    print(f"Comparing {old['commit']} -> {new['commit']}")
+    for result in new['results']:
+        previous = old_results.get(key(result))
+        if previous is None:
+            continue
+        for metric in ('sentences_per_second', 'p95_ms', 'rss_increase_mb'):
+            # Runs made before the metric existed
+            if metric not in previous or metric not in result:
+                continue
+            base = max(previous[metric], min_rss_increase_mb) if metric == 'rss_increase_mb' else previous[metric]
+            change = (result[metric] - previous[metric]) / base
+            worse = change > threshold if metric in lower_is_better else change < -threshold
+            regressions += worse
+            flag = ' <-- regression' if worse else ''
+            print(f"{str(key(result)):40} {metric:22} {previous[metric]:10.1f} -> {result[metric]:10.1f} ({change:+.1%}){flag}")
+
+    print(f"{regressions} regressions over {threshold:.0%}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description='CPU benchmark of the SetFit predictions')
+    parser.add_argument('--output', help='JSON file for the results (default: Data/benchmarks/bench-<commit>.json)')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help='Compare two result files instead of running the benchmark')
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    report = run_benchmark()
+    output = args.output or os.path.join(results_dir, f"bench-{report['commit']}.json")
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=4)
+    print(f"Results written to {output}")
+
+if __name__ == "__main__":
+    main()
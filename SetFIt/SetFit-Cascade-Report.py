@@ -0,0 +1,116 @@
+"""
+Project Name: MACHINE LEARNING TECHNIQUES FOR ESTIMATING SUICIDAL RISK ON SOCIAL MEDIA
+Author: Samuel Bernier
+Thesis Paper (French): https://uqo.on.worldcat.org/oclc/1415207814
+GitHub repository: https://github.com/BernierS/SetFit_Suicidal_Risk
+Huggin Face repository: https://huggingface.co/BernierS/SetFit_Suicidal_Risk
+File Description:
+    This file reports the accuracy/throughput trade-off of the cheap-first cascade of SetFit-Pred.py (see cascade.py)
+    against SetFit alone, for a range of confidence thresholds. The accuracy is measured on the test split of
+    Compare-algo/Multi-algo.py, which the TF-IDF model never saw, and the throughput on a fixed sample of it.
+
+    python Compare-algo/Multi-algo.py          Train and save the TF-IDF model first
+    python SetFIt/SetFit-Cascade-Report.py     The results go to Data/benchmarks/cascade_report.json
+--------------------------------------------------------------------------------
+This file is part of the MACHINE LEARNING TECHNIQUES FOR ESTIMATING SUICIDAL RISK SUICIDAL RISK ON SOCIAL NETWORKS project,
+developed as a part of Samuel Bernier's thesis. For more information, visit https://uqo.on.worldcat.org/oclc/1415207814.
+--------------------------------------------------------------------------------
+"""
+
+import datetime
+import json
+import os
+import time
+import numpy as np
+import pandas as pd
+
+from sklearn.model_selection import train_test_split
+from cascade import cascade_predict, cheap_predict, default_model_file, load_cascade_model
+from inference import load_model, predict_batched
+
+# Constants
+model_id = "BernierS/SetFit_Suicidal_Risk"
+model_revision = os.environ.get("SETFIT_MODEL_REVISION", "main")
+report_file = 'Data/benchmarks/cascade_report.json'
+thresholds = [0.2, 0.25, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 0.95, 0.99]
+prediction_batch_size = 64
+
+# Fixed sample of the test sentences for the throughput, with replacement since the test split is small
+sample_size = 512
+sample_seed = 42
+
+# The sample is scored again until this long has passed (after one warm-up call) to get stable numbers
+min_seconds = 2.0
+
+# Same split as Compare-algo/Multi-algo.py
+def load_test_split():
+    df = pd.read_csv('Data/Suicide_Data_E16.csv')
+    _, X_test, _, y_test = train_test_split(df['sentence'], df['label'], test_size=0.2, random_state=42)
+    return X_test.tolist(), y_test.to_numpy()
+
+# Sentences per second of a prediction function over the sample, after one warm-up call
+def throughput(predict, sentences):
+    predict(sentences[:prediction_batch_size])
+    scored = 0
+    start_time = time.perf_counter()
+    while time.perf_counter() - start_time < min_seconds or scored == 0:
+        predict(sentences)
+        scored += len(sentences)
+    return scored / (time.perf_counter() - start_time)
+
+def main():
+    sentences, labels = load_test_split()
+    model, revision = load_model(model_id, model_revision)
+    cheap_model = load_cascade_model(default_model_file)
+    sample = pd.Series(sentences).sample(sample_size, replace=True, random_state=sample_seed).tolist()
+
+    def setfit_predict(batch):
+        return predict_batched(batch, model, prediction_batch_size, show_progress_bar=False)
+
+    # Both models on the whole test split, the labels of the cascade follow from the confidence for every threshold
+    setfit_labels = np.asarray(setfit_predict(sentences))
+    cheap_labels, confidence = cheap_predict(cheap_model, sentences)
+
+    setfit_speed = throughput(setfit_predict, sample)
+    results = [{
+        'mode': 'SetFit alone', 'threshold': None, 'answered_by_tfidf': 0.0,
+        'accuracy': float((setfit_labels == labels).mean()), 'agreement_with_setfit': 1.0,
+        'sentences_per_second': setfit_speed, 'speedup': 1.0,
+    }]
+    for threshold in thresholds:
+        answered = confidence >= threshold
+        cascade_labels = np.where(answered, cheap_labels, setfit_labels)
+        speed = throughput(lambda batch: cascade_predict(cheap_model, batch, threshold, setfit_predict), sample)
+        results.append({
+            'mode': 'cascade', 'threshold': threshold, 'answered_by_tfidf': float(answered.mean()),
+            'accuracy': float((cascade_labels == labels).mean()), 'agreement_with_setfit': float((cascade_labels == setfit_labels).mean()),
+            'sentences_per_second': speed, 'speedup': speed / setfit_speed,
+        })
+    cheap_speed = throughput(lambda batch: cheap_predict(cheap_model, batch), sample)
+    results.append({
+        'mode': 'TF-IDF alone', 'threshold': 0.0, 'answered_by_tfidf': 1.0,
+        'accuracy': float((cheap_labels == labels).mean()), 'agreement_with_setfit': float((cheap_labels == setfit_labels).mean()),
+        'sentences_per_second': cheap_speed, 'speedup': cheap_speed / setfit_speed,
+    })
+
+    print(f"{'mode':14} {'threshold':>9} {'TF-IDF':>8} {'accuracy':>9} {'agreement':>10} {'sentences/s':>12} {'speedup':>8}")
+    for result in results:
+        threshold = '' if result['threshold'] is None else f"{result['threshold']:.2f}"
+        print(f"{result['mode']:14} {threshold:>9} {result['answered_by_tfidf']:8.1%} {result['accuracy']:9.1%} {result['agreement_with_setfit']:10.1%} {result['sentences_per_second']:12.1f} {result['speedup']:7.1f}x")
+
+    # SetFit-Train.py uses its own random split, so SetFit may have been trained on some of these test sentences
+    print(f"{len(sentences)} test sentences. The SetFit accuracy can be optimistic: SetFit-Train.py does not use the same split.")
+
+    os.makedirs(os.path.dirname(report_file), exist_ok=True)
+    with open(report_file, 'w', encoding='utf-8') as f:
+        json.dump({
+            'date': datetime.datetime.now().isoformat(),
+            'model_revision': revision,
+            'test_sentences': len(sentences),
+            'sample': {'size': sample_size, 'seed': sample_seed},
+            'results': results,
+        }, f, indent=4)
+    print(f"Results written to {report_file}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""
+Project Name: MACHINE LEARNING TECHNIQUES FOR ESTIMATING SUICIDAL RISK ON SOCIAL MEDIA
+Author: Samuel Bernier
+Thesis Paper (French): https://uqo.on.worldcat.org/oclc/1415207814
+GitHub repository: https://github.com/BernierS/SetFit_Suicidal_Risk
+Huggin Face repository: https://huggingface.co/BernierS/SetFit_Suicidal_Risk
+File Description:
+    This file is used to distill the trained SetFit model (paraphrase-mpnet-base-v2) into a smaller and faster
+    MiniLM student. The teacher labels unlabelled sentences of reddit_data.csv, the student body learns to reproduce
+    the similarities of the teacher embeddings and its head learns the teacher labels. The report compares the labels
+    of both models on held-out Reddit sentences and on Suicide_Data_E16.csv, and their speed on CPU.
+
+    To serve the student, set model_id = 'Data/SetFit_Suicidal_Risk_student' in SetFit-Pred.py or SetFit-Server.py.
+--------------------------------------------------------------------------------
+This file is part of the MACHINE LEARNING TECHNIQUES FOR ESTIMATING SUICIDAL RISK SUICIDAL RISK ON SOCIAL NETWORKS project,
+developed as a part of Samuel Bernier's thesis. For more information, visit https://uqo.on.worldcat.org/oclc/1415207814.
+--------------------------------------------------------------------------------
+"""
+
+import json
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+import torch
+
+from datasets import Dataset
+from dotenv import load_dotenv
+from sentence_transformers import SentenceTransformer
+from sentence_transformers.losses import CosineSimilarityLoss
+from setfit import DistillationSetFitTrainer, SetFitModel
+from sklearn.neural_network import MLPClassifier
+from inference import load_model, predict_batched
+from sentence_splitter import split_series
+
+# The shared modules are in the Common folder at the root of the repository
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from Common.text_normalization import normalize_series
+
+# Loads the variables from .env
+load_dotenv()
+
+# Constants
+teacher_model_id = "BernierS/SetFit_Suicidal_Risk"
+teacher_revision = os.environ.get("SETFIT_MODEL_REVISION", "main")
+
+# Body of the student, paraphrase-MiniLM-L6-v2 or all-MiniLM-L6-v2 (see Sentence Transformers/ST-API.py)
+student_body_id = 'sentence-transformers/paraphrase-MiniLM-L6-v2'
+student_dir = 'Data/SetFit_Suicidal_Risk_student'
+
+# Unlabelled sentences, split and cleaned like in SetFit-Pred.py
+unlabelled_file = 'Data/reddit_data.csv'
+labelled_file = 'Data/Suicide_Data_E16.csv'
+train_sentences = 2000
+held_out_sentences = 1000
+sample_seed = 42
+
+# Training of the student, each sentence gives num_iterations pairs per epoch
+num_iterations = 20
+num_epochs = 1
+batch_size = 16
+
+# Speed comparison: best of a few runs on the held-out sentences, one CPU thread count for both models
+speed_batch_size = 64
+speed_repeats = 3
+
+# Push the student to the Hub after the report
+push_student = False
+student_repo_id = "BernierS/SetFit_Suicidal_Risk_MiniLM"
+
+# Distinct sentences of the Reddit data, shuffled, the first ones train the student and the next ones are held out
+def load_unlabelled_sentences():
+    texts = normalize_series(pd.read_csv(unlabelled_file, usecols=['Body or Selftext'])['Body or Selftext'])
+    sentences = split_series(texts).drop_duplicates().sample(frac=1, random_state=sample_seed).tolist()
+    if len(sentences) < train_sentences + held_out_sentences:
+        print(f"**Only {len(sentences)} distinct sentences in {unlabelled_file}")
+    held_out = min(held_out_sentences, len(sentences) // 5)
+    return sentences[held_out:held_out + train_sentences], sentences[:held_out]
+
+# Seconds to predict the sentences, the best of a few runs
+def timed(model, sentences):
+    best = float('inf')
+    for _ in range(speed_repeats):
+        start_time = time.perf_counter()
+        predictions = predict_batched(sentences, model, speed_batch_size, show_progress_bar=False)
+        best = min(best, time.perf_counter() - start_time)
+    return np.asarray(predictions), best
+
+def distill(teacher, sentences):
+    # Same head as SetFit-Train.py, the MiniLM body is fine-tuned on the teacher similarities
+    student = SetFitModel(
+        model_body=SentenceTransformer(student_body_id),
+        model_head=MLPClassifier(),
+        multi_target_strategy=None,
+        l2_weight=1e-2,
+        normalize_embeddings=False
+    )
+
+    # The labels are placeholders, the trainer replaces them with the labels of the teacher
+    train_dataset = Dataset.from_dict({"text": sentences, "label": [0] * len(sentences)})
+    trainer = DistillationSetFitTrainer(
+        teacher_model=teacher,
+        student_model=student,
+        train_dataset=train_dataset,
+        loss_class=CosineSimilarityLoss,
+        num_iterations=num_iterations,
+        num_epochs=num_epochs,
+        batch_size=batch_size,
+        seed=sample_seed,
+    )
+    trainer.train()
+    return trainer.student_model
+
+def report(teacher, student, held_out):
+    labelled = pd.read_csv(labelled_file)
+    labelled_sentences = normalize_series(labelled['sentence']).tolist()
+    labels = labelled['label'].to_numpy()
+
+    teacher_labels, teacher_seconds = timed(teacher, held_out)
+    student_labels, student_seconds = timed(student, held_out)
+    teacher_labelled = np.asarray(predict_batched(labelled_sentences, teacher, speed_batch_size, show_progress_bar=False))
+    student_labelled = np.asarray(predict_batched(labelled_sentences, student, speed_batch_size, show_progress_bar=False))
+
+    # Agreement per label of the teacher, to see which labels the student loses
+    agreement_per_label = {
+        str(label): float(np.mean(student_labels[teacher_labels == label] == label))
+        for label in np.unique(teacher_labels)
+    }
+
+    results = {
+        'teacher': teacher_model_id,
+        'student_body': student_body_id,
+        'held_out_sentences': len(held_out),
+        'label_agreement': float(np.mean(student_labels == teacher_labels)),
+        'label_agreement_per_teacher_label': agreement_per_label,
+        'labelled_agreement': float(np.mean(student_labelled == teacher_labelled)),
+        'teacher_accuracy': float(np.mean(teacher_labelled == labels)),
+        'student_accuracy': float(np.mean(student_labelled == labels)),
+        'teacher_sentences_per_second': len(held_out) / teacher_seconds,
+        'student_sentences_per_second': len(held_out) / student_seconds,
+        'speedup': teacher_seconds / student_seconds,
+        'torch_threads': torch.get_num_threads(),
+    }
+
+    print("Distillation report:")
+    for key, value in results.items():
+        print(f"    {key}: {value:.4f}" if isinstance(value, float) else f"    {key}: {value}")
+    return results
+
+def main():
+    teacher, revision = load_model(teacher_model_id, teacher_revision)
+    sentences, held_out = load_unlabelled_sentences()
+    print(f"Distilling {teacher_model_id}@{revision} into {student_body_id} on {len(sentences)} sentences ({len(held_out)} held out)")
+
+    student = distill(teacher, sentences)
+    student.save_pretrained(student_dir)
+
+    results = report(teacher, student, held_out)
+    results['teacher_revision'] = revision
+    results['train_sentences'] = len(sentences)
+    with open(os.path.join(student_dir, 'distillation_report.json'), 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=4)
+    print(f"Student saved to {student_dir}")
+
+    if push_student:
+        student.push_to_hub(student_repo_id, token=os.environ.get("HF_TOKEN"))
+
+if __name__ == "__main__":
+    main()
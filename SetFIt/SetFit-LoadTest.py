@@ -0,0 +1,64 @@
+"""
+Project Name: MACHINE LEARNING TECHNIQUES FOR ESTIMATING SUICIDAL RISK ON SOCIAL MEDIA
+Author: Samuel Bernier
+Thesis Paper (French): https://uqo.on.worldcat.org/oclc/1415207814
+GitHub repository: https://github.com/BernierS/SetFit_Suicidal_Risk
+Huggin Face repository: https://huggingface.co/BernierS/SetFit_Suicidal_Risk
+File Description:
+    This file is used to load test the local scoring service started with SetFit-Server.py.
+    Concurrent clients send the sentences of Suicide_Data_E16.csv and the throughput and latencies are reported.
+--------------------------------------------------------------------------------
+This file is part of the MACHINE LEARNING TECHNIQUES FOR ESTIMATING SUICIDAL RISK SUICIDAL RISK ON SOCIAL NETWORKS project,
+developed as a part of Samuel Bernier's thesis. For more information, visit https://uqo.on.worldcat.org/oclc/1415207814.
+--------------------------------------------------------------------------------
+"""
+
+import asyncio
+import os
+import random
+import time
+import aiohttp
+import numpy as np
+import pandas as pd
+
+# Constants
+server_url = f"http://{os.environ.get('SETFIT_SERVER_HOST', '127.0.0.1')}:{os.environ.get('SETFIT_SERVER_PORT', 8000)}"
+concurrent_clients = 32
+requests_per_client = 50
+max_sentences_per_request = 4 # Each request has between 1 and this many sentences
+
+async def client(session, sentences, latencies, server_latencies, rng):
+    for _ in range(requests_per_client):
+        batch = rng.sample(sentences, rng.randint(1, max_sentences_per_request))
+        payload = {'text': batch[0]} if len(batch) == 1 else {'sentences': batch}
+
+        start_time = time.perf_counter()
+        async with session.post(f'{server_url}/predict', json=payload) as response:
+            response.raise_for_status()
+            result = await response.json()
+        latencies.append((time.perf_counter() - start_time) * 1000)
+        server_latencies.append(result['latency_ms'])
+
+async def run():
+    sentences = pd.read_csv('Data/Suicide_Data_E16.csv')['sentence'].tolist()
+    latencies = []
+    server_latencies = []
+
+    async with aiohttp.ClientSession() as session:
+        async with session.get(f'{server_url}/health') as response:
+            print(f"Server: {await response.json()}")
+
+        start_time = time.perf_counter()
+        await asyncio.gather(*(client(session, sentences, latencies, server_latencies, random.Random(i)) for i in range(concurrent_clients)))
+        elapsed = time.perf_counter() - start_time
+
+    print(f"{len(latencies)} requests from {concurrent_clients} clients in {elapsed:.1f} s ({len(latencies) / elapsed:.1f} requests/s)")
+    for name, values in (('Client latency', latencies), ('Server latency', server_latencies)):
+        p50, p95, p99 = np.percentile(values, [50, 95, 99])
+        print(f"{name}: p50 {p50:.1f} ms, p95 {p95:.1f} ms, p99 {p99:.1f} ms")
+
+def main():
+    asyncio.run(run())
+
+if __name__ == "__main__":
+    main()
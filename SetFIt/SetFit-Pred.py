@@ -12,90 +12,343 @@ developed as a part of Samuel Bernier's thesis. For more information, visit http
 --------------------------------------------------------------------------------
 """
 
-import re
+import numpy as np
 import pandas as pd
 import os
+import shutil
+import sys
 
-from setfit import SetFitModel
 from tqdm import tqdm
 from dotenv import load_dotenv
+from inference import embed_batched, label_map, load_model, predict_batched, predict_embeddings
+from embedding_cache import EmbeddingCache
+from scoring_manifest import ScoringManifest
+from parallel_inference import ParallelEncoder
+from sentence_splitter import split_series
+from cascade import cascade_predict, load_cascade_model
+from near_duplicates import cluster_id, find_representatives
+from parquet_output import ParquetSentenceWriter, migrate_parts
+from similarity_index import SimilarityIndex
+
+# The shared modules are in the Common folder at the root of the repository
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from Common import profiling
+from Common.summary_index import SummaryIndex
+from Common.text_normalization import normalize_series
 
 # Loads the variables from .env
 load_dotenv()
 
-# Split a text into sentences
-def split_into_sentences(text):
-    # We split on period, exclamation mark and question mark.
-    # NOTE: This is a simple approach and will not work well with some edge cases (e.g. abbreviations, ellipsis).
-    sentences = re.split(r'[.!?]', text)
-    
-    # Remove leading/trailing whitespace from each sentence
-    sentences = [s.strip() for s in sentences]
-    
-    # Remove strings with 50 characters or less
-    sentences = [s for s in sentences if s and len(s) > 50]
-    
-    return sentences
-    
-def process_dataframe(df, file_name, model, label_map):
-    # Split the Body or Selftext column into sentences to process them individually
-    df['Sentences'] = df['Body or Selftext'].apply(split_into_sentences)
-    df = df.explode('Sentences').reset_index(drop=True)
+# Constants
+input_file = 'Data/reddit_data.csv'
+output_file = 'Data/reddit_sentences'
+
+# 'csv' writes output_file.csv, 'parquet' writes a partitioned Parquet dataset in parquet_dir (see parquet_output.py)
+output_format = 'csv'
+parquet_dir = 'Data/reddit_sentences_parquet'
+model_id = "BernierS/SetFit_Suicidal_Risk"
+model_revision = os.environ.get("SETFIT_MODEL_REVISION", "main")
+
+# 'torch' for the PyTorch model from the Hub, 'onnx' for the model exported by onnx_export.py
+backend = 'torch'
+onnx_model_dir = 'Data/SetFit_Suicidal_Risk_onnx'
+
+# Number of sentences per forward pass, set to None to predict one sentence at a time
+prediction_batch_size = 64
+
+# On-disk cache of the sentence embeddings, only used with the batched prediction
+use_embedding_cache = True
+embedding_cache_dir = 'Data/embedding_cache'
+embedding_cache_max_entries = 500000 # About 1.5 GB with the 768 dimensions of paraphrase-mpnet-base-v2
+
+# Number of CPU worker processes encoding the sentences, each with its own copy of the model
+# Set to None to encode in this process with the default torch threading
+inference_workers = None
+threads_per_worker = None # None shares the cores evenly between the workers
+
+# Cheap-first cascade: the TF-IDF + Logistic Regression model saved by Compare-algo/Multi-algo.py answers the sentences
+# with a probability of at least cascade_threshold, only the others go through SetFit (see SetFit-Cascade-Report.py to choose it)
+# Only used with the batched prediction
+use_cascade = False
+cascade_model_file = 'Data/tfidf_cascade.joblib'
+cascade_threshold = 0.9
+
+# Score one sentence per group of near duplicates (copypasta, crossposts, quoted replies) and give its label to the others
+# Minimum estimated Jaccard similarity of the character shingles (see near_duplicates.py), set to None to only group exact duplicates
+near_duplicate_threshold = 0.8
+
+# Number of posts read from the input at a time, the peak memory depends on it and not on the size of the dataset
+# Set to None to load the whole input file at once
+read_chunk_size = 10000
+
+# Add the embeddings of the scored sentences to the similarity index of similarity_index.py ("show me other posts like this one")
+# Only used with the batched prediction, with the cascade every sentence is still encoded for the index
+use_similarity_index = False
+similarity_index_dir = 'Data/similarity_index'
 
-    #Remove empty sentences
-    df = df[df['Sentences'].str.len() > 0]
+# Label counts per author, per post and per subreddit read by Application.py (see Common/summary_index.py)
+# Updated at the end of each run with the new predictions only, set to None to skip it
+summary_index_file = 'Data/reddit_summary.db'
+
+# Keep a checkpoint manifest of the IDs already scored, skip them on restart and only append the new rows
+# Set to False to rewrite the output file from scratch
+incremental = True
+
+# Appending rows with other columns than the header would make the file unreadable
+def check_csv_columns(path, columns):
+    header = pd.read_csv(path, nrows=0).columns.tolist()
+    if header != list(columns):
+        raise ValueError(f"{path} has the columns {header}, the new rows have {list(columns)}: "
+                         "move the file away or set incremental = False to write it again")
+
+# Add the Cluster column to a CSV output written before near_duplicates.py, each old sentence is its own group
+# Returns True if the file was rewritten
+def migrate_csv_output(path, chunk_rows=100000):
+    if not os.path.isfile(path) or os.path.getsize(path) == 0:
+        return False
+    columns = pd.read_csv(path, nrows=0).columns.tolist()
+    if 'Cluster' in columns:
+        return False
+    if 'Sentences' not in columns:
+        raise ValueError(f"{path} has no Sentences column, it is not an output of SetFit-Pred.py")
+
+    # Read as text so the other values are written back unchanged
+    print(f"Adding the Cluster column to {path}...")
+    new_columns = columns[:columns.index('Sentences') + 1] + ['Cluster'] + columns[columns.index('Sentences') + 1:]
+    temp_path = path + '.tmp'
+    pd.DataFrame(columns=new_columns).to_csv(temp_path, index=False)
+    for chunk in pd.read_csv(path, dtype=str, keep_default_na=False, chunksize=chunk_rows):
+        chunk['Cluster'] = [cluster_id(sentence) for sentence in chunk['Sentences']]
+        chunk[new_columns].to_csv(temp_path, mode='a', header=False, index=False)
+    os.replace(temp_path, path)
+    return True
+
+def process_dataframe(df, file_name, model, label_map, prediction_batch_size=prediction_batch_size, cache=None, append=False, manifest=None, input_rows=None, encoder=None, writer=None, cascade=None, similarity=None):
+    # Skip the posts and comments already scored by a previous run
+    if manifest is not None:
+        df = df[~df['ID'].astype(str).isin(manifest.scored_ids)]
+        new_ids = df['ID'].unique()
+
+    # Split the Body or Selftext column into sentences to process them individually
+    # Only the (post index, sentence) pairs are kept, the other columns of the post are added back batch by batch
+    # The text is cleaned like the training data first (see Common/text_normalization.py)
+    with profiling.stage('normalize'):
+        texts = normalize_series(df['Body or Selftext'])
+    with profiling.stage('split'):
+        sentences = split_series(texts)
+        post_index = sentences.index.to_numpy()
+        sentences = sentences.to_numpy()
+    profiling.count('rows', len(df))
 
     # Create a batch process if there is more than 100,000 sentences to prevent memory overload
     batch_size = 100000
-    num_batches = len(df) // batch_size + (len(df) % batch_size != 0)
+    num_batches = len(sentences) // batch_size + (len(sentences) % batch_size != 0)
 
-    # For loop to process the dataframe in batches
-    for i in range(num_batches):
+    # Loop to process the sentences in batches
+    ids = df['ID'].to_numpy()[post_index]
+    i = 0
+    start = 0
+    while start < len(sentences):
         print(f"Processing batch {i + 1} of {num_batches}...")
-        start = i * batch_size
         end = start + batch_size
-        batch_df = df.iloc[start:end].copy()
+
+        # A batch never cuts a post in two, so each committed ID is complete and each post is in one part of the Parquet output
+        while end < len(sentences) and ids[end] == ids[end - 1]:
+            end += 1
+        batch_df = df.take(post_index[start:end])
+        batch_df['Sentences'] = sentences[start:end]
+
+        # Group the near duplicates of the batch, only the first sentence of each group goes through the model
+        # The Cluster column identifies the group, from the text of its first sentence
+        with profiling.stage('near_duplicates'):
+            batch_sentences = sentences[start:end]
+            representatives = find_representatives(batch_sentences, near_duplicate_threshold)
+            first, members = np.unique(representatives, return_inverse=True)
+            sentences_to_score = batch_sentences[first]
+            batch_df['Cluster'] = np.fromiter((cluster_id(s) for s in sentences_to_score), dtype=np.int64, count=len(first))[members]
+        saved = len(batch_sentences) - len(sentences_to_score)
+        print(f"{len(sentences_to_score)} of {len(batch_sentences)} sentences scored, {saved} near duplicates ({saved / max(len(batch_sentences), 1):.1%}) reuse the label of their group")
 
         # Apply the SetFit model to the sentences
-        # progress_apply() is a tqdm wrapper around apply() to give a progress bar
-        # lambda transforms the sentence into a list to match the model's input format
-        batch_df['Label'] = batch_df['Sentences'].progress_apply(lambda x: model([x]).item())
+        if prediction_batch_size:
+            # Sentences are grouped by token length and the labels come back in the original order
+            # Sentences already in the cache skip the model body and only go through the classifier head
+            # With the cascade, only the sentences the TF-IDF model is not confident about go through SetFit
+            # The similarity index needs the embeddings of all the sentences, the head and the cascade fallback reuse them
+            if similarity is not None:
+                embeddings = embed_batched(sentences_to_score.tolist(), model, prediction_batch_size, cache=cache, encoder=encoder)
+                if cascade is not None:
+                    position = {sentence: i for i, sentence in enumerate(sentences_to_score)}
+                    labels, _ = cascade_predict(cascade, sentences_to_score, cascade_threshold, lambda fallback: predict_embeddings(embeddings[[position[s] for s in fallback]], model))
+                else:
+                    labels = predict_embeddings(embeddings, model)
+            elif cascade is not None:
+                labels, _ = cascade_predict(cascade, sentences_to_score, cascade_threshold, lambda fallback: predict_batched(fallback, model, prediction_batch_size, cache=cache, encoder=encoder))
+            else:
+                labels = predict_batched(sentences_to_score.tolist(), model, prediction_batch_size, cache=cache, encoder=encoder)
+            if cache is not None:
+                cache.save()
+        else:
+            # progress_apply() is a tqdm wrapper around apply() to give a progress bar
+            # lambda transforms the sentence into a list to match the model's input format
+            with profiling.stage('predict'):
+                labels = pd.Series(sentences_to_score).progress_apply(lambda x: model([x]).item())
+        batch_df['Label'] = np.asarray(labels)[members]
+        profiling.count('sentences', len(batch_df))
+        profiling.count('sentences_scored', len(sentences_to_score))
 
         # Map the label number to the label text
         batch_df['Label Text'] = batch_df['Label'].map(label_map)
         
-        # If it's the first batch, write a new file with headers
-        if i == 0:
-            batch_df.to_csv(f'{file_name}.csv', index=False)
-        # Otherwise, append to the existing file without headers
-        else:
-            batch_df.to_csv(f'{file_name}.csv', mode='a', header=False, index=False)
+        # The Parquet writer adds one part per batch
+        with profiling.stage('write'):
+            if writer is not None:
+                bytes_written = writer.write(batch_df)
+            # If it's the first batch of a new file, write it with headers
+            elif i == 0 and not append:
+                batch_df.to_csv(f'{file_name}.csv', index=False)
+                bytes_written = os.path.getsize(f'{file_name}.csv')
+            # Otherwise, append to the existing file without headers
+            else:
+                check_csv_columns(f'{file_name}.csv', batch_df.columns)
+                size_before = os.path.getsize(f'{file_name}.csv')
+                batch_df.to_csv(f'{file_name}.csv', mode='a', header=False, index=False)
+                bytes_written = os.path.getsize(f'{file_name}.csv') - size_before
+        profiling.count('bytes_written', bytes_written)
 
+        # The near duplicates share the embedding of the sentence of their group that was scored
+        # A batch indexed just before a crash is scored again on resume, the posts already in the index are not added twice
+        if similarity is not None:
+            with profiling.stage('similarity_index'):
+                new_rows = ~batch_df['ID'].astype(str).isin(similarity.indexed_ids(batch_df['ID'].unique())).to_numpy()
+                similarity.add(embeddings[members][new_rows], batch_df[new_rows])
+
+        # Checkpoint the batch once its rows are in the output file
+        if manifest is not None:
+            manifest.commit(batch_df['ID'].unique())
+
+        # One JSON line per batch with the time of each stage (see Common/profiling.py)
+        profiling.log(batch=i + 1, batches=num_batches)
+        i += 1
+        start = end
+
+    # The posts without any sentence long enough are also marked as scored
+    if manifest is not None:
+        manifest.commit(set(map(str, new_ids)) - manifest.scored_ids, input_rows)
+
+    # Number of sentences written
+    return len(sentences)
+
+# Stream the input file chunk by chunk: split, score and append each chunk before reading the next one
+def process_csv_in_chunks(input_file, file_name, model, label_map, chunk_size=read_chunk_size, prediction_batch_size=prediction_batch_size, cache=None, manifest=None, encoder=None, writer=None, cascade=None, similarity=None):
+    sentences_written = 0
+    reader = pd.read_csv(input_file, chunksize=chunk_size, dtype={'ID': str})
+    chunk_number = 0
+    while True:
+        # The CSV parsing happens when the next chunk is requested
+        with profiling.stage('read_csv'):
+            chunk = next(reader, None)
+        if chunk is None:
+            break
+
+        print(f"Processing chunk {chunk_number + 1} (posts {chunk_number * chunk_size} to {chunk_number * chunk_size + len(chunk) - 1})...")
+
+        # The headers are only written once, by the first chunk that has sentences
+        append = sentences_written > 0 or (manifest is not None and manifest.has_output())
+        sentences_written += process_dataframe(chunk, file_name, model, label_map, prediction_batch_size, cache, append, manifest, chunk_number * chunk_size + len(chunk), encoder, writer, cascade, similarity)
+        chunk_number += 1
+
+    return sentences_written
 
 def main():
-    # Load the SetFit model and label map
-    model = SetFitModel.from_pretrained("BernierS/SetFit_Suicidal_Risk")
-
-    # Label map for the CSV file
-    label_map = {
-        0: "Suicidal planning",
-        1: "Previous attempt",
-        2: "Ability to hope for change",
-        3: "Consumption",
-        4: "Ability to control oneself",
-        5: "Presence of a loved one",
-        6: "Ability to take care of oneself",
-        7: "Other"
-    }
+    # Time the stages of the run, the JSON log goes to Data/logs/SetFit-Pred.jsonl
+    profiling.start('SetFit-Pred')
+
+    # Load the SetFit model (the label map is in inference.py)
+    with profiling.stage('load_model'):
+        model, resolved_revision = load_model(model_id, model_revision, backend=backend, onnx_model_dir=onnx_model_dir)
+
+    # The cache keys include the model revision, so a new version of the model never reuses old embeddings
+    cache = None
+    if use_embedding_cache and prediction_batch_size:
+        cache = EmbeddingCache(embedding_cache_dir, model.model_body.get_sentence_embedding_dimension(), resolved_revision, embedding_cache_max_entries)
+        print(f"Embedding cache: {len(cache)} sentences already encoded")
 
     # Initialize tqdm to use progress_apply()
     tqdm.pandas()
 
-    # Import CSV file
-    reddit_data = pd.read_csv('Data/reddit_data.csv')
+    output_path = parquet_dir if output_format == 'parquet' else f'{output_file}.csv'
+
+    # Resume from the manifest, or start over without one
+    manifest = None
+    if incremental:
+        manifest = ScoringManifest(output_path)
+        print(f"Manifest: {len(manifest.scored_ids)} posts and comments already scored")
+
+        # An output written before the Cluster column gets it, so the new batches can be appended to it
+        # The manifest records the new size of a rewritten CSV file
+        if os.path.isdir(output_path):
+            migrated = migrate_parts(output_path)
+            if migrated:
+                print(f"{migrated} Parquet parts given the Cluster column")
+        elif migrate_csv_output(output_path):
+            manifest.commit([])
+    else:
+        if os.path.isfile(f'{output_path}.manifest.jsonl'):
+            os.remove(f'{output_path}.manifest.jsonl')
+        if os.path.isdir(output_path):
+            shutil.rmtree(output_path)
+        if os.path.isdir(similarity_index_dir):
+            shutil.rmtree(similarity_index_dir)
+
+    # The manifest checks the parts left by a crash before the writer numbers the new ones
+    writer = None
+    if output_format == 'parquet':
+        writer = ParquetSentenceWriter(parquet_dir)
+
+    # Pool of worker processes sharing the encoding, this process stays the only writer
+    encoder = None
+    if inference_workers and prediction_batch_size:
+        encoder = ParallelEncoder(model_id, resolved_revision, inference_workers, threads_per_worker, prediction_batch_size, backend=backend, onnx_model_dir=onnx_model_dir)
+
+    cascade = None
+    if use_cascade and prediction_batch_size:
+        cascade = load_cascade_model(cascade_model_file)
+
+    # The index refuses the embeddings of another model revision
+    similarity = None
+    if use_similarity_index and prediction_batch_size:
+        similarity = SimilarityIndex(similarity_index_dir, model.model_body.get_sentence_embedding_dimension(), model_id, resolved_revision,
+                                      backend=backend, onnx_model_dir=onnx_model_dir)
+        print(f"Similarity index: {len(similarity)} sentences already indexed")
+
+    if read_chunk_size:
+        # Full dataset, streamed from the CSV file
+        process_csv_in_chunks(input_file, output_file, model, label_map, cache=cache, manifest=manifest, encoder=encoder, writer=writer, cascade=cascade, similarity=similarity)
+    else:
+        # Import CSV file
+        with profiling.stage('read_csv'):
+            reddit_data = pd.read_csv(input_file, dtype={'ID': str})
+
+        # Full dataset
+        append = manifest is not None and manifest.has_output()
+        process_dataframe(reddit_data, output_file, model, label_map, cache=cache, append=append, manifest=manifest, input_rows=len(reddit_data), encoder=encoder, writer=writer, cascade=cascade, similarity=similarity)
+
+    if encoder is not None:
+        print(f"Average throughput: {encoder.throughput():.1f} sentences/s with {encoder.workers} workers")
+        encoder.close()
+
+    if similarity is not None:
+        similarity.close()
+
+    # Add the new predictions to the summary index of Application.py
+    if summary_index_file:
+        with profiling.stage('summary_index'):
+            summary = SummaryIndex(summary_index_file)
+            print(f"Summary index: {summary.update(output_path)} new sentences")
+            summary.close()
 
-    # Full dataset
-    process_dataframe(reddit_data, 'Data/reddit_sentences', model, label_map)
+    profiling.finish()
 
 if __name__ == "__main__":
     main()
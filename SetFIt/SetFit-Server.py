@@ -0,0 +1,173 @@
+"""
+Project Name: MACHINE LEARNING TECHNIQUES FOR ESTIMATING SUICIDAL RISK ON SOCIAL MEDIA
+Author: Samuel Bernier
+Thesis Paper (French): https://uqo.on.worldcat.org/oclc/1415207814
+GitHub repository: https://github.com/BernierS/SetFit_Suicidal_Risk
+Huggin Face repository: https://huggingface.co/BernierS/SetFit_Suicidal_Risk
+File Description:
+    This file is a local HTTP service scoring text with the SetFit model for online use (e.g. a moderation queue).
+    The model is loaded once and the concurrent requests are grouped into micro-batches.
+
+    POST /predict   {"text": "one sentence"} or {"sentences": ["first sentence", "second sentence"]}
+                    -> {"labels": [...], "label_texts": [...], "latency_ms": ...}
+    GET  /health    -> {"status": "ok", "revision": ...}
+--------------------------------------------------------------------------------
+This file is part of the MACHINE LEARNING TECHNIQUES FOR ESTIMATING SUICIDAL RISK SUICIDAL RISK ON SOCIAL NETWORKS project,
+developed as a part of Samuel Bernier's thesis. For more information, visit https://uqo.on.worldcat.org/oclc/1415207814.
+--------------------------------------------------------------------------------
+"""
+
+import asyncio
+import os
+import sys
+import time
+
+from aiohttp import web
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+from inference import label_map, load_model, predict_batched
+
+# The shared modules are in the Common folder at the root of the repository
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from Common.text_normalization import normalize_text
+
+# Loads the variables from .env
+load_dotenv()
+
+# Constants
+host = os.environ.get("SETFIT_SERVER_HOST", "127.0.0.1")
+port = int(os.environ.get("SETFIT_SERVER_PORT", 8000))
+model_id = "BernierS/SetFit_Suicidal_Risk"
+model_revision = os.environ.get("SETFIT_MODEL_REVISION", "main")
+backend = os.environ.get("SETFIT_BACKEND", "torch") # 'torch' or 'onnx' (see onnx_export.py)
+onnx_model_dir = 'Data/SetFit_Suicidal_Risk_onnx'
+
+# Micro-batching knobs: a batch is sent to the model when it has max_batch_size sentences
+# or when the oldest request has waited max_wait_ms milliseconds
+max_batch_size = int(os.environ.get("SETFIT_MAX_BATCH_SIZE", 64))
+max_wait_ms = float(os.environ.get("SETFIT_MAX_WAIT_MS", 10))
+
+# Largest number of sentences accepted in one request
+max_sentences_per_request = 1000
+
+class MicroBatcher:
+    """
+    Collects the sentences of concurrent requests in an asyncio queue and scores them together.
+    The model runs in a single background thread so the event loop keeps accepting requests.
+    """
+
+    def __init__(self, model, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms):
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.queue = asyncio.Queue()
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.task = None
+
+    def start(self):
+        self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+        self.executor.shutdown(wait=True)
+
+    # Called by each request, returns the labels of its sentences
+    async def predict(self, sentences):
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((sentences, future))
+        return await future
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            # Wait for a first request, then for more until the batch is full or the wait is over
+            requests = [await self.queue.get()]
+            size = len(requests[0][0])
+            deadline = loop.time() + self.max_wait
+            while size < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    request = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                requests.append(request)
+                size += len(request[0])
+
+            sentences = [sentence for request_sentences, _ in requests for sentence in request_sentences]
+            try:
+                labels = await loop.run_in_executor(self.executor, predict_batched, sentences, self.model, self.max_batch_size, False)
+            except Exception as e:
+                for _, future in requests:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            # Give each request back its own slice of the labels
+            start = 0
+            for request_sentences, future in requests:
+                end = start + len(request_sentences)
+                if not future.done():
+                    future.set_result([int(label) for label in labels[start:end]])
+                start = end
+
+async def predict_handler(request):
+    start_time = time.perf_counter()
+    try:
+        payload = await request.json()
+    except ValueError:
+        return web.json_response({'error': 'The body must be JSON'}, status=400)
+
+    # A single sentence or a list of sentences, in a JSON object (a list or a number gets the same error)
+    if not isinstance(payload, dict):
+        payload = {}
+    if isinstance(payload.get('text'), str):
+        sentences = [payload['text']]
+    elif isinstance(payload.get('sentences'), list) and all(isinstance(s, str) for s in payload['sentences']):
+        sentences = payload['sentences']
+    else:
+        return web.json_response({'error': "Expected 'text' (string) or 'sentences' (list of strings)"}, status=400)
+
+    if not sentences:
+        return web.json_response({'labels': [], 'label_texts': [], 'latency_ms': 0.0})
+    if len(sentences) > max_sentences_per_request:
+        return web.json_response({'error': f"At most {max_sentences_per_request} sentences per request"}, status=413)
+
+    # Cleaned like the training data (see Common/text_normalization.py)
+    labels = await request.app['batcher'].predict([normalize_text(sentence) for sentence in sentences])
+    return web.json_response({
+        'labels': labels,
+        'label_texts': [label_map[label] for label in labels],
+        'latency_ms': (time.perf_counter() - start_time) * 1000,
+    })
+
+async def health_handler(request):
+    return web.json_response({'status': 'ok', 'revision': request.app['revision'], 'backend': backend})
+
+async def on_startup(app):
+    app['batcher'].start()
+
+async def on_cleanup(app):
+    await app['batcher'].stop()
+
+def create_app(model, revision):
+    app = web.Application()
+    app['batcher'] = MicroBatcher(model)
+    app['revision'] = revision
+    app.router.add_post('/predict', predict_handler)
+    app.router.add_get('/health', health_handler)
+    app.on_startup.append(on_startup)
+    app.on_cleanup.append(on_cleanup)
+    return app
+
+def main():
+    # Load the SetFit model once for the lifetime of the service
+    model, revision = load_model(model_id, model_revision, backend=backend, onnx_model_dir=onnx_model_dir)
+    print(f"Model {model_id} ({revision}) loaded, max batch size {max_batch_size}, max wait {max_wait_ms} ms")
+
+    web.run_app(create_app(model, revision), host=host, port=port)
+
+if __name__ == "__main__":
+    main()
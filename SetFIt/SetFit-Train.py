@@ -12,10 +12,10 @@ developed as a part of Samuel Bernier's thesis. For more information, visit http
 --------------------------------------------------------------------------------
 """
 
-import re
 import evaluate
 import pandas as pd
 import os
+import sys
 
 from setfit import SetFitModel
 from sentence_transformers.losses import CosineSimilarityLoss
@@ -25,19 +25,24 @@ from sklearn.model_selection import train_test_split
 from sentence_transformers import SentenceTransformer
 from sklearn.neural_network import MLPClassifier
 from dotenv import load_dotenv
+from head_sweep import run_sweep, save_embeddings
+from inference import resolve_model_revision, weights_revision
+
+# The shared modules are in the Common folder at the root of the repository
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from Common.text_normalization import normalize_series
 
 # Loads the variables from .env
 load_dotenv()  
 
-# Function to HTML tags and URLs
-def process_text(text):
-    # Remove HTML tags
-    text = re.sub('<[^<]+?>', ' ', text)
+# Export the trained model body to ONNX for CPU inference, with dynamic int8 quantization
+export_onnx = True
+quantize_onnx = True
 
-    # Remove URLs
-    text = re.sub(r'http\S+|www.\S+', '', text)
-    
-    return text
+# Encode the train and eval splits once with the fine-tuned body, save the embeddings and compare a grid of heads on them
+# (see head_sweep.py), with use_best_head the head with the best cross-validation accuracy replaces MLPClassifier() before the push
+head_sweep = True
+use_best_head = False
 
 #Load the proper sentence transformer model
 model_body = SentenceTransformer('paraphrase-mpnet-base-v2')
@@ -46,8 +51,8 @@ model_head = MLPClassifier()
 # Load your dataset using pandas
 dataset = pd.read_csv("Data/Suicide_Data_E16.csv")
 
-# #Pre-processe the text
-dataset['sentence'] = dataset['sentence'].apply(process_text)
+# Pre-process the text the same way as the crawler and the predictions (see Common/text_normalization.py)
+dataset['sentence'] = normalize_series(dataset['sentence'])
 
 # Split the dataset into training and validation datasets
 train_df, test_df = train_test_split(dataset, test_size=0.33, stratify=dataset['label'])
@@ -92,7 +97,29 @@ trainer.train()
 metrics = trainer.evaluate()
 print(metrics)
 
+# The sweep only needs the saved embeddings, python SetFIt/head_sweep.py runs it again without training
+if head_sweep:
+    embeddings = save_embeddings(trainer.model, train_ds['sentence'], train_ds['label'], test_ds['sentence'], test_ds['label'])
+    sweep_results, fitted_heads = run_sweep(embeddings)
+    if use_best_head:
+        best_head = sweep_results[0]['head']
+        trainer.model.model_head = fitted_heads[best_head]
+        print(f"Using the head {best_head}: {trainer.evaluate()}")
+
 # Push model to HuggingFace
+repo_id = "BernierS/SetFit_Suicidal_Risk"
 trainer.push_to_hub(
-    repo_id = "BernierS/SetFit_Suicidal_Risk",
+    repo_id = repo_id,
     token = os.environ.get("HF_TOKEN"))
+
+# Export the model next to the pushed one and compare it with the PyTorch model on Suicide_Data_E16.csv
+if export_onnx:
+    # Imported here so onnxruntime is only loaded when the model is exported
+    from onnx_export import export_with_report
+
+    # The revision keys the embedding cache and the similarity index, so it must change with the weights:
+    # the commit just pushed, or a hash of the weights when the Hub can not be reached
+    revision = resolve_model_revision(repo_id)
+    if revision == 'main':
+        revision = weights_revision(trainer.model)
+    export_with_report(trainer.model, quantize=quantize_onnx, revision=revision)
@@ -0,0 +1,55 @@
+"""
+Project Name: MACHINE LEARNING TECHNIQUES FOR ESTIMATING SUICIDAL RISK ON SOCIAL MEDIA
+Author: Samuel Bernier
+Thesis Paper (French): https://uqo.on.worldcat.org/oclc/1415207814
+GitHub repository: https://github.com/BernierS/SetFit_Suicidal_Risk
+Huggin Face repository: https://huggingface.co/BernierS/SetFit_Suicidal_Risk
+File Description:
+    This file contains the cheap-first cascade of SetFit-Pred.py: the TF-IDF + Logistic Regression model trained and
+    saved by Compare-algo/Multi-algo.py answers the sentences it is confident about, and only the other sentences go
+    through the SetFit model. SetFit-Cascade-Report.py measures the accuracy and the throughput for each threshold.
+--------------------------------------------------------------------------------
+This file is part of the MACHINE LEARNING TECHNIQUES FOR ESTIMATING SUICIDAL RISK SUICIDAL RISK ON SOCIAL NETWORKS project,
+developed as a part of Samuel Bernier's thesis. For more information, visit https://uqo.on.worldcat.org/oclc/1415207814.
+--------------------------------------------------------------------------------
+"""
+
+import os
+import sys
+import joblib
+import numpy as np
+
+# The shared modules are in the Common folder at the root of the repository
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from Common import profiling
+
+# Pipeline (TfidfVectorizer, LogisticRegression) saved by Compare-algo/Multi-algo.py
+default_model_file = 'Data/tfidf_cascade.joblib'
+
+def load_cascade_model(path=default_model_file):
+    if not os.path.isfile(path):
+        raise FileNotFoundError(f"{path} not found, run Compare-algo/Multi-algo.py first to train and save the TF-IDF model")
+    return joblib.load(path)
+
+# Labels of the cheap model and their probability, used as the confidence
+def cheap_predict(model, sentences):
+    probabilities = model.predict_proba(list(sentences))
+    best = probabilities.argmax(axis=1)
+    return model.classes_[best].astype(np.int64), probabilities[np.arange(len(best)), best]
+
+# Labels of the sentences, from the cheap model when its confidence reaches the threshold and from predict_fallback
+# (e.g. the SetFit model) otherwise, with the mask of the sentences answered by the cheap model
+def cascade_predict(model, sentences, threshold, predict_fallback):
+    sentences = list(sentences)
+    if len(sentences) == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=bool)
+
+    with profiling.stage('cascade'):
+        labels, confidence = cheap_predict(model, sentences)
+    answered = confidence >= threshold
+    profiling.count('sentences_cascade', answered.sum())
+
+    fallback = np.flatnonzero(~answered)
+    if len(fallback) > 0:
+        labels[fallback] = np.asarray(predict_fallback([sentences[i] for i in fallback]))
+    return labels, answered
@@ -0,0 +1,155 @@
+"""
+Project Name: MACHINE LEARNING TECHNIQUES FOR ESTIMATING SUICIDAL RISK ON SOCIAL MEDIA
+Author: Samuel Bernier
+Thesis Paper (French): https://uqo.on.worldcat.org/oclc/1415207814
+GitHub repository: https://github.com/BernierS/SetFit_Suicidal_Risk
+Huggin Face repository: https://huggingface.co/BernierS/SetFit_Suicidal_Risk
+File Description:
+    This file contains the on-disk cache of sentence embeddings used by SetFit-Pred.py to avoid re-encoding sentences.
+--------------------------------------------------------------------------------
+This file is part of the MACHINE LEARNING TECHNIQUES FOR ESTIMATING SUICIDAL RISK SUICIDAL RISK ON SOCIAL NETWORKS project,
+developed as a part of Samuel Bernier's thesis. For more information, visit https://uqo.on.worldcat.org/oclc/1415207814.
+--------------------------------------------------------------------------------
+"""
+
+import hashlib
+import json
+import os
+import numpy as np
+
+# Size of the hash used as a key, 16 bytes is plenty to avoid collisions
+key_size = 16
+
+# Fraction of the cache freed at once when it is full, so eviction does not run on every insert
+eviction_fraction = 0.1
+
+# Collapse the whitespace so the same sentence always gets the same key
+def normalize_sentence(sentence):
+    return ' '.join(sentence.split())
+
+# Hash of the normalized sentence and the model revision
+def sentence_key(sentence, model_revision):
+    text = f"{model_revision}\x00{normalize_sentence(sentence)}"
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=key_size).digest()
+
+class EmbeddingCache:
+    """
+    Embeddings are stored in a memory-mapped float32 array (vectors.f32) with a fixed number of slots.
+    The index (index.npz) only keeps the key, the slot and the last use of each entry.
+    When the cache is full, the least recently used entries are evicted.
+    """
+
+    def __init__(self, directory, dimension, model_revision, max_entries=500000):
+        self.directory = directory
+        self.dimension = dimension
+        self.model_revision = model_revision
+        self.max_entries = max_entries
+
+        self.vectors_path = os.path.join(directory, 'vectors.f32')
+        self.index_path = os.path.join(directory, 'index.npz')
+        self.meta_path = os.path.join(directory, 'meta.json')
+        os.makedirs(directory, exist_ok=True)
+
+        # Start from an empty cache if the files are missing or were made for another shape
+        meta = {'dimension': dimension, 'max_entries': max_entries}
+        if not self._matches(meta):
+            self._reset(meta)
+
+        self.vectors = np.memmap(self.vectors_path, dtype=np.float32, mode='r+', shape=(max_entries, dimension))
+        self._load_index()
+
+    def _matches(self, meta):
+        if not (os.path.isfile(self.meta_path) and os.path.isfile(self.vectors_path) and os.path.isfile(self.index_path)):
+            return False
+        with open(self.meta_path, 'r', encoding='utf-8') as f:
+            return json.load(f) == meta
+
+    def _reset(self, meta):
+        vectors = np.memmap(self.vectors_path, dtype=np.float32, mode='w+', shape=(self.max_entries, self.dimension))
+        del vectors
+        np.savez(self.index_path, keys=np.empty((0, key_size), dtype=np.uint8), slots=np.empty(0, dtype=np.int64), last_used=np.empty(0, dtype=np.int64), clock=0)
+        with open(self.meta_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+
+    def _load_index(self):
+        with np.load(self.index_path) as index:
+            keys = index['keys']
+            slots = index['slots']
+            last_used = index['last_used']
+            self.clock = int(index['clock'])
+
+        # Keys are stored as rows of raw bytes, numpy byte strings would drop trailing zero bytes
+        keys = [row.tobytes() for row in keys]
+
+        # Slot -> key and slot -> last use, None marks a free slot
+        self.slot_keys = [None] * self.max_entries
+        self.last_used = np.zeros(self.max_entries, dtype=np.int64)
+        for key, slot in zip(keys, slots.tolist()):
+            self.slot_keys[slot] = key
+        self.last_used[slots] = last_used
+
+        self.slots = dict(zip(keys, slots.tolist()))
+        self.free_slots = sorted(set(range(self.max_entries)) - set(self.slots.values()), reverse=True)
+
+    def __len__(self):
+        return len(self.slots)
+
+    def keys_for(self, sentences):
+        return [sentence_key(sentence, self.model_revision) for sentence in sentences]
+
+    # Returns the cached embeddings and a mask of the sentences that were found
+    def lookup(self, keys):
+        embeddings = np.empty((len(keys), self.dimension), dtype=np.float32)
+        found = np.zeros(len(keys), dtype=bool)
+
+        positions = []
+        slots = []
+        for position, key in enumerate(keys):
+            slot = self.slots.get(key)
+            if slot is not None:
+                positions.append(position)
+                slots.append(slot)
+
+        if slots:
+            self.clock += 1
+            embeddings[positions] = self.vectors[slots]
+            found[positions] = True
+            self.last_used[slots] = self.clock
+
+        return embeddings, found
+
+    # Add new embeddings to the cache, evicting the least recently used ones if needed
+    def add(self, keys, embeddings):
+        self.clock += 1
+        for key, embedding in zip(keys, embeddings):
+            if key in self.slots:
+                continue
+            if not self.free_slots:
+                self._evict()
+            slot = self.free_slots.pop()
+            self.vectors[slot] = embedding
+            self.slot_keys[slot] = key
+            self.last_used[slot] = self.clock
+            self.slots[key] = slot
+
+    def _evict(self):
+        count = max(1, int(self.max_entries * eviction_fraction))
+        oldest = np.argpartition(self.last_used, count - 1)[:count]
+        for slot in oldest.tolist():
+            del self.slots[self.slot_keys[slot]]
+            self.slot_keys[slot] = None
+            self.last_used[slot] = np.iinfo(np.int64).max
+            self.free_slots.append(slot)
+
+        # The saved index must forget the evicted keys before their slots get other vectors,
+        # otherwise a crash before the next save would map them to the wrong embeddings
+        self.save()
+
+    # Flush the vectors and write the index, the index is replaced atomically
+    def save(self):
+        self.vectors.flush()
+        slots = np.fromiter(self.slots.values(), dtype=np.int64, count=len(self.slots))
+        temp_path = self.index_path + '.tmp.npz'
+        keys = np.frombuffer(b''.join(self.slot_keys[slot] for slot in slots.tolist()), dtype=np.uint8).reshape(-1, key_size)
+        np.savez(temp_path, keys=keys, slots=slots, last_used=self.last_used[slots], clock=self.clock)
+        os.replace(temp_path, self.index_path)
@@ -0,0 +1,156 @@
+"""
+Project Name: MACHINE LEARNING TECHNIQUES FOR ESTIMATING SUICIDAL RISK ON SOCIAL MEDIA
+Author: Samuel Bernier
+Thesis Paper (French): https://uqo.on.worldcat.org/oclc/1415207814
+GitHub repository: https://github.com/BernierS/SetFit_Suicidal_Risk
+Huggin Face repository: https://huggingface.co/BernierS/SetFit_Suicidal_Risk
+File Description:
+    This file is used to compare classifier heads for the SetFit model without fine-tuning the body again.
+    SetFit-Train.py encodes the train and eval splits once with the fine-tuned body and saves the embeddings,
+    then every candidate head is cross-validated on these embeddings in parallel on all the cores. The report gives
+    the accuracy and the F1 of each head (cross-validation and eval split) and the time it takes to predict.
+
+    python SetFIt/head_sweep.py     Run the sweep again on the embeddings saved by the last training
+--------------------------------------------------------------------------------
+This file is part of the MACHINE LEARNING TECHNIQUES FOR ESTIMATING SUICIDAL RISK SUICIDAL RISK ON SOCIAL NETWORKS project,
+developed as a part of Samuel Bernier's thesis. For more information, visit https://uqo.on.worldcat.org/oclc/1415207814.
+--------------------------------------------------------------------------------
+"""
+
+import json
+import os
+import time
+import numpy as np
+
+from joblib import Parallel, delayed
+from sklearn.base import clone
+from sklearn.linear_model import LogisticRegression, RidgeClassifier
+from sklearn.metrics import accuracy_score, f1_score
+from sklearn.model_selection import StratifiedKFold, cross_validate
+from sklearn.neighbors import KNeighborsClassifier
+from sklearn.neural_network import MLPClassifier
+from sklearn.svm import SVC
+from inference import encode_batched
+
+# Default files of the sweep
+default_embeddings_file = 'Data/head_sweep/embeddings.npz'
+default_report_file = 'Data/benchmarks/head_sweep.json'
+
+# Number of folds of the cross-validation on the train split, and number of processes (-1 uses all the cores)
+cv_folds = 5
+n_jobs = -1
+
+# Predictions of one sentence at a time for the latency of each head
+latency_repeats = 200
+
+# Candidate heads, the first one is the head used until now by SetFit-Train.py
+def candidate_heads():
+    return {
+        'MLP (100,) default': MLPClassifier(),
+        'MLP (64,)': MLPClassifier(hidden_layer_sizes=(64,), max_iter=1000, random_state=42),
+        'MLP (256,)': MLPClassifier(hidden_layer_sizes=(256,), max_iter=1000, random_state=42),
+        'MLP (256, 64)': MLPClassifier(hidden_layer_sizes=(256, 64), max_iter=1000, random_state=42),
+        'MLP (100,) alpha=1e-2': MLPClassifier(alpha=1e-2, max_iter=1000, random_state=42),
+        'LogisticRegression C=0.1': LogisticRegression(C=0.1, max_iter=1000),
+        'LogisticRegression C=1': LogisticRegression(C=1.0, max_iter=1000),
+        'LogisticRegression C=10': LogisticRegression(C=10.0, max_iter=1000),
+        'RidgeClassifier': RidgeClassifier(),
+        'SVC linear': SVC(kernel='linear'),
+        'SVC rbf': SVC(kernel='rbf'),
+        'KNN 5': KNeighborsClassifier(n_neighbors=5),
+    }
+
+# Encode both splits with the fine-tuned body and save them, the sweep can then run again without the model
+def save_embeddings(model, train_sentences, train_labels, eval_sentences, eval_labels, path=default_embeddings_file):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    np.savez(
+        path,
+        train_embeddings=encode_batched(train_sentences, model, show_progress_bar=False),
+        train_labels=np.asarray(train_labels),
+        eval_embeddings=encode_batched(eval_sentences, model, show_progress_bar=False),
+        eval_labels=np.asarray(eval_labels),
+    )
+    return load_embeddings(path)
+
+def load_embeddings(path=default_embeddings_file):
+    with np.load(path) as data:
+        return {name: data[name] for name in data.files}
+
+# Cross-validate a head on the train split, then fit it on the whole train split and score it on the eval split
+# Runs in a worker process, so each call only uses one core
+def evaluate_head(name, head, embeddings):
+    X_train, y_train = embeddings['train_embeddings'], embeddings['train_labels']
+    X_eval, y_eval = embeddings['eval_embeddings'], embeddings['eval_labels']
+
+    folds = StratifiedKFold(n_splits=cv_folds, shuffle=True, random_state=42)
+    scores = cross_validate(clone(head), X_train, y_train, cv=folds, scoring=['accuracy', 'f1_macro'])
+
+    start_time = time.perf_counter()
+    fitted = clone(head).fit(X_train, y_train)
+    fit_seconds = time.perf_counter() - start_time
+    predictions = fitted.predict(X_eval)
+
+    return fitted, {
+        'head': name,
+        'params': {key: str(value) for key, value in head.get_params().items()},
+        'cv_accuracy': float(scores['test_accuracy'].mean()),
+        'cv_accuracy_std': float(scores['test_accuracy'].std()),
+        'cv_f1_macro': float(scores['test_f1_macro'].mean()),
+        'eval_accuracy': float(accuracy_score(y_eval, predictions)),
+        'eval_f1_macro': float(f1_score(y_eval, predictions, average='macro')),
+        'fit_seconds': fit_seconds,
+    }
+
+# Time the predictions of a fitted head, for a whole batch and for one sentence at a time
+def head_latency(head, X):
+    start_time = time.perf_counter()
+    head.predict(X)
+    batch_seconds = time.perf_counter() - start_time
+
+    latencies = []
+    for i in range(latency_repeats):
+        row = X[i % len(X)][np.newaxis]
+        start_time = time.perf_counter()
+        head.predict(row)
+        latencies.append(time.perf_counter() - start_time)
+
+    return {
+        'batch_us_per_sentence': batch_seconds / len(X) * 1e6,
+        'single_p50_us': float(np.percentile(latencies, 50) * 1e6),
+        'single_p95_us': float(np.percentile(latencies, 95) * 1e6),
+    }
+
+# Evaluate all the candidate heads, best cross-validation accuracy first
+# Returns the results and the fitted heads by name
+def run_sweep(embeddings, heads=None, report_file=default_report_file):
+    heads = heads or candidate_heads()
+    outcomes = Parallel(n_jobs=n_jobs)(delayed(evaluate_head)(name, head, embeddings) for name, head in heads.items())
+
+    # The latency is measured here, one head at a time, so the heads do not compete for the cores
+    results = []
+    fitted_heads = {}
+    for fitted, result in outcomes:
+        result.update(head_latency(fitted, embeddings['eval_embeddings']))
+        results.append(result)
+        fitted_heads[result['head']] = fitted
+    results.sort(key=lambda result: (-result['cv_accuracy'], -result['cv_f1_macro'], result['single_p50_us']))
+
+    print(f"Head sweep on {len(embeddings['train_labels'])} train and {len(embeddings['eval_labels'])} eval sentences ({cv_folds}-fold cross-validation):")
+    print(f"    {'head':28} {'cv acc':>8} {'cv F1':>8} {'eval acc':>9} {'eval F1':>8} {'us/sent':>9} {'p50 us':>9}")
+    for result in results:
+        print(f"    {result['head']:28} {result['cv_accuracy']:8.3f} {result['cv_f1_macro']:8.3f} {result['eval_accuracy']:9.3f} {result['eval_f1_macro']:8.3f} {result['batch_us_per_sentence']:9.1f} {result['single_p50_us']:9.1f}")
+
+    if report_file:
+        os.makedirs(os.path.dirname(report_file), exist_ok=True)
+        with open(report_file, 'w', encoding='utf-8') as f:
+            json.dump({'cv_folds': cv_folds, 'results': results}, f, indent=4)
+        print(f"Results written to {report_file}")
+    return results, fitted_heads
+
+def main():
+    if not os.path.isfile(default_embeddings_file):
+        raise FileNotFoundError(f"{default_embeddings_file} not found, run SetFit-Train.py with head_sweep = True first")
+    run_sweep(load_embeddings(default_embeddings_file))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""
+Project Name: MACHINE LEARNING TECHNIQUES FOR ESTIMATING SUICIDAL RISK ON SOCIAL MEDIA
+Author: Samuel Bernier
+Thesis Paper (French): https://uqo.on.worldcat.org/oclc/1415207814
+GitHub repository: https://github.com/BernierS/SetFit_Suicidal_Risk
+Huggin Face repository: https://huggingface.co/BernierS/SetFit_Suicidal_Risk
+File Description:
+    This file contains the batched inference helpers used to make predictions with the SetFit model.
+--------------------------------------------------------------------------------
+This file is part of the MACHINE LEARNING TECHNIQUES FOR ESTIMATING SUICIDAL RISK SUICIDAL RISK ON SOCIAL NETWORKS project,
+developed as a part of Samuel Bernier's thesis. For more information, visit https://uqo.on.worldcat.org/oclc/1415207814.
+--------------------------------------------------------------------------------
+"""
+
+import hashlib
+import os
+import pickle
+import sys
+import numpy as np
+
+from huggingface_hub import HfApi
+from setfit import SetFitModel
+from tqdm import tqdm
+
+# The shared modules are in the Common folder at the root of the repository
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from Common import profiling
+
+# Default number of sentences sent to the model body in one forward pass
+default_batch_size = 64
+
+# Label map of the model
+label_map = {
+    0: "Suicidal planning",
+    1: "Previous attempt",
+    2: "Ability to hope for change",
+    3: "Consumption",
+    4: "Ability to control oneself",
+    5: "Presence of a loved one",
+    6: "Ability to take care of oneself",
+    7: "Other"
+}
+
+# Resolve a branch or tag of the Hub repository to the commit hash, so the loaded weights are known exactly
+def resolve_model_revision(model_id, revision='main'):
+    # A local folder has no revision on the Hub
+    if os.path.isdir(model_id):
+        return revision
+    try:
+        return HfApi().model_info(model_id, revision=revision).sha
+    except Exception as e:
+        print(f"**Could not resolve the revision of {model_id} ({e}), using '{revision}'")
+        return revision
+
+# Hash of the weights of the body and of the head, a revision for a model that is not on the Hub
+def weights_revision(model):
+    digest = hashlib.blake2b(digest_size=8)
+    for name, tensor in model.model_body.state_dict().items():
+        digest.update(name.encode('utf-8'))
+        digest.update(tensor.detach().cpu().numpy().tobytes())
+    digest.update(pickle.dumps(model.model_head))
+    return f"local-{digest.hexdigest()}"
+
+# Load the SetFit model at a given revision, returns the model and the resolved revision
+# The 'onnx' backend loads the model exported by onnx_export.py instead, its revision is recorded at export time
+def load_model(model_id, revision='main', resolve=True, backend='torch', onnx_model_dir=None, threads=None):
+    if backend == 'onnx':
+        # Imported here so onnxruntime is only needed with the ONNX backend
+        from onnx_export import OnnxSetFitModel, default_export_dir
+        model = OnnxSetFitModel(onnx_model_dir or default_export_dir, threads)
+        return model, model.revision
+
+    resolved_revision = resolve_model_revision(model_id, revision) if resolve else revision
+    if os.path.isdir(model_id):
+        return SetFitModel.from_pretrained(model_id), resolved_revision
+    return SetFitModel.from_pretrained(model_id, revision=resolved_revision), resolved_revision
+
+# Order the sentences by token length so that each batch pads to a similar length
+def length_sorted_order(sentences, tokenizer, max_length=None):
+    # Tokenize everything once, without special tokens, only to measure the lengths
+    with profiling.stage('tokenize'):
+        encoded = tokenizer(list(sentences), add_special_tokens=False, truncation=max_length is not None, max_length=max_length)
+        lengths = np.fromiter((len(ids) for ids in encoded['input_ids']), dtype=np.int64, count=len(sentences))
+    profiling.count('tokens', lengths.sum())
+
+    # Stable sort so sentences of equal length keep their original order
+    return np.argsort(lengths, kind='stable')
+
+# Encode the sentences with the model body in length-bucketed batches
+def encode_batched(sentences, model, batch_size=default_batch_size, show_progress_bar=True):
+    sentences = list(sentences)
+    body = model.model_body
+    if len(sentences) == 0:
+        return np.empty((0, body.get_sentence_embedding_dimension()), dtype=np.float32)
+
+    order = length_sorted_order(sentences, body.tokenizer, body.max_seq_length)
+    embeddings = np.empty((len(sentences), body.get_sentence_embedding_dimension()), dtype=np.float32)
+
+    # Each slice of the sorted order is one bucket of sentences with similar token length
+    starts = range(0, len(order), batch_size)
+    for start in tqdm(starts, disable=not show_progress_bar, unit='batch'):
+        indices = order[start:start + batch_size]
+
+        # The body stage includes the padding of the bucket by the model's own tokenizer call
+        with profiling.stage('body'):
+            batch_embeddings = body.encode(
+                [sentences[i] for i in indices],
+                batch_size=batch_size,
+                normalize_embeddings=model.normalize_embeddings,
+                convert_to_numpy=True,
+                show_progress_bar=False,
+            )
+
+        # Write the embeddings back at the original position of each sentence
+        embeddings[indices] = batch_embeddings
+
+    return embeddings
+
+# Encode the sentences, only the sentences missing from the embedding cache are sent to the encoder
+# The encoder is any function returning the embeddings of a list of sentences (e.g. the worker pool of parallel_inference.py)
+def encode_cached(sentences, model, cache, batch_size=default_batch_size, show_progress_bar=True, encoder=None):
+    sentences = list(sentences)
+    with profiling.stage('cache_lookup'):
+        keys = cache.keys_for(sentences)
+        embeddings, found = cache.lookup(keys)
+    profiling.count('cache_hits', found.sum())
+
+    missing = np.flatnonzero(~found)
+    if len(missing) > 0:
+        # A sentence repeated inside the batch is only encoded once
+        first_position = {}
+        for position in missing.tolist():
+            first_position.setdefault(keys[position], position)
+        new_keys = list(first_position)
+        new_sentences = [sentences[position] for position in first_position.values()]
+        if encoder is not None:
+            new_embeddings = encoder(new_sentences)
+        else:
+            new_embeddings = encode_batched(new_sentences, model, batch_size, show_progress_bar)
+        cache.add(new_keys, new_embeddings)
+
+        row_of_key = {key: row for row, key in enumerate(new_keys)}
+        embeddings[missing] = new_embeddings[[row_of_key[keys[position]] for position in missing.tolist()]]
+
+    return embeddings
+
+# Run the classifier head on already computed embeddings
+def predict_embeddings(embeddings, model):
+    if len(embeddings) == 0:
+        return np.empty(0, dtype=np.int64)
+
+    # A differentiable head expects a torch tensor, the sklearn head accepts numpy directly
+    with profiling.stage('head'):
+        if model.has_differentiable_head:
+            import torch
+            predictions = model.model_head.predict(torch.from_numpy(embeddings).to(model.model_body.device))
+            return predictions.cpu().numpy()
+
+        return np.asarray(model.model_head.predict(embeddings))
+
+# Embeddings of a list of sentences from the cache, the encoder or the model body, in the same order as the input
+def embed_batched(sentences, model, batch_size=default_batch_size, show_progress_bar=True, cache=None, encoder=None):
+    if cache is not None:
+        return encode_cached(sentences, model, cache, batch_size, show_progress_bar, encoder)
+    if encoder is not None:
+        return encoder(list(sentences))
+    return encode_batched(sentences, model, batch_size, show_progress_bar)
+
+# Predict the labels of a list of sentences, the results are in the same order as the input
+def predict_batched(sentences, model, batch_size=default_batch_size, show_progress_bar=True, cache=None, encoder=None):
+    return predict_embeddings(embed_batched(sentences, model, batch_size, show_progress_bar, cache, encoder), model)
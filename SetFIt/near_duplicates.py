@@ -0,0 +1,121 @@
+"""
+Project Name: MACHINE LEARNING TECHNIQUES FOR ESTIMATING SUICIDAL RISK ON SOCIAL MEDIA
+Author: Samuel Bernier
+Thesis Paper (French): https://uqo.on.worldcat.org/oclc/1415207814
+GitHub repository: https://github.com/BernierS/SetFit_Suicidal_Risk
+Huggin Face repository: https://huggingface.co/BernierS/SetFit_Suicidal_Risk
+File Description:
+    This file is used to group the identical and nearly identical sentences (copypasta, crossposts, quoted replies)
+    before the predictions, so SetFit-Pred.py scores one sentence per group and gives its label to the others.
+    Each sentence gets a MinHash signature over its character shingles, and locality-sensitive hashing (LSH) on bands
+    of the signature finds the candidate pairs, which are kept when their estimated Jaccard similarity is high enough.
+--------------------------------------------------------------------------------
+This file is part of the MACHINE LEARNING TECHNIQUES FOR ESTIMATING SUICIDAL RISK SUICIDAL RISK ON SOCIAL NETWORKS project,
+developed as a part of Samuel Bernier's thesis. For more information, visit https://uqo.on.worldcat.org/oclc/1415207814.
+--------------------------------------------------------------------------------
+"""
+
+import hashlib
+import numpy as np
+
+# Signature of 64 hashes in 8 bands of 8 rows: two sentences with a Jaccard similarity of 0.8 share a band
+# with a probability of about 0.94, at 0.5 the probability is below 0.03
+num_perm = 64
+bands = 8
+shingle_size = 5 # Characters per shingle
+block_size = 256 # Sentences hashed at a time
+default_threshold = 0.8
+
+# Random multiply-shift hash functions ((a * x + b) mod 2**64) >> 32, the same on every run
+# a is odd, the multiplications wrap around in numpy, which is faster than a modulo
+rng = np.random.RandomState(1)
+perm_a = rng.randint(0, 1 << 63, size=num_perm, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+perm_b = rng.randint(0, 1 << 63, size=num_perm, dtype=np.uint64) * np.uint64(2)
+
+# Lowercase and single spaces, so the case and the spacing do not make two sentences different
+def duplicate_key(sentence):
+    return ' '.join(sentence.lower().split())
+
+# MinHash signatures of the sentences, one row per sentence
+# All the shingles of all the sentences are hashed together with numpy instead of one sentence at a time
+def minhash_signatures(keys):
+    encoded = [key.encode('utf-8') for key in keys]
+    lengths = np.fromiter((len(e) for e in encoded), dtype=np.int64, count=len(encoded))
+    data = np.frombuffer(b''.join(encoded) + bytes(shingle_size), dtype=np.uint8).astype(np.uint64)
+    ends = np.cumsum(lengths)
+    starts = ends - lengths
+
+    # One shingle per position, and a single one for the sentences shorter than a shingle
+    counts = np.maximum(lengths - shingle_size + 1, 1)
+    offsets = np.cumsum(counts) - counts
+    positions = np.repeat(starts, counts) + np.arange(counts.sum()) - np.repeat(offsets, counts)
+    shingle_ends = np.repeat(ends, counts)
+
+    # Value of each shingle from its bytes (the bytes past the end of a short sentence count as 0)
+    values = np.zeros(len(positions), dtype=np.uint64)
+    for j in range(shingle_size):
+        byte = np.where(positions + j < shingle_ends, data[positions + j], 0).astype(np.uint64)
+        values = values * np.uint64(257) + byte
+
+    # Each hash function gives a 32 bits value per shingle, the signature keeps the smallest one of each sentence
+    # The sentences are hashed in blocks small enough to stay in the CPU cache for the num_perm passes
+    signatures = np.empty((len(keys), num_perm), dtype=np.uint32)
+    for block_start in range(0, len(keys), block_size):
+        block_end = min(block_start + block_size, len(keys))
+        first, last = offsets[block_start], offsets[block_end - 1] + counts[block_end - 1]
+        block_values = values[first:last]
+        block_offsets = offsets[block_start:block_end] - first
+        permuted = np.empty(len(block_values), dtype=np.uint64)
+        for p in range(num_perm):
+            np.multiply(block_values, perm_a[p], out=permuted)
+            permuted += perm_b[p]
+            permuted >>= np.uint64(32)
+            signatures[block_start:block_end, p] = np.minimum.reduceat(permuted, block_offsets)
+    return signatures
+
+def _find(parent, i):
+    while parent[i] != i:
+        parent[i] = parent[parent[i]]
+        i = parent[i]
+    return i
+
+# Index of the representative of each sentence: the first sentence of its group
+# A sentence is its own representative when it has no near duplicate, with no threshold only the exact duplicates are grouped
+def find_representatives(sentences, threshold=default_threshold):
+    n = len(sentences)
+    if n == 0:
+        return np.zeros(0, dtype=np.int64)
+
+    keys = [duplicate_key(sentence) for sentence in sentences]
+    if threshold is None:
+        first = {}
+        return np.array([first.setdefault(key, i) for i, key in enumerate(keys)], dtype=np.int64)
+
+    signatures = minhash_signatures(keys)
+    parent = np.arange(n)
+    rows = num_perm // bands
+
+    for band in range(bands):
+        # Sentences with the same hashes in this band fall in the same bucket
+        band_rows = np.ascontiguousarray(signatures[:, band * rows:(band + 1) * rows])
+        _, first, bucket = np.unique(band_rows.view(np.dtype((np.void, rows * 4))).ravel(), return_index=True, return_inverse=True)
+
+        # Candidate pairs: each sentence with the first sentence of its bucket
+        candidates = np.nonzero(first[bucket] != np.arange(n))[0]
+        if len(candidates) == 0:
+            continue
+        anchors = first[bucket[candidates]]
+
+        # Only keep the pairs with an estimated Jaccard similarity above the threshold
+        similarity = (signatures[candidates] == signatures[anchors]).mean(axis=1)
+        for i, j in zip(candidates[similarity >= threshold], anchors[similarity >= threshold]):
+            root_i, root_j = _find(parent, i), _find(parent, j)
+            if root_i != root_j:
+                parent[max(root_i, root_j)] = min(root_i, root_j)
+
+    return np.array([_find(parent, i) for i in range(n)], dtype=np.int64)
+
+# Identifier of a group, from the text of its representative, so the exact duplicates have the same
+# identifier in every batch and every run
+def cluster_id(sentence):
+    return int.from_bytes(hashlib.blake2b(duplicate_key(sentence).encode('utf-8'), digest_size=8).digest(), 'little', signed=True)
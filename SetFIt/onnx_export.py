@@ -0,0 +1,203 @@
+"""
+Project Name: MACHINE LEARNING TECHNIQUES FOR ESTIMATING SUICIDAL RISK ON SOCIAL MEDIA
+Author: Samuel Bernier
+Thesis Paper (French): https://uqo.on.worldcat.org/oclc/1415207814
+GitHub repository: https://github.com/BernierS/SetFit_Suicidal_Risk
+Huggin Face repository: https://huggingface.co/BernierS/SetFit_Suicidal_Risk
+File Description:
+    This file is used to export the SetFit model body to ONNX (optionally quantized to int8) for CPU inference,
+    to load the exported model and to compare it with the PyTorch model on Suicide_Data_E16.csv.
+--------------------------------------------------------------------------------
+This file is part of the MACHINE LEARNING TECHNIQUES FOR ESTIMATING SUICIDAL RISK SUICIDAL RISK ON SOCIAL NETWORKS project,
+developed as a part of Samuel Bernier's thesis. For more information, visit https://uqo.on.worldcat.org/oclc/1415207814.
+--------------------------------------------------------------------------------
+"""
+
+import json
+import os
+import time
+import joblib
+import numpy as np
+import pandas as pd
+import onnxruntime
+import torch
+
+from onnxruntime.quantization import QuantType, quantize_dynamic
+from transformers import AutoTokenizer
+from inference import load_model, predict_batched
+
+# Default folder of the exported model
+default_export_dir = 'Data/SetFit_Suicidal_Risk_onnx'
+
+# Wrapper so the exported graph only returns the token embeddings
+class TransformerWrapper(torch.nn.Module):
+    def __init__(self, auto_model):
+        super().__init__()
+        self.auto_model = auto_model
+
+    def forward(self, input_ids, attention_mask):
+        return self.auto_model(input_ids=input_ids, attention_mask=attention_mask).last_hidden_state
+
+# Export the body of a SetFit model to ONNX and save the classifier head next to it
+def export_onnx(model, export_dir=default_export_dir, quantize=True, revision=None):
+    os.makedirs(export_dir, exist_ok=True)
+    body = model.model_body
+
+    # The runtime only reproduces mean pooling, which is what paraphrase-mpnet-base-v2 uses
+    pooling = body[1]
+    if pooling.get_pooling_mode_str() != 'mean':
+        raise ValueError("Only mean pooling is supported by the ONNX export")
+
+    # Export the transformer with dynamic batch and sequence axes
+    wrapper = TransformerWrapper(body[0].auto_model).eval()
+    dummy = body.tokenizer(["This is a sentence used to trace the model."], return_tensors='pt')
+    fp32_path = os.path.join(export_dir, 'model_body.onnx')
+    with torch.no_grad():
+        torch.onnx.export(
+            wrapper,
+            (dummy['input_ids'], dummy['attention_mask']),
+            fp32_path,
+            input_names=['input_ids', 'attention_mask'],
+            output_names=['token_embeddings'],
+            dynamic_axes={
+                'input_ids': {0: 'batch', 1: 'sequence'},
+                'attention_mask': {0: 'batch', 1: 'sequence'},
+                'token_embeddings': {0: 'batch', 1: 'sequence'},
+            },
+            opset_version=14,
+        )
+
+    # Dynamic int8 quantization of the weights, the activations stay in float
+    body_file = 'model_body.onnx'
+    if quantize:
+        body_file = 'model_body.int8.onnx'
+        quantize_dynamic(fp32_path, os.path.join(export_dir, body_file), weight_type=QuantType.QInt8)
+
+    body.tokenizer.save_pretrained(export_dir)
+    joblib.dump(model.model_head, os.path.join(export_dir, 'model_head.joblib'))
+
+    config = {
+        'body_file': body_file,
+        'max_seq_length': body.max_seq_length,
+        'dimension': body.get_sentence_embedding_dimension(),
+        'normalize_embeddings': model.normalize_embeddings,
+        'quantized': quantize,
+        # Used as the embedding cache revision, int8 embeddings must not be mixed with float ones
+        'revision': f"{revision or 'local'}-onnx{'-int8' if quantize else ''}",
+    }
+    with open(os.path.join(export_dir, 'onnx_config.json'), 'w', encoding='utf-8') as f:
+        json.dump(config, f, indent=4)
+
+    print(f"Exported the model to {export_dir} ({body_file})")
+    return export_dir
+
+class OnnxSentenceEncoder:
+    """
+    Stands in for the SentenceTransformer body: same tokenizer, ONNX Runtime forward pass and mean pooling.
+    """
+
+    def __init__(self, export_dir, config, threads=None):
+        options = onnxruntime.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+            options.inter_op_num_threads = 1
+        self.session = onnxruntime.InferenceSession(os.path.join(export_dir, config['body_file']), options, providers=['CPUExecutionProvider'])
+        self.input_names = [i.name for i in self.session.get_inputs()]
+        self.tokenizer = AutoTokenizer.from_pretrained(export_dir)
+        self.max_seq_length = config['max_seq_length']
+        self.dimension = config['dimension']
+        self.device = 'cpu'
+
+    def get_sentence_embedding_dimension(self):
+        return self.dimension
+
+    def encode(self, sentences, batch_size=32, normalize_embeddings=False, convert_to_numpy=True, show_progress_bar=False, **kwargs):
+        if isinstance(sentences, str):
+            sentences = [sentences]
+
+        embeddings = []
+        for start in range(0, len(sentences), batch_size):
+            encoded = self.tokenizer(sentences[start:start + batch_size], padding=True, truncation=True, max_length=self.max_seq_length, return_tensors='np')
+            token_embeddings = self.session.run(None, {name: encoded[name].astype(np.int64) for name in self.input_names})[0]
+
+            # Mean pooling over the real tokens only
+            mask = encoded['attention_mask'][..., None].astype(np.float32)
+            pooled = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            if normalize_embeddings:
+                pooled = pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+            embeddings.append(pooled.astype(np.float32))
+
+        if not embeddings:
+            return np.empty((0, self.dimension), dtype=np.float32)
+        return np.concatenate(embeddings)
+
+class OnnxSetFitModel:
+    """
+    Same interface as SetFitModel for the parts used by inference.py (model_body, model_head, predict).
+    """
+
+    def __init__(self, export_dir=default_export_dir, threads=None):
+        with open(os.path.join(export_dir, 'onnx_config.json'), 'r', encoding='utf-8') as f:
+            config = json.load(f)
+        self.model_body = OnnxSentenceEncoder(export_dir, config, threads)
+        self.model_head = joblib.load(os.path.join(export_dir, 'model_head.joblib'))
+        self.normalize_embeddings = config['normalize_embeddings']
+        self.has_differentiable_head = False
+        self.revision = config['revision']
+
+    def predict(self, sentences):
+        embeddings = self.model_body.encode(sentences, normalize_embeddings=self.normalize_embeddings)
+        return self.model_head.predict(embeddings)
+
+    def __call__(self, sentences):
+        return self.predict(sentences)
+
+# Compare the labels and the speed of the ONNX model with the PyTorch model
+def parity_report(torch_model, onnx_model, data_file='Data/Suicide_Data_E16.csv', batch_size=32, repeats=3, report_file=None):
+    dataset = pd.read_csv(data_file)
+    sentences = dataset['sentence'].tolist()
+    labels = dataset['label'].to_numpy()
+
+    def timed(model):
+        # Best of a few runs, the first one also pays for the warm-up
+        best = float('inf')
+        for _ in range(repeats):
+            start_time = time.perf_counter()
+            predictions = predict_batched(sentences, model, batch_size, show_progress_bar=False)
+            best = min(best, time.perf_counter() - start_time)
+        return predictions, best
+
+    torch_predictions, torch_seconds = timed(torch_model)
+    onnx_predictions, onnx_seconds = timed(onnx_model)
+
+    report = {
+        'sentences': len(sentences),
+        'label_agreement': float(np.mean(torch_predictions == onnx_predictions)),
+        'torch_accuracy': float(np.mean(torch_predictions == labels)),
+        'onnx_accuracy': float(np.mean(onnx_predictions == labels)),
+        'torch_sentences_per_second': len(sentences) / torch_seconds,
+        'onnx_sentences_per_second': len(sentences) / onnx_seconds,
+        'speedup': torch_seconds / onnx_seconds,
+    }
+
+    print("ONNX parity report:")
+    for key, value in report.items():
+        print(f"    {key}: {value:.4f}" if isinstance(value, float) else f"    {key}: {value}")
+
+    if report_file:
+        with open(report_file, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=4)
+    return report
+
+# Export a model and write the parity report next to it
+def export_with_report(model, export_dir=default_export_dir, quantize=True, revision=None):
+    export_onnx(model, export_dir, quantize, revision)
+    return parity_report(model, OnnxSetFitModel(export_dir), report_file=os.path.join(export_dir, 'parity_report.json'))
+
+def main():
+    # Export the model published on the Hub
+    model, revision = load_model("BernierS/SetFit_Suicidal_Risk")
+    export_with_report(model, revision=revision)
+
+if __name__ == "__main__":
+    main()
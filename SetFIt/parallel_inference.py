@@ -0,0 +1,140 @@
+"""
+Project Name: MACHINE LEARNING TECHNIQUES FOR ESTIMATING SUICIDAL RISK ON SOCIAL MEDIA
+Author: Samuel Bernier
+Thesis Paper (French): https://uqo.on.worldcat.org/oclc/1415207814
+GitHub repository: https://github.com/BernierS/SetFit_Suicidal_Risk
+Huggin Face repository: https://huggingface.co/BernierS/SetFit_Suicidal_Risk
+File Description:
+    This file is used to encode sentences with a pool of CPU worker processes, each with its own copy of the SetFit model.
+    Run it directly to measure the throughput as the number of workers grows.
+--------------------------------------------------------------------------------
+This file is part of the MACHINE LEARNING TECHNIQUES FOR ESTIMATING SUICIDAL RISK SUICIDAL RISK ON SOCIAL NETWORKS project,
+developed as a part of Samuel Bernier's thesis. For more information, visit https://uqo.on.worldcat.org/oclc/1415207814.
+--------------------------------------------------------------------------------
+"""
+
+import multiprocessing
+import os
+import time
+import numpy as np
+import pandas as pd
+
+from tqdm import tqdm
+from inference import default_batch_size, encode_batched, load_model, predict_embeddings
+
+# Number of sentences sent to a worker at a time
+default_shard_size = 1024
+
+# Model loaded once in each worker process
+worker_model = None
+worker_batch_size = default_batch_size
+
+def init_worker(model_id, revision, threads, batch_size, backend, onnx_model_dir):
+    global worker_model, worker_batch_size
+    import torch
+
+    # Pin the number of threads so the workers do not fight over the cores
+    torch.set_num_threads(threads)
+    torch.set_num_interop_threads(1)
+
+    # The revision is already resolved by the parent process, no need to ask the Hub again
+    worker_model, _ = load_model(model_id, revision, resolve=False, backend=backend, onnx_model_dir=onnx_model_dir, threads=threads)
+    worker_batch_size = batch_size
+
+def encode_shard(sentences):
+    return encode_batched(sentences, worker_model, worker_batch_size, show_progress_bar=False)
+
+class ParallelEncoder:
+    """
+    Shards the sentences across a pool of worker processes and returns the embeddings in the original order.
+    The pool is started once and reused for every call.
+    """
+
+    def __init__(self, model_id, revision, workers=None, threads_per_worker=None, batch_size=default_batch_size, shard_size=default_shard_size, backend='torch', onnx_model_dir=None):
+        cpu_count = os.cpu_count() or 1
+        if workers is None:
+            workers = max(1, cpu_count // (threads_per_worker or 1))
+        if threads_per_worker is None:
+            threads_per_worker = max(1, cpu_count // workers)
+
+        self.workers = workers
+        self.threads_per_worker = threads_per_worker
+        self.shard_size = shard_size
+
+        # Spawn instead of fork, torch does not support being forked once its thread pool is started
+        context = multiprocessing.get_context('spawn')
+        self.pool = context.Pool(workers, initializer=init_worker, initargs=(model_id, revision, threads_per_worker, batch_size, backend, onnx_model_dir))
+
+        # Counters for the throughput
+        self.sentences = 0
+        self.seconds = 0.0
+
+    def __call__(self, sentences):
+        sentences = list(sentences)
+        shards = [sentences[i:i + self.shard_size] for i in range(0, len(sentences), self.shard_size)]
+        start_time = time.perf_counter()
+
+        # imap keeps the order of the shards, so the results can go straight to a single writer
+        embeddings = []
+        for shard_embeddings in tqdm(self.pool.imap(encode_shard, shards), total=len(shards), unit='shard'):
+            embeddings.append(shard_embeddings)
+
+        elapsed = time.perf_counter() - start_time
+        self.sentences += len(sentences)
+        self.seconds += elapsed
+        if elapsed > 0:
+            print(f"{len(sentences)} sentences in {elapsed:.1f} s ({len(sentences) / elapsed:.1f} sentences/s with {self.workers} workers x {self.threads_per_worker} threads)")
+
+        if not embeddings:
+            return np.empty((0, 0), dtype=np.float32)
+        return np.concatenate(embeddings)
+
+    def throughput(self):
+        return self.sentences / self.seconds if self.seconds > 0 else 0.0
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
+
+# Measure the throughput of the same sentences for a growing number of workers
+def scaling_report(sentences, model_id, revision, worker_counts, batch_size=default_batch_size):
+    cpu_count = os.cpu_count() or 1
+    report = []
+    for workers in worker_counts:
+        encoder = ParallelEncoder(model_id, revision, workers, max(1, cpu_count // workers), batch_size)
+        try:
+            # Warm-up call so the model loading is not counted
+            encoder(sentences[:encoder.shard_size])
+            encoder.sentences, encoder.seconds = 0, 0.0
+            encoder(sentences)
+            report.append({'workers': workers, 'threads_per_worker': encoder.threads_per_worker, 'sentences_per_second': encoder.throughput()})
+        finally:
+            encoder.close()
+
+    print("\nWorkers | Threads/worker | Sentences/s | Speedup")
+    for row in report:
+        print(f"{row['workers']:7} | {row['threads_per_worker']:14} | {row['sentences_per_second']:11.1f} | {row['sentences_per_second'] / report[0]['sentences_per_second']:.2f}x")
+    return report
+
+def main():
+    model_id = "BernierS/SetFit_Suicidal_Risk"
+    model, revision = load_model(model_id)
+
+    # Repeat the training sentences to get a workload long enough to measure
+    sentences = pd.read_csv('Data/Suicide_Data_E16.csv')['sentence'].tolist() * 50
+
+    # Check that the pool gives the same labels as the single process model
+    encoder = ParallelEncoder(model_id, revision, workers=2)
+    try:
+        parallel_labels = predict_embeddings(encoder(sentences[:256]), model)
+    finally:
+        encoder.close()
+    single_labels = predict_embeddings(encode_batched(sentences[:256], model, show_progress_bar=False), model)
+    print(f"Label agreement with the single process model: {np.mean(parallel_labels == single_labels):.2%}")
+
+    cpu_count = os.cpu_count() or 1
+    worker_counts = [w for w in (1, 2, 4, 8, 16, 32) if w <= cpu_count]
+    scaling_report(sentences, model_id, revision, worker_counts)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Project Name: MACHINE LEARNING TECHNIQUES FOR ESTIMATING SUICIDAL RISK ON SOCIAL MEDIA
+Author: Samuel Bernier
+Thesis Paper (French): https://uqo.on.worldcat.org/oclc/1415207814
+GitHub repository: https://github.com/BernierS/SetFit_Suicidal_Risk
+Huggin Face repository: https://huggingface.co/BernierS/SetFit_Suicidal_Risk
+File Description:
+    This file is used to write the scored sentences as a partitioned Parquet dataset instead of reddit_sentences.csv.
+    The sentences and the post metadata are stored in two tables joined on the ID column:
+        <directory>/sentences/part-00000.parquet   ID, Author, Subreddit, Sentences, Label, Label Text
+        <directory>/posts/part-00000.parquet       ID, Type, Author, Title, Body or Selftext, Subreddit, Score, URL, Created Date
+--------------------------------------------------------------------------------
+This file is part of the MACHINE LEARNING TECHNIQUES FOR ESTIMATING SUICIDAL RISK SUICIDAL RISK ON SOCIAL NETWORKS project,
+developed as a part of Samuel Bernier's thesis. For more information, visit https://uqo.on.worldcat.org/oclc/1415207814.
+--------------------------------------------------------------------------------
+"""
+
+import glob
+import os
+import re
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Repeated strings are stored once per part with an int32 index per row
+dictionary = pa.dictionary(pa.int32(), pa.string())
+
+sentence_schema = pa.schema([
+    ('ID', pa.string()),
+    ('Author', dictionary),
+    ('Subreddit', dictionary),
+    ('Sentences', pa.string()),
+    ('Label', pa.int8()),
+    ('Label Text', dictionary),
+    ('Cluster', pa.int64()),
+])
+
+post_schema = pa.schema([
+    ('ID', pa.string()),
+    ('Type', dictionary),
+    ('Author', dictionary),
+    ('Title', pa.string()),
+    ('Body or Selftext', pa.string()),
+    ('Subreddit', dictionary),
+    ('Score', pa.int64()),
+    ('URL', pa.string()),
+    ('Created Date', pa.string()),
+])
+
+part_pattern = re.compile(r'part-(\d+)\.parquet$')
+
+# Number of a part file, e.g. 12 for part-00012.parquet
+def part_number(path):
+    match = part_pattern.search(os.path.basename(path))
+    return int(match.group(1)) if match else None
+
+def list_parts(directory):
+    return sorted(glob.glob(os.path.join(directory, '*', 'part-*.parquet')))
+
+# Remove the parts written after the last checkpoint of the manifest
+def remove_parts_from(directory, first_part):
+    removed = 0
+    for path in list_parts(directory):
+        if part_number(path) >= first_part:
+            os.remove(path)
+            removed += 1
+    return removed
+
+# Add the Cluster column to the sentences parts written before near_duplicates.py, each old sentence is its own group
+# Any other difference with sentence_schema is an error, the new parts could not be read with the old ones
+def migrate_parts(directory):
+    from near_duplicates import cluster_id
+
+    old_names = [name for name in sentence_schema.names if name != 'Cluster']
+    migrated = 0
+    for path in sorted(glob.glob(os.path.join(directory, 'sentences', 'part-*.parquet'))):
+        names = pq.read_schema(path).names
+        if names == sentence_schema.names:
+            continue
+        if names != old_names:
+            raise ValueError(f"{path} has the columns {names} instead of {sentence_schema.names}: "
+                             "move the dataset away or set incremental = False to write it again")
+
+        df = pq.read_table(path).to_pandas()
+        df['Cluster'] = np.fromiter((cluster_id(str(s)) for s in df['Sentences']), dtype=np.int64, count=len(df))
+        table = pa.Table.from_pandas(df[sentence_schema.names], schema=sentence_schema, preserve_index=False)
+        pq.write_table(table, path + '.tmp', compression='zstd')
+        os.replace(path + '.tmp', path)
+        migrated += 1
+    return migrated
+
+class ParquetSentenceWriter:
+    """
+    Writes one sentences part and one posts part for each batch, so a batch is never rewritten.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.sentences_dir = os.path.join(directory, 'sentences')
+        self.posts_dir = os.path.join(directory, 'posts')
+        os.makedirs(self.sentences_dir, exist_ok=True)
+        os.makedirs(self.posts_dir, exist_ok=True)
+
+        # Continue the numbering of the parts already written
+        numbers = [part_number(path) for path in list_parts(directory)]
+        self.next_part = max(numbers) + 1 if numbers else 0
+
+    def _write(self, df, schema, directory):
+        table = pa.Table.from_pandas(df[schema.names], schema=schema, preserve_index=False)
+
+        # Written under a temporary name first so a crash never leaves a half written part
+        path = os.path.join(directory, f'part-{self.next_part:05d}.parquet')
+        pq.write_table(table, path + '.tmp', compression='zstd')
+        os.replace(path + '.tmp', path)
+        return os.path.getsize(path)
+
+    def write(self, batch_df):
+        sentences = batch_df[sentence_schema.names].astype({'Label': 'int8'})
+        posts = batch_df.drop_duplicates('ID')
+
+        bytes_written = self._write(sentences, sentence_schema, self.sentences_dir)
+        bytes_written += self._write(posts, post_schema, self.posts_dir)
+        self.next_part += 1
+        return bytes_written
+
+    # Number of parts written, used as the size of the output by the manifest
+    def size(self):
+        return self.next_part
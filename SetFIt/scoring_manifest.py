@@ -0,0 +1,123 @@
+"""
+Project Name: MACHINE LEARNING TECHNIQUES FOR ESTIMATING SUICIDAL RISK ON SOCIAL MEDIA
+Author: Samuel Bernier
+Thesis Paper (French): https://uqo.on.worldcat.org/oclc/1415207814
+GitHub repository: https://github.com/BernierS/SetFit_Suicidal_Risk
+Huggin Face repository: https://huggingface.co/BernierS/SetFit_Suicidal_Risk
+File Description:
+    This file contains the checkpoint manifest used by SetFit-Pred.py to resume the scoring and skip the posts already labelled.
+--------------------------------------------------------------------------------
+This file is part of the MACHINE LEARNING TECHNIQUES FOR ESTIMATING SUICIDAL RISK SUICIDAL RISK ON SOCIAL NETWORKS project,
+developed as a part of Samuel Bernier's thesis. For more information, visit https://uqo.on.worldcat.org/oclc/1415207814.
+--------------------------------------------------------------------------------
+"""
+
+import json
+import os
+import pandas as pd
+
+class ScoringManifest:
+    """
+    Append-only log (one JSON line per committed batch) next to the output file.
+    Each line holds the IDs of the posts and comments fully written by the batch,
+    the size of the output after the batch and the number of input rows read so far.
+    The size is in bytes for a CSV file and in number of parts for a Parquet directory (see parquet_output.py).
+    """
+
+    def __init__(self, output_path):
+        self.output_path = output_path
+        self.path = f'{output_path}.manifest.jsonl'
+        self.scored_ids = set()
+        self.output_size = 0
+        self.input_rows = 0
+        self.batches = 0
+
+        # An empty manifest means the first batch was not committed, the rows it wrote are removed below
+        # Only an output that existed before any manifest is bootstrapped
+        if os.path.isfile(self.path):
+            self._load()
+        elif os.path.exists(self.output_path):
+            self._bootstrap_from_output()
+        else:
+            self._create()
+
+        self._truncate_output()
+
+    # Created before any output is written, so a crash during the first batch is not mistaken for an old output
+    def _create(self):
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _load(self):
+        valid_bytes = 0
+        with open(self.path, 'rb') as f:
+            for line in f:
+                # A line cut by a crash is not a committed batch
+                if not line.endswith(b'\n'):
+                    break
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    break
+                valid_bytes += len(line)
+                self.scored_ids.update(record['ids'])
+                self.output_size = record['output_size']
+                self.input_rows = max(self.input_rows, record['input_rows'])
+                self.batches += 1
+
+        # Drop the cut line so the next batches are appended after the last complete one
+        if os.path.getsize(self.path) > valid_bytes:
+            with open(self.path, 'r+b') as f:
+                f.truncate(valid_bytes)
+
+    # An output written before the manifest existed: every ID in it is considered scored
+    def _bootstrap_from_output(self):
+        print(f"No manifest found, reading the IDs already in {self.output_path}...")
+        if os.path.isdir(self.output_path):
+            self.scored_ids.update(pd.read_parquet(os.path.join(self.output_path, 'sentences'), columns=['ID'])['ID'])
+        else:
+            for chunk in pd.read_csv(self.output_path, usecols=['ID'], dtype={'ID': str}, chunksize=1000000):
+                self.scored_ids.update(chunk['ID'])
+        self.commit(sorted(self.scored_ids), input_rows=0)
+
+    def _current_size(self):
+        if os.path.isdir(self.output_path):
+            # Imported here so pyarrow is only needed for a Parquet output
+            from parquet_output import list_parts, part_number
+            numbers = [part_number(path) for path in list_parts(self.output_path)]
+            return max(numbers) + 1 if numbers else 0
+        if os.path.isfile(self.output_path):
+            return os.path.getsize(self.output_path)
+        return 0
+
+    # Remove the rows written after the last committed batch, e.g. when the script crashed during a write
+    def _truncate_output(self):
+        if self._current_size() <= self.output_size:
+            return
+        if os.path.isdir(self.output_path):
+            from parquet_output import remove_parts_from
+            print(f"Removing {remove_parts_from(self.output_path, self.output_size)} parts written after the last checkpoint")
+        else:
+            print(f"Removing {self._current_size() - self.output_size} bytes written after the last checkpoint")
+            with open(self.output_path, 'r+b') as f:
+                f.truncate(self.output_size)
+
+    # True if the output file already has its headers
+    def has_output(self):
+        return self.output_size > 0
+
+    # Record a batch once its rows are in the output file
+    def commit(self, ids, input_rows=None):
+        ids = [str(i) for i in ids]
+        self.scored_ids.update(ids)
+        self.output_size = self._current_size()
+        if input_rows is not None:
+            self.input_rows = max(self.input_rows, input_rows)
+        self.batches += 1
+
+        record = {'batch': self.batches, 'input_rows': self.input_rows, 'output_size': self.output_size, 'ids': ids}
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
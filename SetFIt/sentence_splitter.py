@@ -0,0 +1,89 @@
+"""
+Project Name: MACHINE LEARNING TECHNIQUES FOR ESTIMATING SUICIDAL RISK ON SOCIAL MEDIA
+Author: Samuel Bernier
+Thesis Paper (French): https://uqo.on.worldcat.org/oclc/1415207814
+GitHub repository: https://github.com/BernierS/SetFit_Suicidal_Risk
+Huggin Face repository: https://huggingface.co/BernierS/SetFit_Suicidal_Risk
+File Description:
+    This file is used to split the posts and comments into sentences before making predictions with SetFit.
+    Run it directly to check split_into_sentences and split_series against texts with known sentences.
+--------------------------------------------------------------------------------
+This file is part of the MACHINE LEARNING TECHNIQUES FOR ESTIMATING SUICIDAL RISK SUICIDAL RISK ON SOCIAL NETWORKS project,
+developed as a part of Samuel Bernier's thesis. For more information, visit https://uqo.on.worldcat.org/oclc/1415207814.
+--------------------------------------------------------------------------------
+"""
+
+import re
+import sys
+import pandas as pd
+
+# Sentences with 50 characters or less are not kept
+min_sentence_length = 50
+
+# Abbreviations whose period does not end a sentence
+abbreviations = ['mr', 'mrs', 'ms', 'dr', 'prof', 'sr', 'jr', 'st', 'vs', 'etc', 'approx', 'e.g', 'i.e', 'a.m', 'p.m', 'u.s']
+
+# Character temporarily replacing the periods that are not the end of a sentence, it is never found in the crawled text
+placeholder = '\x00'
+
+# Periods that are not the end of a sentence: abbreviations, decimal numbers (3.5)
+# and ellipses followed by a lowercase word (e.g. "I just... don't know")
+# Only the abbreviations ignore the case, an ellipsis followed by a capital letter still ends the sentence
+protected_pattern = re.compile(
+    r'(?i:\b(?:' + '|'.join(re.escape(a) for a in abbreviations) + r')\.)'
+    r'|(?<=\d)\.(?=\d)'
+    r'|\.{2,}(?=\s*[a-z])'
+)
+
+# We split on period, exclamation mark and question mark, a run of them (e.g. "?!" or "...") is a single end of sentence
+boundary_pattern = re.compile(r'[.!?]+')
+
+def protect(match):
+    return match.group(0).replace('.', placeholder)
+
+# Split a text into sentences
+def split_into_sentences(text):
+    sentences = boundary_pattern.split(protected_pattern.sub(protect, text))
+
+    # Remove leading/trailing whitespace from each sentence and strings with 50 characters or less
+    sentences = (s.strip() for s in sentences)
+    return [s.replace(placeholder, '.') for s in sentences if len(s) > min_sentence_length]
+
+# Split a whole column of texts at once
+# Returns a Series of sentences whose index is the position of the row each sentence comes from (the post index)
+def split_series(texts):
+    texts = pd.Series(texts.fillna('').astype(str).to_numpy(), name='Sentences')
+
+    # The str methods run the precompiled patterns over the whole column, no DataFrame is exploded or copied
+    sentences = texts.str.replace(protected_pattern, protect, regex=True).str.split(boundary_pattern).explode()
+    sentences = sentences.str.strip()
+    sentences = sentences[sentences.str.len() > min_sentence_length]
+    sentences = sentences.str.replace(placeholder, '.', regex=False)
+
+    sentences.index.name = 'post_index'
+    return sentences
+
+# Texts with the expected sentences, each case is also split by split_series to check both give the same sentences
+check_cases = [
+    ("I waited ... to come for such a long time that I forgot why... Then finally it arrived after all these long months of waiting ...",
+     ["I waited ... to come for such a long time that I forgot why", "Then finally it arrived after all these long months of waiting"]),
+    ("Dr. Smith said the dose was 2.5 mg, e.g. the lowest one he could give me today! Is it enough for someone like me who weighs that much?!",
+     ["Dr. Smith said the dose was 2.5 mg, e.g. the lowest one he could give me today", "Is it enough for someone like me who weighs that much"]),
+    ("I just... don't know what to do anymore with my life and my family. Too short. MR. Jones keeps calling me every single night since the accident",
+     ["I just... don't know what to do anymore with my life and my family", "MR. Jones keeps calling me every single night since the accident"]),
+]
+
+def check_equivalence(cases=check_cases):
+    errors = 0
+    series = split_series(pd.Series([text for text, _ in cases]))
+    for position, (text, expected) in enumerate(cases):
+        sentences = split_into_sentences(text)
+        batch = series[series.index == position].tolist()
+        if sentences != expected or batch != expected:
+            errors += 1
+            print(f"Mismatch: {text!r} -> {sentences!r} (split_series {batch!r}), expected {expected!r}")
+    print(f"{len(cases)} texts checked: {errors} mismatches")
+    return errors
+
+if __name__ == "__main__":
+    sys.exit(1 if check_equivalence() else 0)
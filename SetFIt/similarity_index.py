@@ -0,0 +1,466 @@
+"""
+Project Name: MACHINE LEARNING TECHNIQUES FOR ESTIMATING SUICIDAL RISK ON SOCIAL MEDIA
+Author: Samuel Bernier
+Thesis Paper (French): https://uqo.on.worldcat.org/oclc/1415207814
+GitHub repository: https://github.com/BernierS/SetFit_Suicidal_Risk
+Huggin Face repository: https://huggingface.co/BernierS/SetFit_Suicidal_Risk
+File Description:
+    This file contains the similarity index of the scored sentences, to find the sentences (and posts) closest to a
+    sentence or to a post without reading all of reddit_sentences. It is an inverted file index (IVF): the SetFit body
+    embeddings are grouped around k-means centroids and a query only compares the sentences of the closest groups.
+    The embeddings are stored as memory-mapped int8 arrays with one scale per row (a quarter of float32, scores within
+    about 0.001) in segments, one segment per batch added by SetFit-Pred.py, and the ID, Author, Label Text and
+    sentence of each row in a SQLite table.
+
+    python SetFIt/similarity_index.py build                    # index the sentences already in the output of SetFit-Pred.py
+    python SetFIt/similarity_index.py query "I can't do this anymore" -k 10
+    python SetFIt/similarity_index.py post 1a2b3c -k 10         # sentences of other posts close to this post
+    python SetFIt/similarity_index.py rebuild                  # train the centroids again and merge the segments
+--------------------------------------------------------------------------------
+This file is part of the MACHINE LEARNING TECHNIQUES FOR ESTIMATING SUICIDAL RISK SUICIDAL RISK ON SOCIAL NETWORKS project,
+developed as a part of Samuel Bernier's thesis. For more information, visit https://uqo.on.worldcat.org/oclc/1415207814.
+--------------------------------------------------------------------------------
+"""
+
+import argparse
+import glob
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import time
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+# The shared modules are in the Common folder at the root of the repository
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from Common import profiling
+
+default_index_dir = 'Data/similarity_index'
+
+# Number of k-means lists, the index stays a flat scan until it has train_factor vectors per list
+default_nlist = 1024
+train_factor = 39
+train_sample_per_list = 64
+train_iterations = 10
+
+# Number of lists compared to a query, more lists find more of the true neighbours but take longer
+default_nprobe = 16
+
+# The centroids are trained again when the index grows this much, and the segments merged when there are too many
+retrain_growth = 4
+max_segments = 16
+
+# Rows read from the segments at a time when they are merged, and scored at a time by a flat scan
+block_rows = 65536
+scan_rows = 4096
+
+# Columns of the scored sentences kept for each row
+metadata_columns = ['ID', 'Author', 'Label Text', 'Sentences']
+
+def normalize_rows(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+# int8 vectors and the scale of each row, the largest component of a row is stored as 127
+def quantize(vectors):
+    scales = np.maximum(np.abs(vectors).max(axis=1), 1e-12) / 127
+    return np.round(vectors / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+
+# Spherical k-means: the centroids are the normalized means of their vectors, compared by cosine similarity
+def spherical_kmeans(vectors, nlist, iterations=train_iterations, seed=0):
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), nlist, replace=False)]
+    for _ in range(iterations):
+        lists = np.argmax(vectors @ centroids.T, axis=1)
+        order = np.argsort(lists, kind='stable')
+        used, starts = np.unique(lists[order], return_index=True)
+        centroids[used] = normalize_rows(np.add.reduceat(vectors[order], starts))
+        # An empty list starts again from a random vector
+        empty = np.setdiff1d(np.arange(nlist), used)
+        centroids[empty] = vectors[rng.choice(len(vectors), len(empty), replace=False)]
+    return centroids
+
+class Segment:
+    """
+    Vectors of one segment sorted by list: the rows of list l are at offsets[l]:offsets[l + 1].
+    """
+
+    def __init__(self, directory, dimension):
+        self.directory = directory
+        self.rows = np.load(os.path.join(directory, 'rows.npy'), mmap_mode='r')
+        self.scales = np.load(os.path.join(directory, 'scales.npy'), mmap_mode='r')
+        self.offsets = np.load(os.path.join(directory, 'offsets.npy'))
+        self.vectors = np.memmap(os.path.join(directory, 'vectors.i8'), dtype=np.int8, mode='r', shape=(len(self.rows), dimension))
+
+    def __len__(self):
+        return len(self.rows)
+
+    def dequantize(self, start, end):
+        return np.asarray(self.vectors[start:end], dtype=np.float32) * self.scales[start:end, None]
+
+    # (start, end) of the rows of the given lists, the whole segment when it was written before the centroids
+    def ranges(self, lists):
+        if lists is None or len(self.offsets) == 2:
+            return [(start, min(start + scan_rows, len(self.rows))) for start in range(0, len(self.rows), scan_rows)]
+        return [(self.offsets[l], self.offsets[l + 1]) for l in lists if self.offsets[l + 1] > self.offsets[l]]
+
+    # Cosine similarities of the rows of a range, converted from int8 one list at a time so it stays in the CPU cache
+    def scores(self, start, end, query):
+        return (np.asarray(self.vectors[start:end], dtype=np.float32) @ query) * self.scales[start:end]
+
+class SimilarityIndex:
+    """
+    IVF index of the sentence embeddings, updated by adding segments. meta.json lists the segments and the centroids
+    file, it is replaced last so an interrupted add or rebuild leaves the index as it was.
+    """
+
+    def __init__(self, directory=default_index_dir, dimension=None, model_id=None, model_revision=None, nlist=default_nlist, backend='torch', onnx_model_dir=None):
+        self.directory = directory
+        self.meta_path = os.path.join(directory, 'meta.json')
+        os.makedirs(os.path.join(directory, 'segments'), exist_ok=True)
+
+        if os.path.isfile(self.meta_path):
+            with open(self.meta_path, 'r', encoding='utf-8') as f:
+                self.meta = json.load(f)
+            # The embeddings of another model are not comparable
+            if model_revision is not None and self.meta['model_revision'] != model_revision:
+                raise ValueError(f"{directory} was built with {self.meta['model_id']}@{self.meta['model_revision']}, "
+                                 f"not {model_id}@{model_revision}: delete it and run the build command again")
+        elif dimension is None:
+            raise FileNotFoundError(f"{directory} has no similarity index, run 'python SetFIt/similarity_index.py build' first")
+        else:
+            # The backend is kept so a query is encoded the way the sentences were (see inference.load_model)
+            self.meta = {'dimension': dimension, 'model_id': model_id, 'model_revision': model_revision, 'nlist': nlist,
+                         'backend': backend, 'onnx_model_dir': onnx_model_dir, 'count': 0, 'trained_count': 0, 'centroids': None, 'segments': [], 'next_segment': 0}
+
+        self.dimension = self.meta['dimension']
+        self.centroids = np.load(os.path.join(directory, self.meta['centroids'])) if self.meta['centroids'] else None
+        self.segments = [Segment(os.path.join(directory, 'segments', name), self.dimension) for name in self.meta['segments']]
+
+        self.connection = sqlite3.connect(os.path.join(directory, 'rows.db'), timeout=60)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS rows (
+                row INTEGER PRIMARY KEY,
+                id TEXT,
+                author TEXT,
+                label_text TEXT,
+                sentence TEXT
+            );
+            CREATE INDEX IF NOT EXISTS rows_id ON rows (id);
+        """)
+        self.connection.commit()
+
+    def __len__(self):
+        return self.meta['count']
+
+    def close(self):
+        self.connection.close()
+
+    def _save_meta(self):
+        temp_path = self.meta_path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.meta, f, indent=4)
+        os.replace(temp_path, self.meta_path)
+
+    # List of each vector, the closest centroid
+    def _assign(self, vectors):
+        if self.centroids is None:
+            return np.zeros(len(vectors), dtype=np.int64)
+        return np.argmax(vectors @ self.centroids.T, axis=1)
+
+    def _new_segment_dir(self):
+        name = f"seg-{self.meta['next_segment']:05d}"
+        self.meta['next_segment'] += 1
+        return name, os.path.join(self.directory, 'segments', name)
+
+    # Write a segment from vectors and their global rows, sorted by list
+    def _write_segment(self, vectors, rows):
+        lists = self._assign(vectors)
+        order = np.argsort(lists, kind='stable')
+        nlist = 1 if self.centroids is None else len(self.centroids)
+
+        name, directory = self._new_segment_dir()
+        os.makedirs(directory, exist_ok=True)
+        quantized, scales = quantize(vectors[order])
+        out = np.memmap(os.path.join(directory, 'vectors.i8'), dtype=np.int8, mode='w+', shape=(len(rows), self.dimension))
+        out[:] = quantized
+        out.flush()
+        del out
+        np.save(os.path.join(directory, 'scales.npy'), scales)
+        np.save(os.path.join(directory, 'rows.npy'), np.asarray(rows, dtype=np.int64)[order])
+        np.save(os.path.join(directory, 'offsets.npy'), np.searchsorted(lists[order], np.arange(nlist + 1)))
+        return name
+
+    # Add the embeddings of scored sentences, metadata has the ID, Author, Label Text and Sentences columns
+    def add(self, embeddings, metadata):
+        if len(embeddings) == 0:
+            return 0
+        vectors = normalize_rows(embeddings)
+        rows = np.arange(self.meta['count'], self.meta['count'] + len(vectors))
+
+        name = self._write_segment(vectors, rows)
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO rows (row, id, author, label_text, sentence) VALUES (?, ?, ?, ?, ?)",
+                ((int(row), str(i), str(author), str(label_text), str(sentence)) for row, (i, author, label_text, sentence)
+                 in zip(rows, metadata[metadata_columns].itertuples(index=False, name=None))),
+            )
+        self.meta['segments'].append(name)
+        self.meta['count'] += len(vectors)
+        self._save_meta()
+        self.segments.append(Segment(os.path.join(self.directory, 'segments', name), self.dimension))
+
+        # Train the centroids once there are enough vectors, again when the index has grown, merge the small segments
+        if self.centroids is None and len(self) >= train_factor * self.meta['nlist']:
+            self.rebuild(retrain=True)
+        elif self.centroids is not None and len(self) >= retrain_growth * self.meta['trained_count']:
+            self.rebuild(retrain=True)
+        elif len(self.segments) > max_segments:
+            self.rebuild(retrain=False)
+        return len(vectors)
+
+    # Segment and (start, end) of all the rows, block by block
+    def _iter_blocks(self):
+        for segment in self.segments:
+            for start in range(0, len(segment), block_rows):
+                yield segment, start, min(start + block_rows, len(segment))
+
+    def _train(self):
+        nlist = min(self.meta['nlist'], max(1, len(self) // train_factor))
+        rng = np.random.default_rng(0)
+        sample = np.sort(rng.choice(len(self), size=min(len(self), nlist * train_sample_per_list), replace=False))
+
+        # The sample is read segment by segment, its positions are over the concatenated segments
+        vectors = []
+        start = 0
+        for segment in self.segments:
+            positions = sample[(sample >= start) & (sample < start + len(segment))] - start
+            vectors.append(np.asarray(segment.vectors[positions], dtype=np.float32) * segment.scales[positions, None])
+            start += len(segment)
+        return spherical_kmeans(normalize_rows(np.concatenate(vectors)), nlist)
+
+    # Merge all the segments into one, after training the centroids again with retrain
+    def rebuild(self, retrain=True):
+        if len(self) == 0:
+            return
+        with profiling.stage('similarity_rebuild'):
+            if retrain:
+                self.centroids = self._train()
+
+            # First pass: the list of every row, to know where each row goes in the merged segment
+            lists = np.empty(len(self), dtype=np.int64)
+            rows = np.empty(len(self), dtype=np.int64)
+            start = 0
+            # Without new centroids the rows keep the list of their segment
+            for segment, block_start, block_end in self._iter_blocks():
+                if retrain:
+                    block_lists = self._assign(segment.dequantize(block_start, block_end))
+                else:
+                    block_lists = np.searchsorted(segment.offsets, np.arange(block_start, block_end), side='right') - 1
+                lists[start:start + block_end - block_start] = block_lists
+                rows[start:start + block_end - block_start] = segment.rows[block_start:block_end]
+                start += block_end - block_start
+            order = np.argsort(lists, kind='stable')
+            destination = np.empty(len(order), dtype=np.int64)
+            destination[order] = np.arange(len(order))
+
+            # Second pass: copy the int8 vectors and their scales to their position in the merged segment
+            name, directory = self._new_segment_dir()
+            os.makedirs(directory, exist_ok=True)
+            out = np.memmap(os.path.join(directory, 'vectors.i8'), dtype=np.int8, mode='w+', shape=(len(self), self.dimension))
+            scales = np.empty(len(self), dtype=np.float32)
+            start = 0
+            for segment, block_start, block_end in self._iter_blocks():
+                positions = destination[start:start + block_end - block_start]
+                out[positions] = segment.vectors[block_start:block_end]
+                scales[positions] = segment.scales[block_start:block_end]
+                start += block_end - block_start
+            out.flush()
+            del out
+            np.save(os.path.join(directory, 'scales.npy'), scales)
+            np.save(os.path.join(directory, 'rows.npy'), rows[order])
+            nlist = 1 if self.centroids is None else len(self.centroids)
+            np.save(os.path.join(directory, 'offsets.npy'), np.searchsorted(lists[order], np.arange(nlist + 1)))
+
+            # The centroids file has the number of the segment, the old one stays valid until meta.json is replaced
+            old_files = [self.meta['centroids']] + [os.path.join('segments', s) for s in self.meta['segments']]
+            centroids_file = None
+            if self.centroids is not None:
+                centroids_file = f"centroids-{name}.npy"
+                np.save(os.path.join(self.directory, centroids_file), self.centroids)
+            self.meta.update(centroids=centroids_file, segments=[name])
+            if retrain:
+                self.meta['trained_count'] = len(self)
+            self._save_meta()
+
+            self.segments = [Segment(directory, self.dimension)]
+            for old_file in old_files:
+                path = os.path.join(self.directory, old_file) if old_file and old_file != centroids_file else None
+                if path and os.path.isdir(path):
+                    shutil.rmtree(path, ignore_errors=True)
+                elif path and os.path.isfile(path):
+                    os.remove(path)
+
+    # IDs of the posts that already have sentences in the index
+    def indexed_ids(self, ids):
+        ids = [str(i) for i in ids]
+        indexed = set()
+        # The rows written by an add interrupted before meta.json was replaced are not part of the index
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            query = f"SELECT DISTINCT id FROM rows WHERE row < ? AND id IN ({','.join('?' * len(chunk))})"
+            indexed.update(i for (i,) in self.connection.execute(query, [len(self)] + chunk))
+        return indexed
+
+    # Rows and cosine similarities of the k closest sentences of each query
+    def search_vectors(self, queries, k=10, nprobe=default_nprobe):
+        queries = normalize_rows(np.atleast_2d(queries))
+        results = []
+        for query in queries:
+            lists = None
+            if self.centroids is not None:
+                similarities = self.centroids @ query
+                lists = np.argsort(-similarities)[:nprobe]
+
+            # Candidates of the probed lists in every segment
+            rows, scores = [], []
+            for segment in self.segments:
+                for start, end in segment.ranges(lists):
+                    rows.append(np.asarray(segment.rows[start:end]))
+                    scores.append(segment.scores(start, end, query))
+            if not rows:
+                results.append((np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)))
+                continue
+            rows, scores = np.concatenate(rows), np.concatenate(scores)
+            best = np.argpartition(-scores, min(k, len(scores)) - 1)[:k] if len(scores) > k else np.arange(len(scores))
+            best = best[np.argsort(-scores[best], kind='stable')]
+            results.append((rows[best], scores[best]))
+        return results
+
+    # ID, Author, Label Text and sentence of the rows, in the order of the rows
+    def metadata(self, rows, scores=None):
+        rows = [int(row) for row in rows]
+        found = {}
+        # SQLite limits the number of parameters of a query
+        for start in range(0, len(rows), 900):
+            part = rows[start:start + 900]
+            query = f"SELECT row, id, author, label_text, sentence FROM rows WHERE row IN ({', '.join('?' * len(part))})"
+            for row, *values in self.connection.execute(query, part):
+                found[row] = values
+        df = pd.DataFrame([found.get(row, [None] * 4) for row in rows], columns=metadata_columns)
+        if scores is not None:
+            df.insert(0, 'Score', np.round(np.asarray(scores, dtype=np.float64), 4))
+        return df
+
+    # The k sentences closest to an embedding
+    def search(self, embedding, k=10, nprobe=default_nprobe):
+        rows, scores = self.search_vectors(embedding, k, nprobe)[0]
+        return self.metadata(rows, scores)
+
+    # The k sentences of other posts closest to the mean embedding of the sentences of a post
+    def similar_to_post(self, post_id, k=10, nprobe=default_nprobe):
+        post_rows = np.array([row for row, in self.connection.execute("SELECT row FROM rows WHERE id = ? AND row < ?", (str(post_id), len(self)))], dtype=np.int64)
+        if len(post_rows) == 0:
+            raise KeyError(f"{post_id} is not in the similarity index")
+
+        vectors = []
+        for segment in self.segments:
+            positions = np.flatnonzero(np.isin(segment.rows, post_rows))
+            vectors.append(np.asarray(segment.vectors[positions], dtype=np.float32) * segment.scales[positions, None])
+        embedding = normalize_rows(np.concatenate(vectors)).mean(axis=0, keepdims=True)
+
+        # The sentences of the post itself are found first, they are dropped from the results
+        rows, scores = self.search_vectors(embedding, k + len(post_rows), nprobe)[0]
+        keep = ~np.isin(rows, post_rows)
+        return self.metadata(rows[keep][:k], scores[keep][:k])
+
+# Scored sentences in the output of SetFit-Pred.py, chunk by chunk
+def iter_output(output_path, chunk_rows=100000):
+    if os.path.isdir(output_path):
+        for path in sorted(glob.glob(os.path.join(output_path, 'sentences', 'part-*.parquet'))):
+            for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_rows, columns=metadata_columns):
+                yield batch.to_pandas()
+        return
+    yield from pd.read_csv(output_path, usecols=metadata_columns, dtype={'ID': str}, chunksize=chunk_rows)
+
+# Index the sentences already in the output of SetFit-Pred.py, with the model and settings of SetFit-Pred.py
+def build(directory, output_path, model_id, revision, batch_size, cache_dir=None):
+    from inference import encode_batched, encode_cached, load_model
+    from embedding_cache import EmbeddingCache
+
+    model, resolved_revision = load_model(model_id, revision)
+    if os.path.isdir(directory):
+        shutil.rmtree(directory)
+    index = SimilarityIndex(directory, model.model_body.get_sentence_embedding_dimension(), model_id, resolved_revision)
+    cache = EmbeddingCache(cache_dir, index.dimension, resolved_revision) if cache_dir else None
+    for chunk in iter_output(output_path):
+        sentences = chunk['Sentences'].astype(str).tolist()
+        if cache is not None:
+            embeddings = encode_cached(sentences, model, cache, batch_size)
+            cache.save()
+        else:
+            embeddings = encode_batched(sentences, model, batch_size)
+        index.add(embeddings, chunk)
+        print(f"{len(index)} sentences indexed")
+    return index
+
+def print_results(results, seconds):
+    with pd.option_context('display.max_colwidth', 120, 'display.width', 250):
+        print(results.to_string(index=False))
+    print(f"{len(results)} results in {seconds * 1000:.1f} ms")
+
+def main():
+    parser = argparse.ArgumentParser(description='Similarity search over the scored sentences')
+    parser.add_argument('--index-dir', default=default_index_dir, help=f'Folder of the index (default: {default_index_dir})')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    build_parser = subparsers.add_parser('build', help='Index the sentences already in the output of SetFit-Pred.py')
+    build_parser.add_argument('--output', default=None, help='Output of SetFit-Pred.py (default: the Parquet dataset if it exists, else the CSV file)')
+    build_parser.add_argument('--model', default='BernierS/SetFit_Suicidal_Risk', help='SetFit model of SetFit-Pred.py')
+    build_parser.add_argument('--revision', default=os.environ.get("SETFIT_MODEL_REVISION", "main"))
+    build_parser.add_argument('--batch-size', type=int, default=64)
+    build_parser.add_argument('--embedding-cache', default='Data/embedding_cache', help="Embedding cache of SetFit-Pred.py, 'none' to encode everything")
+
+    for name, help_text in (('query', 'Sentences close to a text'), ('post', 'Sentences of other posts close to a post')):
+        query_parser = subparsers.add_parser(name, help=help_text)
+        query_parser.add_argument('text' if name == 'query' else 'post_id')
+        query_parser.add_argument('-k', type=int, default=10, help='Number of results')
+        query_parser.add_argument('--nprobe', type=int, default=default_nprobe, help='Number of lists compared to the query')
+
+    subparsers.add_parser('rebuild', help='Train the centroids again and merge the segments')
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        output_path = args.output or ('Data/reddit_sentences_parquet' if os.path.isdir('Data/reddit_sentences_parquet') else 'Data/reddit_sentences.csv')
+        cache_dir = None if args.embedding_cache == 'none' else args.embedding_cache
+        build(args.index_dir, output_path, args.model, args.revision, args.batch_size, cache_dir).close()
+        return
+
+    index = SimilarityIndex(args.index_dir)
+    if args.command == 'rebuild':
+        index.rebuild(retrain=True)
+        # The centroids are only trained once the index has sentences
+        nlist = 0 if index.centroids is None else len(index.centroids)
+        print(f"{len(index)} sentences in {nlist} lists")
+    elif args.command == 'post':
+        start_time = time.perf_counter()
+        results = index.similar_to_post(args.post_id, args.k, args.nprobe)
+        print_results(results, time.perf_counter() - start_time)
+    else:
+        # The query is encoded by the model the index was built with
+        from inference import load_model
+        model, _ = load_model(index.meta['model_id'], index.meta['model_revision'], resolve=False,
+                              backend=index.meta.get('backend', 'torch'), onnx_model_dir=index.meta.get('onnx_model_dir'))
+        start_time = time.perf_counter()
+        embedding = model.model_body.encode([args.text], normalize_embeddings=model.normalize_embeddings, convert_to_numpy=True, show_progress_bar=False)
+        results = index.search(embedding, args.k, args.nprobe)
+        print_results(results, time.perf_counter() - start_time)
+    index.close()
+
+if __name__ == "__main__":
+    main()